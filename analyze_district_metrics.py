@@ -1,5 +1,7 @@
 import pandas as pd
 import numpy as np
+from plan_metrics import plan_metrics, VTD_COLUMNS
+from election_scoring import election_matrices, election_scores
 
 # Load data
 CSV_PATH = 'fl_2020_vtd.csv'
@@ -39,14 +41,19 @@ else:
     pop_balance_summary = None
     print("Warning: No 'district' column found. Cannot compute population balance metrics.")
 
-# --- Community integrity metrics ---
-# TODO: Compute county/VTD splits, homogeneity index, opportunity districts
-
-# --- Competitiveness metrics ---
-# TODO: Compute two-party share, margin of victory, competitive districts, mean–median, efficiency gap
-
-# --- Output summary ---
-# TODO: Print or return structured summary
+# --- Community integrity and competitiveness metrics ---
+# County splits, homogeneity index, opportunity districts, seats, competitive districts,
+# mean–median and efficiency gap, computed by the vectorized engine in plan_metrics.py
+if 'district' in df.columns:
+    arrays = {col: df[col].to_numpy(dtype=float) for col in VTD_COLUMNS}
+    arrays['county'] = pd.factorize(df['county'])[0]
+    plan_summary = plan_metrics(df['district'].to_numpy(), arrays, NUM_DISTRICTS).iloc[0]
+    # The same partisan metrics under every contest in the file
+    names, dem, rep = election_matrices(df)
+    election_summary = election_scores(df['district'].to_numpy(), dem, rep, names, NUM_DISTRICTS).loc[0]
+else:
+    plan_summary = None
+    election_summary = None
 
 if __name__ == '__main__':
     print(f'Total population: {total_pop}')
@@ -58,3 +65,9 @@ if __name__ == '__main__':
         print("Mean deviation: {:.4f}".format(pop_balance_summary['deviation'].mean()))
     else:
         print("Population balance metrics not available.")
+    if plan_summary is not None:
+        print("\nPlan summary:")
+        print(plan_summary.to_string(float_format="%.4f"))
+    if election_summary is not None:
+        print("\nPartisan metrics by election:")
+        print(election_summary.to_string(float_format="%.4f"))
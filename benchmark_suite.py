@@ -0,0 +1,415 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import networkx as nx
+from shapely.geometry import box
+from gerrychain import GeographicPartition, MarkovChain, proposals, constraints, accept
+from gerrychain.updaters import Tally
+from gerrychain.tree import recursive_tree_part
+import tree_partition
+from seed_plans import seed_plan
+from multilevel import multilevel_plan
+from county_partition import county_tree_part
+
+from preprocess_vtd_data import merge_vtds, shapefile_columns, SHAPEFILE, ELECTION_CSV
+from build_vtd_graph import build_csr_graph
+from extreme_gerrymander_contiguous import (
+    NUM_DISTRICTS, population_bounds, vtd_lookups, choose_seeds, grow_districts, anneal,
+)
+from plan_metrics import load_vtd_arrays, plan_metrics
+from compactness import PerimeterTally, district_compactness, dissolve_compactness
+
+# Benchmarks for the pipeline's hot paths on the Florida data and on generated lattices.
+# Every case runs the repo's own functions with fixed seeds. Each case is timed `repeat`
+# times untraced, then run once more under tracemalloc for peak Python/numpy memory.
+# Results go to a JSON file; pass an older one with --compare to see the ratios.
+
+CELL_METERS = 1000
+
+
+def lattice_vtds(width, height, seed=0):
+    """Synthetic VTD layer: a width x height grid of square cells with Florida's columns.
+
+    Democratic share drifts from west to east with noise, so planners have something to
+    pack and crack; counties are 8x8 blocks of cells.
+    """
+    rng = np.random.default_rng(seed)
+    n = width * height
+    x, y = np.divmod(np.arange(n), height)
+    pop = rng.integers(500, 1500, n)
+    vap = (pop * rng.uniform(0.7, 0.85, n)).astype(int)
+    black = rng.uniform(0, 0.4, n)
+    hisp = rng.uniform(0, 0.4, n)
+    votes = (pop * rng.uniform(0.4, 0.6, n)).astype(int)
+    dem_share = np.clip(0.3 + 0.4 * x / max(width - 1, 1) + rng.normal(0, 0.1, n), 0.05, 0.95)
+    dem = (votes * dem_share).astype(int)
+    data = pd.DataFrame({
+        "GEOID20": [f"99{i:09d}" for i in range(n)],
+        "county": [f"C{cx:03d}{cy:03d}" for cx, cy in zip(x // 8, y // 8)],
+        "pop": pop,
+        "pop_white": (pop * (1 - black - hisp)).astype(int),
+        "pop_black": (pop * black).astype(int),
+        "pop_hisp": (pop * hisp).astype(int),
+        "vap": vap,
+        "vap_black": (vap * black).astype(int),
+        "vap_hisp": (vap * hisp).astype(int),
+        "pre_20_dem_bid": dem,
+        "pre_20_rep_tru": votes - dem,
+    })
+    shapes = gpd.GeoDataFrame(
+        {"GEOID20": data["GEOID20"]},
+        geometry=[box(i * CELL_METERS, j * CELL_METERS, (i + 1) * CELL_METERS, (j + 1) * CELL_METERS)
+                  for i, j in zip(x, y)],
+        crs="EPSG:6933",
+    )
+    return shapes, data
+
+
+class Dataset:
+    """Inputs for one benchmark target, with the intermediate products built on demand."""
+
+    def __init__(self, name, shapefile, election_csv):
+        self.name = name
+        self.shapefile = shapefile
+        self.election_csv = election_csv
+        self._cache = {}
+
+    def _get(self, key, build):
+        if key not in self._cache:
+            self._cache[key] = build()
+        return self._cache[key]
+
+    @property
+    def merged(self):
+        return self._get("merged", lambda: shapefile_columns(merge_vtds(self.shapefile, self.election_csv)))
+
+    @property
+    def csr(self):
+        return self._get("csr", lambda: build_csr_graph(self.merged))
+
+    @property
+    def graph(self):
+        return self._get("graph", lambda: self.csr.to_gerrychain())
+
+    @property
+    def connected(self):
+        def largest_component():
+            if nx.is_connected(self.graph):
+                return self.graph
+            return self.graph.subgraph(max(nx.connected_components(self.graph), key=len)).copy()
+        return self._get("connected", largest_component)
+
+    @property
+    def vtds(self):
+        return self._get("vtds", lambda: vtd_lookups(self.merged))
+
+    @property
+    def grown(self):
+        def grow():
+            random.seed(0)
+            _, max_pop = population_bounds(self.merged)
+            return grow_districts(self.graph, choose_seeds(self.merged), self.vtds, max_pop, verbose=False)
+        return self._get("grown", grow)
+
+    @property
+    def plan(self):
+        # A balanced seed plan for the chain, metrics and dissolve cases
+        return self._get("plan", lambda: tree_part(self.connected, 0.20))
+
+
+def tree_part(graph, epsilon, partition=recursive_tree_part):
+    ideal_pop = sum(graph.nodes[n]["population"] for n in graph.nodes) / NUM_DISTRICTS
+    return partition(graph, parts=list(range(NUM_DISTRICTS)), pop_col="population",
+                     pop_target=ideal_pop, epsilon=epsilon, node_repeats=1)
+
+
+# --- cases: each takes a Dataset and params, returns the number of work units done ---
+# (or (units, extra), where the dict `extra` is recorded with the timings)
+
+def case_load_merge(ds, params):
+    merge_vtds(ds.shapefile, ds.election_csv)
+    return 1
+
+
+def case_adjacency(ds, params):
+    build_csr_graph(ds.merged)
+    return 1
+
+
+def case_greedy_growth(ds, params):
+    _, max_pop = population_bounds(ds.merged)
+    grow_districts(ds.graph, choose_seeds(ds.merged), ds.vtds, max_pop, verbose=False)
+    return 1
+
+
+def case_anneal(ds, params):
+    min_pop, max_pop = population_bounds(ds.merged)
+    anneal(ds.graph, ds.grown, ds.vtds, min_pop, max_pop, max_iter=params["iterations"],
+           rng=random.Random(0), verbose=False)
+    return params["iterations"]
+
+
+def case_recom(ds, params):
+    graph = ds.connected
+    ideal_pop = sum(graph.nodes[n]["population"] for n in graph.nodes) / NUM_DISTRICTS
+    partition = GeographicPartition(graph, ds.plan, updaters={
+        "population": Tally("population", alias="population"),
+        "dem": Tally("dem", alias="dem"),
+        "rep": Tally("rep", alias="rep"),
+    })
+    chain = MarkovChain(
+        proposal=lambda p: proposals.recom(p, pop_col="population", pop_target=ideal_pop, epsilon=0.20),
+        constraints=[constraints.within_percent_of_ideal_population(partition, 0.20)],
+        accept=accept.always_accept,
+        initial_state=partition,
+        total_steps=params["steps"],
+    )
+    for _ in chain:
+        pass
+    return params["steps"]
+
+
+def case_tree_part(ds, params):
+    tree_part(ds.connected, params["epsilon"])
+    return 1
+
+
+def case_array_tree_part(ds, params):
+    tree_part(ds.connected, params["epsilon"], tree_partition.recursive_tree_part)
+    return 1
+
+
+def case_county_tree_part(ds, params):
+    # Compare with array_tree_part_eps_0.01; the counties split are recorded alongside
+    ideal_pop = sum(ds.connected.nodes[n]["population"] for n in ds.connected.nodes) / NUM_DISTRICTS
+    counties = dict(zip(ds.merged["GEOID20"], ds.merged["county"]))
+    _, stats = county_tree_part(ds.connected, list(range(NUM_DISTRICTS)), ideal_pop, "population",
+                                params["epsilon"], counties)
+    return 1, {"counties_split": stats["counties_split"], "extra_pieces": stats["extra_pieces"]}
+
+
+def case_seed_plan(ds, params):
+    # One in-process attempt after another, so the timing is the cost of the first success
+    _, log = seed_plan(ds.connected, NUM_DISTRICTS, "population", params["epsilon"], params.get("schedule"),
+                       seed=random.randrange(1 << 20), verbose=False)
+    return len(log)
+
+
+def case_multilevel(ds, params):
+    # Compare with array_tree_part_eps_0.01 (tree) and greedy_growth + anneal (anneal); an
+    # invalid plan is timed all the same and recorded as such
+    _, log = multilevel_plan(ds.csr, params["planner"], NUM_DISTRICTS, params.get("epsilon", 0.01),
+                             anneal_iter=params.get("iterations", 2000), verbose=False, require_valid=False)
+    return sum(entry["nodes"] for entry in log), {"valid": log[-1]["valid"]}
+
+
+def case_metrics(ds, params):
+    # The post-assignment analysis block of create_neutral_districts.py, pandas as written
+    # there, without the printing
+    assignment_df = pd.DataFrame({"GEOID20": list(ds.plan), "district": list(ds.plan.values())})
+    vtd_data = pd.read_csv(ds.election_csv, dtype={"GEOID20": str})
+    merged = assignment_df.merge(vtd_data, on="GEOID20")
+    district_pops = merged.groupby("district")["pop"].sum()
+    ideal_pop = district_pops.sum() / NUM_DISTRICTS
+    (district_pops - ideal_pop).abs() / ideal_pop
+    merged.groupby("county")["district"].nunique()
+    merged["vap_black_share"] = merged["vap_black"] / merged["vap"]
+    merged["vap_hisp_share"] = merged["vap_hisp"] / merged["vap"]
+    district_vap = merged.groupby("district").agg({"vap": "sum", "vap_black": "sum", "vap_hisp": "sum"})
+    district_vap["black_share"] = district_vap["vap_black"] / district_vap["vap"]
+    district_vap["hisp_share"] = district_vap["vap_hisp"] / district_vap["vap"]
+    (district_vap[["black_share", "hisp_share"]] >= 0.5).any(axis=1)
+    district_votes = merged.groupby("district").agg({"pre_20_dem_bid": "sum", "pre_20_rep_tru": "sum"})
+    district_votes["dem_share"] = district_votes["pre_20_dem_bid"] / (district_votes["pre_20_dem_bid"] + district_votes["pre_20_rep_tru"])
+    district_votes["winner"] = district_votes["dem_share"].apply(lambda x: "Dem" if x > 0.5 else "Rep")
+    district_votes["winner"].value_counts()
+    for group in ["pop_white", "pop_black", "pop_hisp"]:
+        merged[f"{group}_share"] = merged[group] / merged["pop"]
+    merged.groupby("district").agg({"pop_white_share": "var", "pop_black_share": "var",
+                                    "pop_hisp_share": "var"}).mean(axis=1)
+    district_votes["total_votes"] = district_votes["pre_20_dem_bid"] + district_votes["pre_20_rep_tru"]
+    district_votes["dem_wasted"] = district_votes.apply(lambda r: r["pre_20_dem_bid"] - r["total_votes"]//2 if r["dem_share"] > 0.5 else r["pre_20_dem_bid"], axis=1)
+    district_votes["rep_wasted"] = district_votes.apply(lambda r: r["pre_20_rep_tru"] - r["total_votes"]//2 if r["dem_share"] < 0.5 else r["pre_20_rep_tru"], axis=1)
+    district_votes["dem_share"].mean() - district_votes["dem_share"].median()
+    return 1
+
+
+def case_plan_metrics(ds, params):
+    # The same metrics as computed by plan_metrics.py, plus the graph-based Polsby-Popper
+    # create_neutral_districts.py reports; compare with metrics
+    geoids = list(ds.plan)
+    plans = np.array([[ds.plan[g] for g in geoids]])
+    plan_metrics(plans, load_vtd_arrays(geoids, ds.election_csv), NUM_DISTRICTS)
+    PerimeterTally(ds.connected, ds.plan).mean_polsby_popper()
+    return 1
+
+
+def case_compactness(ds, params):
+    # Graph-based Polsby-Popper from the CSR columns, checked against the dissolved district
+    # polygons it stands in for; the largest per-district difference is recorded
+    csr = ds.csr.largest_component()
+    labels = np.array([[ds.plan[g] for g in csr.geoids.tolist()]])
+    polsby_popper = district_compactness(labels, csr, NUM_DISTRICTS)[2][0]
+    assignment = pd.DataFrame({"GEOID20": list(ds.plan), "district": list(ds.plan.values())})
+    reference = dissolve_compactness(ds.merged[["GEOID20", "geometry"]], assignment)["polsby_popper"]
+    difference = np.abs(polsby_popper[reference.index.to_numpy()] - reference.to_numpy())
+    return 1, {"max_polsby_popper_difference": float(difference.max()),
+               "mean_polsby_popper": float(polsby_popper.mean())}
+
+
+def case_dissolve(ds, params):
+    assignment = pd.DataFrame({"GEOID20": list(ds.plan), "district": list(ds.plan.values())})
+    ds.merged.merge(assignment, on="GEOID20").dissolve(by="district", aggfunc={"pop": "sum"})
+    return 1
+
+
+# name -> (function, params, Dataset products built before the clock starts)
+CASES = {
+    "load_merge": (case_load_merge, {}, []),
+    "adjacency": (case_adjacency, {}, ["merged"]),
+    "greedy_growth": (case_greedy_growth, {}, ["graph", "vtds"]),
+    "anneal": (case_anneal, {"iterations": 2000}, ["grown"]),
+    "recom": (case_recom, {"steps": 20}, ["plan"]),
+    "tree_part_eps_0.01": (case_tree_part, {"epsilon": 0.01}, ["connected"]),
+    "tree_part_eps_0.20": (case_tree_part, {"epsilon": 0.20}, ["connected"]),
+    "array_tree_part_eps_0.01": (case_array_tree_part, {"epsilon": 0.01}, ["connected"]),
+    "array_tree_part_eps_0.20": (case_array_tree_part, {"epsilon": 0.20}, ["connected"]),
+    "county_tree_part_eps_0.01": (case_county_tree_part, {"epsilon": 0.01}, ["connected"]),
+    "seed_plan_eps_0.01": (case_seed_plan, {"epsilon": 0.01}, ["connected"]),
+    "seed_plan_schedule_0.01": (case_seed_plan, {"epsilon": 0.01, "schedule": [0.05, 0.01]}, ["connected"]),
+    "multilevel_tree_eps_0.01": (case_multilevel, {"planner": "tree", "epsilon": 0.01}, ["csr"]),
+    "multilevel_anneal": (case_multilevel, {"planner": "anneal", "iterations": 2000}, ["csr"]),
+    "metrics": (case_metrics, {}, ["plan"]),
+    "plan_metrics": (case_plan_metrics, {}, ["plan"]),
+    "compactness": (case_compactness, {}, ["plan"]),
+    "dissolve": (case_dissolve, {}, ["plan"]),
+}
+
+
+def run_case(ds, name, repeat, seed):
+    func, params, inputs = CASES[name]
+    result = {"dataset": ds.name, "case": name, "params": params}
+    missing = [p for p in (ds.shapefile, ds.election_csv) if not os.path.exists(p)]
+    if missing:
+        return dict(result, skipped=f"missing input: {', '.join(missing)}")
+    try:
+        for attr in inputs:
+            getattr(ds, attr)
+        seconds = []
+        for _ in range(repeat):
+            random.seed(seed)
+            np.random.seed(seed)
+            start = time.perf_counter()
+            units = func(ds, params)
+            seconds.append(time.perf_counter() - start)
+        units, extra = units if isinstance(units, tuple) else (units, {})
+        random.seed(seed)
+        np.random.seed(seed)
+        tracemalloc.start()
+        try:
+            func(ds, params)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    except RuntimeError as e:
+        # e.g. greedy growth stalling on an unlucky layout; record it rather than abort the run
+        return dict(result, skipped=f"failed: {e}")
+    result.update(
+        seconds=seconds,
+        median_seconds=float(np.median(seconds)),
+        units=units,
+        # A case that did no work (units == 0) has no per-unit time
+        seconds_per_unit=float(np.median(seconds)) / units if units else None,
+        peak_mb=peak / 1e6,
+        **extra,
+    )
+    return result
+
+
+def lattice_dataset(width, height, workdir, seed):
+    shapes, data = lattice_vtds(width, height, seed)
+    name = f"lattice_{width}x{height}"
+    shapefile = os.path.join(workdir, f"{name}.shp")
+    election_csv = os.path.join(workdir, f"{name}.csv")
+    shapes.to_file(shapefile)
+    data.to_csv(election_csv, index=False)
+    return Dataset(name, shapefile, election_csv)
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    import gerrychain
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit or None,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": {"numpy": np.__version__, "pandas": pd.__version__, "geopandas": gpd.__version__,
+                     "networkx": nx.__version__, "gerrychain": getattr(gerrychain, "__version__", None)},
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["dataset"], r["case"]): r for r in json.load(f)["results"] if "median_seconds" in r}
+    print(f"\nCompared with {baseline_path} (ratio > 1 means slower now):")
+    for r in results:
+        old = baseline.get((r["dataset"], r["case"]))
+        if old and "median_seconds" in r:
+            print(f"  {r['dataset']:<18} {r['case']:<24} {r['median_seconds'] / old['median_seconds']:6.2f}x time  "
+                  f"{r['peak_mb'] / max(old['peak_mb'], 1e-9):6.2f}x memory")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the pipeline's hot paths and record the results as JSON")
+    parser.add_argument("--datasets", nargs="+", default=["lattice", "florida"], choices=["lattice", "florida"])
+    parser.add_argument("--lattice", nargs="+", default=["40x40", "80x80"], help="lattice sizes as WIDTHxHEIGHT")
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=list(CASES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shapefile", default=SHAPEFILE)
+    parser.add_argument("--election-csv", default=ELECTION_CSV)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        datasets = []
+        if "lattice" in args.datasets:
+            for size in args.lattice:
+                width, height = map(int, size.lower().split("x"))
+                datasets.append(lattice_dataset(width, height, workdir, args.seed))
+        if "florida" in args.datasets:
+            datasets.append(Dataset("florida", args.shapefile, args.election_csv))
+        for ds in datasets:
+            for name in args.cases:
+                r = run_case(ds, name, args.repeat, args.seed)
+                results.append(r)
+                if "skipped" in r:
+                    print(f"{ds.name:<18} {name:<24} skipped ({r['skipped']})")
+                else:
+                    per_unit = "n/a" if r["seconds_per_unit"] is None else f"{r['seconds_per_unit'] * 1e3:9.3f}"
+                    print(f"{ds.name:<18} {name:<24} {r['median_seconds']:9.3f}s  "
+                          f"{per_unit:>9} ms/unit  {r['peak_mb']:8.1f} MB peak")
+
+    with open(args.output, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
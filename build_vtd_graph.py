@@ -1,25 +1,31 @@
 import geopandas as gpd
-import networkx as nx
-from gerrychain import Graph
+from adjacency import build_csr
+from csr_graph import GRAPH_DIR
 
-# Load merged shapefile (created in preprocess_vtd_data.py)
-merged = gpd.read_file("merged_vtds.shp")
+# Node attribute aliases the planners read, and the shapefile columns they come from
+NODE_ALIASES = {"population": "pop", "dem": "pre_20_dem", "rep": "pre_20_rep"}
 
-# Set index to GEOID20 so graph nodes use GEOID20 as keys
-merged = merged.set_index("GEOID20")
 
+def build_csr_graph(merged, adjacency="rook", workers=None, verbose=False):
+	# Equal-area projection, so the area/boundary_perim/shared_perim attributes are in square
+	# meters and meters (used by compactness.py)
+	merged = merged.to_crs(epsg=6933)
 
-# Build adjacency graph (nodes will be GEOID20)
-graph = Graph.from_geodataframe(merged)
+	# Adjacency from a bulk spatial-index query; nodes are GEOID20 in shapefile order and carry
+	# every numeric column (pop, votes, vap, vap_black, vap_hisp, ...)
+	csr = build_csr(merged, adjacency, "GEOID20", workers, verbose)
 
-# Attach population and partisan vote attributes to each node
-for node, row in merged.iterrows():
-	graph.nodes[node]["population"] = row["pop"]  # Adjust column name as needed
-	graph.nodes[node]["dem"] = row["pre_20_dem"]
-	graph.nodes[node]["rep"] = row["pre_20_rep"]
+	# Population and partisan vote aliases, written as whole columns
+	for name, column in NODE_ALIASES.items():
+		csr.columns[name] = csr.columns[column]
+	return csr
 
-# Save graph for use in gerrymandering pipeline
-import pickle
-with open("vtd_graph.gpickle", "wb") as f:
-	pickle.dump(graph, f)
-print("Adjacency graph created and saved as vtd_graph.gpickle.")
+
+if __name__ == "__main__":
+	# Load merged shapefile (created in preprocess_vtd_data.py)
+	merged = gpd.read_file("merged_vtds.shp")
+	csr = build_csr_graph(merged, verbose=True)
+
+	# Save graph as memory-mappable CSR arrays for use in gerrymandering pipeline
+	csr.save(GRAPH_DIR)
+	print(f"Adjacency graph created and saved to {GRAPH_DIR}/ ({csr.num_nodes} nodes, {csr.num_edges} edges).")
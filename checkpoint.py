@@ -0,0 +1,91 @@
+import os
+import io
+import json
+import time
+import numpy as np
+
+# Periodic, crash-safe snapshots for long planner runs. A checkpoint is one .npz file: the
+# bulky state (assignments, border lists, RNG words) as typed NumPy arrays and everything
+# else (iteration, temperature, counters) as a JSON "meta" entry. It is written to a
+# temporary file, fsynced and renamed over the previous one, so a crash mid-write leaves the
+# last good checkpoint in place. Checkpointer rate-limits writes to at most one per `every`
+# seconds and, if writes turn out slow, to at most `max_share` of the run's wall time.
+
+
+def write_checkpoint(path, arrays, meta):
+    """Atomically replace `path` with the given arrays and JSON-able meta dict."""
+    buffer = io.BytesIO()
+    np.savez(buffer, meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8), **arrays)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(buffer.getbuffer())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_checkpoint(path):
+    """(arrays, meta) as written by write_checkpoint."""
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {name: data[name] for name in data.files if name != "meta"}
+        meta = json.loads(data["meta"].tobytes().decode())
+    return arrays, meta
+
+
+def pack_rng(state):
+    """random.Random.getstate() as a uint32 array plus JSON-able extras."""
+    version, words, gauss = state
+    return np.array(words, dtype=np.uint32), {"rng_version": version, "rng_gauss": gauss}
+
+
+def unpack_rng(words, meta):
+    return meta["rng_version"], tuple(int(w) for w in words), meta["rng_gauss"]
+
+
+def pack_assignment(assignment, geoids=None):
+    """(GEOID20 bytes, uint8 districts) in dict order, or in `geoids` order when given.
+
+    Dict order matters for a bit-for-bit resume: the planners iterate their assignment dicts.
+    """
+    if geoids is None:
+        geoids = list(assignment)
+    labels = np.fromiter((assignment[g] for g in geoids), dtype=np.int64, count=len(geoids))
+    if len(labels) and (labels.min() < 0 or labels.max() > 255):
+        raise ValueError("checkpointed district labels must be in 0..255")
+    return np.array(geoids, dtype="S"), labels.astype(np.uint8)
+
+
+def unpack_assignment(geoids, labels):
+    return dict(zip(geoids.astype(str).tolist(), labels.tolist()))
+
+
+class Checkpointer:
+    """Decides when a run should snapshot and writes the snapshot.
+
+    `encode(state)` turns the planner's state dict into (arrays, meta). Call `due()` from the
+    loop (it only reads the clock) and `save(state)` when it returns True.
+    """
+
+    def __init__(self, path, encode, every=60.0, max_share=0.01):
+        self.path = path
+        self.encode = encode
+        self.every = every
+        self.max_share = max_share
+        self.cost = 0.0
+        self.saves = 0
+        self._last = time.perf_counter()
+
+    def due(self):
+        return time.perf_counter() - self._last >= max(self.every, self.cost / self.max_share)
+
+    def save(self, state):
+        start = time.perf_counter()
+        arrays, meta = self.encode(state)
+        write_checkpoint(self.path, arrays, meta)
+        self._last = time.perf_counter()
+        self.cost = self._last - start
+        self.saves += 1
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,116 @@
+import math
+import numpy as np
+
+# Polsby-Popper without geometry. build_vtd_graph.py builds the graph in an equal-area
+# projection (EPSG:6933), so gerrychain stores each VTD's "area", the length of its outer
+# state/water boundary as "boundary_perim" and each shared border as the edge's
+# "shared_perim". A district's perimeter is then its VTDs' outer boundary plus every
+# shared border with a VTD in another district.
+
+
+class PerimeterTally:
+    """Per-district area, perimeter and cut-edge count, updated as single VTDs flip.
+
+    Only the flipped VTD's source and destination districts change; a neighbor in a third
+    district borders the VTD both before and after the move.
+    """
+
+    def __init__(self, graph, assignment):
+        # assignment: node -> district, shared with the caller and kept current by it
+        self.assignment = assignment
+        self.node_area = {n: graph.nodes[n].get("area", 0.0) for n in graph.nodes}
+        self.node_boundary = {n: graph.nodes[n].get("boundary_perim", 0.0) for n in graph.nodes}
+        self.adj = {n: [(nbr, graph.edges[n, nbr].get("shared_perim", 0.0)) for nbr in graph.neighbors(n)]
+                    for n in graph.nodes}
+        self.area = {}
+        self.perimeter = {}
+        self.cut_edges = 0
+        for node, d in assignment.items():
+            self.area[d] = self.area.get(d, 0.0) + self.node_area[node]
+            self.perimeter[d] = self.perimeter.get(d, 0.0) + self.node_boundary[node]
+            for nbr, length in self.adj[node]:
+                c = assignment.get(nbr)
+                if c is not None and c != d:
+                    self.perimeter[d] += length
+                    if node < nbr:
+                        self.cut_edges += 1
+        self._last = None
+
+    def move(self, node, src, dst):
+        """Account for `node` moving from src to dst (assignment already updated)."""
+        self._last = (src, dst, self.area[src], self.perimeter[src],
+                      self.area.get(dst, 0.0), self.perimeter.get(dst, 0.0), self.cut_edges)
+        area = self.node_area[node]
+        self.area[src] -= area
+        self.area[dst] = self.area.get(dst, 0.0) + area
+        self.perimeter[src] -= self.node_boundary[node]
+        self.perimeter[dst] = self.perimeter.get(dst, 0.0) + self.node_boundary[node]
+        for nbr, length in self.adj[node]:
+            c = self.assignment.get(nbr)
+            if c is None:
+                continue
+            if c == src:
+                # Interior edge of src becomes a border between src and dst
+                self.perimeter[src] += length
+                self.perimeter[dst] += length
+                self.cut_edges += 1
+            elif c == dst:
+                # Border between src and dst becomes interior to dst
+                self.perimeter[src] -= length
+                self.perimeter[dst] -= length
+                self.cut_edges -= 1
+            else:
+                self.perimeter[src] -= length
+                self.perimeter[dst] += length
+
+    def undo(self):
+        src, dst, area_src, perim_src, area_dst, perim_dst, cut_edges = self._last
+        self.area[src], self.perimeter[src] = area_src, perim_src
+        self.area[dst], self.perimeter[dst] = area_dst, perim_dst
+        self.cut_edges = cut_edges
+        self._last = None
+
+    def polsby_popper(self):
+        return {d: 4 * math.pi * self.area[d] / self.perimeter[d] ** 2
+                for d in self.area if self.perimeter[d] > 0}
+
+    def mean_polsby_popper(self):
+        scores = self.polsby_popper()
+        return sum(scores.values()) / len(scores)
+
+
+def district_compactness(plans, csr, k):
+    """Batched version over a (plans x VTDs) matrix in the CSR graph's node order.
+
+    Returns (area, perimeter, polsby_popper) as (plans x k) arrays and cut edges per plan.
+    """
+    plans = np.atleast_2d(plans)
+    num_plans = plans.shape[0]
+    offsets = (np.arange(num_plans) * k)[:, None]
+
+    def sums(index, weights):
+        return np.bincount((index + offsets).ravel(), weights=np.broadcast_to(weights, index.shape).ravel(),
+                           minlength=num_plans * k).reshape(num_plans, k)
+
+    u, v = csr.edge_pairs()
+    src = np.repeat(np.arange(csr.num_nodes), np.diff(csr.indptr))
+    length = csr.edge_columns["shared_perim"][src < csr.indices]
+    cut = plans[:, u] != plans[:, v]
+    area = sums(plans, csr.columns["area"])
+    # Each cut edge adds its shared length to the districts on both sides
+    perimeter = (sums(plans, csr.columns["boundary_perim"])
+                 + sums(plans[:, u], length * cut) + sums(plans[:, v], length * cut))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        polsby_popper = 4 * np.pi * area / perimeter ** 2
+    return area, perimeter, polsby_popper, cut.sum(axis=1)
+
+
+def dissolve_compactness(gdf, assignment_df):
+    """Reference numbers from dissolved district polygons, for checking the tallies."""
+    gdf = gdf.merge(assignment_df, on="GEOID20")
+    district_shapes = gdf.dissolve(by="district")
+    district_shapes = district_shapes.to_crs(epsg=6933)  # Equal-area projection for area/perimeter
+    district_shapes["area"] = district_shapes.geometry.area
+    district_shapes["perim"] = district_shapes.geometry.length
+    district_shapes["polsby_popper"] = 4 * math.pi * district_shapes["area"] / (district_shapes["perim"] ** 2)
+    return district_shapes[["area", "perim", "polsby_popper"]]
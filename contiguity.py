@@ -0,0 +1,152 @@
+import time
+import random
+from collections import deque
+
+
+def is_contiguous(neighbors, district_set, remove=None, add=None):
+    # Full check: BFS over the whole district after removing/adding a VTD
+    nodes = set(district_set)
+    if remove is not None:
+        nodes.discard(remove)
+    if add is not None:
+        nodes.add(add)
+    if not nodes:
+        return True
+    start = next(iter(nodes))
+    seen = set([start])
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        for nbr in neighbors(node):
+            if nbr in nodes and nbr not in seen:
+                seen.add(nbr)
+                queue.append(nbr)
+    return seen == nodes
+
+
+def addition_keeps_contiguous(neighbors, district_set, node):
+    """Adding `node` to a contiguous district keeps it contiguous iff it touches the district."""
+    if not district_set:
+        return True
+    return any(nbr in district_set for nbr in neighbors(node))
+
+
+def removal_keeps_contiguous(neighbors, district_set, node):
+    """Decide whether a contiguous district stays contiguous after removing `node`.
+
+    Same answer as `is_contiguous(neighbors, district_set, remove=node)` as long as the
+    district is contiguous beforehand. Only the node's neighborhood is inspected unless
+    its in-district neighbors are not linked to each other directly, in which case a
+    search runs from each group of neighbors at once and stops as soon as they meet or
+    one of them runs out of nodes.
+    """
+    targets = [nbr for nbr in neighbors(node) if nbr in district_set and nbr != node]
+    if len(targets) <= 1:
+        return True
+
+    # Local check: group the in-district neighbors by adjacency among themselves
+    target_set = set(targets)
+    group = {}
+    for t in targets:
+        if t in group:
+            continue
+        group[t] = t
+        stack = [t]
+        while stack:
+            u = stack.pop()
+            for w in neighbors(u):
+                if w in target_set and w not in group:
+                    group[w] = t
+                    stack.append(w)
+    roots = set(group.values())
+    if len(roots) == 1:
+        return True
+
+    # Bounded search: one BFS per group, run in lockstep. Groups merge when their searches
+    # meet; the first search to exhaust on its own proves the district would split.
+    parent = {r: r for r in roots}
+
+    def find(r):
+        while parent[r] != r:
+            parent[r] = parent[parent[r]]
+            r = parent[r]
+        return r
+
+    owner = {node: None}
+    queues = {}
+    for t, r in group.items():
+        owner[t] = r
+        queues.setdefault(r, deque()).append(t)
+    while True:
+        for r in list(queues):
+            if r not in queues:
+                continue
+            queue = queues[r]
+            if not queue:
+                return False
+            u = queue.popleft()
+            for w in neighbors(u):
+                if w not in district_set:
+                    continue
+                if w not in owner:
+                    owner[w] = r
+                    queue.append(w)
+                    continue
+                if owner[w] is None:
+                    continue
+                a, b = find(owner[w]), find(r)
+                if a != b:
+                    parent[a] = b
+                    queues[b].extend(queues.pop(a))
+                    if len(queues) == 1:
+                        return True
+                    # Keep expanding under the merged root
+                    r, queue = b, queues[b]
+
+
+def _lattice(width, height):
+    neighbors = {}
+    for i in range(width):
+        for j in range(height):
+            neighbors[(i, j)] = [(i + a, j + b) for a, b in ((1, 0), (-1, 0), (0, 1), (0, -1))
+                                 if 0 <= i + a < width and 0 <= j + b < height]
+    return neighbors
+
+
+def benchmark(width=90, height=80, num_districts=27, trials=5000, seed=0):
+    """Time the local oracle against the full BFS on a striped lattice and check they agree."""
+    rng = random.Random(seed)
+    adj = _lattice(width, height)
+    neighbors = adj.__getitem__
+    # Vertical stripes are contiguous; nodes on a stripe's edge are the flip candidates
+    stripe = width / num_districts
+    districts = {}
+    for node in adj:
+        districts.setdefault(int(node[0] // stripe), set()).add(node)
+    candidates = [(node, d) for d, nodes in districts.items() for node in nodes
+                  if any(nbr not in nodes for nbr in adj[node])]
+    # Carve random holes so some removals actually disconnect their district
+    for d, nodes in districts.items():
+        for node in rng.sample(sorted(nodes), len(nodes) // 10):
+            nodes.discard(node)
+            if not is_contiguous(neighbors, nodes):
+                nodes.add(node)
+    candidates = [(node, d) for node, d in candidates if node in districts[d]]
+    picks = [rng.choice(candidates) for _ in range(trials)]
+
+    start = time.perf_counter()
+    full = [is_contiguous(neighbors, districts[d], remove=node) for node, d in picks]
+    full_time = time.perf_counter() - start
+    start = time.perf_counter()
+    local = [removal_keeps_contiguous(neighbors, districts[d], node) for node, d in picks]
+    local_time = time.perf_counter() - start
+    assert full == local, "local contiguity oracle disagrees with is_contiguous"
+    print(f"{trials} checks on a {width}x{height} lattice, {num_districts} districts "
+          f"({sum(not x for x in full)} disconnecting)")
+    print(f"is_contiguous:            {full_time:.3f}s")
+    print(f"removal_keeps_contiguous: {local_time:.3f}s ({full_time / local_time:.1f}x faster)")
+    return full_time, local_time
+
+
+if __name__ == "__main__":
+    benchmark()
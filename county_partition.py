@@ -0,0 +1,299 @@
+import time
+import random
+import argparse
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from csr_graph import CSRGraph
+from plan_metrics import VTD_DATA_CSV, county_splits
+from tree_partition import MAX_ATTEMPTS, SpanningTree, bipartition, graph_arrays, tree_part_labels
+
+# County-aware recursive partitioning. Districts are carved one at a time as in
+# tree_partition, but the spanning trees are drawn on the county quotient graph: one node per
+# county piece (a connected run of one county's remaining VTDs), one edge per pair of
+# touching pieces. Florida has 67 counties, so a tree costs next to nothing. A tree edge
+# with a balanced side carves a district out of whole county pieces. When a tree has no such
+# edge, one piece is split: a side that is short of population is topped up with VTDs from
+# the piece across the edge, drawn as a VTD-level tree of that piece rooted at the side.
+# A piece large enough for a district on its own may also have one carved out of it. Only
+# counties that have to be split are ever descended into.
+#
+# CountySplitTally keeps the number of county splits current under single-VTD flips for the
+# annealer; split_count and within_county_splits do the same job for gerrychain chains.
+
+TOP_UP_TREES = 10  # VTD-level trees tried per split before drawing a new quotient tree
+CONNECTIVITY_CHECKS = 3  # fitting cuts per tree checked for keeping the rest connected
+COUNTY_ATTEMPTS = 200  # quotient trees per district before falling back to a VTD-level cut
+
+
+def county_codes(geoids, csv_path=VTD_DATA_CSV):
+    """(integer county code per GEOID20, county names) in `geoids` order."""
+    vtd = pd.read_csv(csv_path, dtype={"GEOID20": str}, usecols=["GEOID20", "county"]).set_index("GEOID20")
+    codes, names = pd.factorize(vtd["county"].loc[list(geoids)])
+    return codes, list(names)
+
+
+def _components(mask, u, v):
+    """Component id of every node in `mask` (-1 elsewhere), 0..c-1."""
+    n = len(mask)
+    keep = mask[u] & mask[v]
+    _, component = connected_components(coo_matrix((np.ones(keep.sum()), (u[keep], v[keep])), shape=(n, n)),
+                                        directed=False)
+    ids = np.full(n, -1)
+    ids[mask] = np.unique(component[mask], return_inverse=True)[1]
+    return ids
+
+
+def county_pieces(alive, u, v, codes):
+    """Piece id 0..m-1 of every alive node (-1 for the rest): connected runs of one county."""
+    same = codes[u] == codes[v]
+    return _components(alive, u[same], v[same])
+
+
+def quotient_graph(pieces, u, v, pops):
+    """(piece populations, u, v) of the graph with every piece contracted to one node."""
+    m = int(pieces.max()) + 1
+    alive = pieces >= 0
+    piece_pops = np.bincount(pieces[alive], weights=pops[alive], minlength=m)
+    pu, pv = pieces[u], pieces[v]
+    keep = (pu >= 0) & (pv >= 0) & (pu != pv)
+    keys = np.unique(np.minimum(pu, pv)[keep].astype(np.int64) * m + np.maximum(pu, pv)[keep])
+    return piece_pops, keys // m, keys % m
+
+
+def _top_up(alive, base, nodes, u, v, pops, fits, rng, stats):
+    """District mask: `base` plus a connected part of `nodes` next to it, with `fits(pop)`.
+
+    The part is the root side of a random spanning tree of `nodes` with `base` contracted to
+    the root, so the rest of `nodes` is a subtree and stays in one piece. A few fitting cuts
+    per tree are checked for leaving the rest of the region connected. An empty `base`
+    carves the district out of `nodes` alone. None if no tried tree has a usable cut.
+    """
+    s = len(nodes)
+    has_base = base.any()
+    local = np.full(len(alive), -1)
+    local[nodes] = np.arange(s)
+    local[base] = s
+    lu, lv = local[u], local[v]
+    keep = (lu >= 0) & (lv >= 0) & (lu != lv)
+    lu, lv = lu[keep], lv[keep]
+    local_pops = np.append(pops[nodes], pops[base].sum()) if has_base else pops[nodes]
+    for _ in range(TOP_UP_TREES):
+        stats["trees"] = stats.get("trees", 0) + 1
+        tree = SpanningTree(len(local_pops), lu, lv, rng, root=s if has_base else None)
+        below = tree.subtree_populations(local_pops)
+        candidates = tree.order[1:]
+        ok = np.flatnonzero(fits(local_pops.sum() - below[candidates]))
+        for k in rng.permutation(ok)[:CONNECTIVITY_CHECKS]:
+            part = ~tree.subtree(candidates[k])
+            district = base.copy()
+            district[nodes[part[:s]]] = True
+            if _components(alive & ~district, u, v).max() <= 0:
+                return district
+    return None
+
+
+def _carve(alive, u, v, pops, codes, lo, hi, rest, rng, max_attempts, stats, deadline):
+    """Mask of one district with population in [lo, hi], mostly along county lines. With
+    `rest` = (lo, hi), what is left of the region must be in that range too."""
+    pieces = county_pieces(alive, u, v, codes)
+    piece_pops, qu, qv = quotient_graph(pieces, u, v, pops)
+    m = len(piece_pops)
+    total = piece_pops.sum()
+
+    def fits(pop):
+        ok = (pop >= lo) & (pop <= hi)
+        if rest is not None:
+            ok &= (total - pop >= rest[0]) & (total - pop <= rest[1])
+        return ok
+
+    for _ in range(min(max_attempts, COUNTY_ATTEMPTS)):
+        if deadline is not None and time.perf_counter() > deadline:
+            raise TimeoutError("no balanced cut found before the deadline")
+        stats["trees"] = stats.get("trees", 0) + 1
+        tree = SpanningTree(m, qu, qv, rng)
+        below = tree.subtree_populations(piece_pops)
+        candidates = tree.order[1:]
+        side = below[candidates]
+        inside, outside = fits(side), fits(total - side)
+        choices = np.flatnonzero(inside | outside)
+        if len(choices):
+            k = choices[rng.integers(len(choices))]
+            chosen = tree.subtree(candidates[k])
+            return alive & (chosen if inside[k] else ~chosen)[pieces]
+        # No whole-county cut. Top a short side of a tree edge up from the piece across it
+        # (the parent for a subtree, the child for the rest of the tree), or failing that
+        # carve a district out of one large piece.
+        parents = tree.parent[candidates]
+        splits = [(c, p, False) for c, p, below_c in zip(candidates.tolist(), parents.tolist(), side.tolist())
+                  if below_c < lo <= below_c + piece_pops[p]]
+        splits += [(c, c, True) for c, below_c in zip(candidates.tolist(), side.tolist())
+                   if total - below_c < lo <= total - below_c + piece_pops[c]]
+        if not splits:
+            splits = [(None, q, None) for q in np.flatnonzero(piece_pops >= lo).tolist()]
+        if not splits:
+            continue
+        c, split, complement = splits[rng.integers(len(splits))]
+        if c is None:
+            base = np.zeros(len(alive), dtype=bool)
+        else:
+            subtree = tree.subtree(c)
+            base = alive & (~subtree if complement else subtree)[pieces]
+            base &= pieces != split
+        district = _top_up(alive, base, np.flatnonzero(pieces == split), u, v, pops, fits, rng, stats)
+        if district is not None:
+            stats["top_ups"] = stats.get("top_ups", 0) + 1
+            return district
+    # County pieces too coarse for this window: an ordinary VTD-level cut of the region
+    stats["fallbacks"] = stats.get("fallbacks", 0) + 1
+    ids = np.flatnonzero(alive)
+    local = np.cumsum(alive) - 1
+    keep = alive[u] & alive[v]
+    side = bipartition(len(ids), local[u[keep]], local[v[keep]], pops[ids], lo, hi, rest is None, rng, max_attempts,
+                       deadline, stats)
+    district = np.zeros(len(alive), dtype=bool)
+    district[ids[side]] = True
+    return district
+
+
+def county_tree_part_labels(n, u, v, pops, codes, num_parts, pop_target, epsilon, rng, max_attempts=MAX_ATTEMPTS,
+                            deadline=None, stats=None):
+    """tree_part_labels with the trees drawn on the county quotient graph (see above).
+
+    `stats` also counts the districts that split a county piece ("top_ups") or needed the
+    VTD-level fallback ("fallbacks"), and gets the counties the finished plan splits
+    ("counties_split") and the extra pieces they are split into ("extra_pieces").
+    """
+    stats = {} if stats is None else stats
+    labels = np.full(n, num_parts - 1)
+    alive = np.ones(n, dtype=bool)
+    lb_pop, ub_pop = pop_target * (1 - epsilon), pop_target * (1 + epsilon)
+    debt = 0.0
+    for k in range(num_parts - 1):
+        if k < num_parts - 2:
+            # Same population debt schedule as tree_partition
+            window, rest = (max(lb_pop, lb_pop - debt), min(ub_pop, ub_pop - debt)), None
+        else:
+            window, rest = (lb_pop, ub_pop), (lb_pop, ub_pop)
+        district = _carve(alive, u, v, pops, codes, *window, rest, rng, max_attempts, stats, deadline)
+        labels[district] = k
+        alive[district] = False
+        debt += pops[district].sum() - pop_target
+    counties_split, extra_pieces = county_splits(labels, codes, num_parts)
+    stats["counties_split"], stats["extra_pieces"] = int(counties_split[0]), int(extra_pieces[0])
+    return labels
+
+
+def county_tree_part(graph, parts, pop_target, pop_col, epsilon, counties, rng=random, max_attempts=MAX_ATTEMPTS):
+    """recursive_tree_part's contract, splitting as few counties as it can.
+
+    `counties` maps every node to its county. Returns (node -> part, stats), with the
+    stats of county_tree_part_labels.
+    """
+    nodes, u, v, pops = graph_arrays(graph, pop_col)
+    codes = pd.factorize(pd.Series([counties[node] for node in nodes]))[0]
+    stats = {}
+    labels = county_tree_part_labels(len(nodes), u, v, pops, codes, len(parts), pop_target, epsilon,
+                                     np.random.default_rng(rng.getrandbits(64)), max_attempts, stats=stats)
+    return {node: parts[k] for node, k in zip(nodes, labels.tolist())}, stats
+
+
+def splits_by_county(labels, codes, names):
+    """Districts per county, as a Series indexed by county name, most split first."""
+    pairs = np.unique(np.stack([codes, labels]), axis=1)
+    counts = np.bincount(pairs[0], minlength=len(names))
+    return pd.Series(counts, index=pd.Index(names, name="county"), name="districts").sort_values(ascending=False)
+
+
+class CountySplitTally:
+    """County splits (sum over counties of districts touched minus one) kept up to date as
+    single VTDs flip. Like DistrictTally, `move` is O(1) and can be rolled back with `undo`.
+    """
+
+    def __init__(self, assignment, county):
+        # county: GEOID20 -> county for every VTD in the assignment
+        self.county = county
+        self.vtds = defaultdict(int)  # (county, district) -> VTDs
+        self.districts = defaultdict(int)  # county -> districts it touches
+        for geoid, d in assignment.items():
+            self._add(county[geoid], d)
+        self.splits = sum(n - 1 for n in self.districts.values())
+        self._last = None
+
+    def _add(self, c, d):
+        self.vtds[c, d] += 1
+        if self.vtds[c, d] == 1:
+            self.districts[c] += 1
+
+    def _remove(self, c, d):
+        self.vtds[c, d] -= 1
+        if self.vtds[c, d] == 0:
+            self.districts[c] -= 1
+
+    def splits_after(self, geoid, src, dst):
+        """Splits if `geoid` moved from src to dst, without moving it."""
+        c = self.county[geoid]
+        return self.splits + (self.vtds[c, dst] == 0) - (self.vtds[c, src] == 1)
+
+    def move(self, geoid, src, dst):
+        c = self.county[geoid]
+        self._last = (c, src, dst, self.splits)
+        self.splits = self.splits_after(geoid, src, dst)
+        self._remove(c, src)
+        self._add(c, dst)
+        return self.splits
+
+    def undo(self):
+        c, src, dst, splits = self._last
+        self._remove(c, dst)
+        self._add(c, src)
+        self.splits = splits
+        self._last = None
+
+
+def split_count(partition):
+    """gerrychain updater: total county splits, from the "county_splits" updater."""
+    return sum(len(info.contains) - 1 for info in partition["county_splits"].values())
+
+
+def within_county_splits(max_splits):
+    """gerrychain constraint: at most `max_splits` county splits (needs the "splits" updater)."""
+    def constraint(partition):
+        return partition["splits"] <= max_splits
+    return constraint
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="County-aware tree partitioning, compared with the plain one")
+    parser.add_argument("--districts", type=int, default=28)
+    parser.add_argument("--epsilon", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="county_assignment.csv")
+    args = parser.parse_args()
+
+    csr = CSRGraph.load()
+    codes, names = county_codes(csr.geoids.tolist())
+    u, v = csr.edge_pairs()
+    pops = np.asarray(csr.columns["population"], dtype=float)
+    ideal_pop = pops.sum() / args.districts
+    results = {}
+    for name, partition in (("tree", tree_part_labels), ("county", county_tree_part_labels)):
+        extra = (codes,) if name == "county" else ()
+        stats = {}
+        start = time.perf_counter()
+        labels = partition(csr.num_nodes, u, v, pops, *extra, args.districts, ideal_pop, args.epsilon,
+                           np.random.default_rng(args.seed), stats=stats)
+        seconds = time.perf_counter() - start
+        counties_split, extra_pieces = county_splits(labels, codes, args.districts)
+        deviation = np.abs(np.bincount(labels, weights=pops) / ideal_pop - 1).max()
+        results[name] = labels
+        print(f"{name}: {seconds:.2f}s, {stats.get('trees', 0)} trees, {counties_split[0]} counties split "
+              f"into {extra_pieces[0]} extra pieces, max deviation {deviation:.4f}")
+    report = splits_by_county(results["county"], codes, names)
+    print("\nDistricts per split county:")
+    print(report[report > 1].to_string())
+    pd.DataFrame({"GEOID20": csr.geoids, "district": results["county"]}).to_csv(args.output, index=False)
+    print(f"County-aware assignment saved to {args.output}")
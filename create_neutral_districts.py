@@ -1,40 +1,56 @@
-import geopandas as gpd
+import os
+import numpy as np
 import pandas as pd
-import networkx as nx
-from gerrychain import Graph
-from gerrychain.tree import recursive_tree_part
-import pickle
+from seed_plans import seed_plan
+from county_partition import county_codes
+from csr_graph import CSRGraph
+from compactness import district_compactness
+from instrumentation import telemetry
 
 # --- PARAMETERS ---
-SHAPEFILE = "merged_vtds.shp"
 OUTPUT_CSV = "neutral_district_assignment.csv"
 NUM_DISTRICTS = 28  # Set as needed
 POP_COL = "pop"
+EPSILON = 0.01  # 1% population deviation
+SEED_SCHEDULE = None  # e.g. [0.05, 0.01]: draw at 5%, then balance down to 1%
+SEED_WORKERS = os.cpu_count()
+SEED_TIMEOUT = 60.0  # seconds per attempt
+SEED_BUDGET = 600.0  # seconds for the whole search
+COUNTY_AWARE = False  # True: draw trees on the county graph, splitting as few counties as possible (much slower)
 
-# --- LOAD SHAPEFILE ---
-gdf = gpd.read_file(SHAPEFILE)
-gdf = gdf.set_index("GEOID20")
+trace = telemetry("create_neutral_districts")
 
-# --- BUILD ADJACENCY GRAPH ---
-graph = Graph.from_geodataframe(gdf)
-for node, row in gdf.iterrows():
-    graph.nodes[node]["population"] = row[POP_COL]
+# --- LOAD ADJACENCY GRAPH (built by build_vtd_graph.py; "population" is the pop column) ---
+# The planner and the compactness numbers work on the CSR arrays, so no networkx graph is built
+with trace.phase("load"):
+    csr = CSRGraph.load()
 
-# --- RECURSIVE TREE PARTITIONING ---
-total_pop = sum(graph.nodes[n]["population"] for n in graph.nodes)
-ideal_pop = total_pop / NUM_DISTRICTS
-
-# Use a very tight population deviation (1%)
-assignment = recursive_tree_part(
-    graph,
-    parts=list(range(NUM_DISTRICTS)),
-    pop_col="population",
-    pop_target=ideal_pop,
-    epsilon=0.01,  # 1% deviation
-    node_repeats=1
-)
+# Spanning trees need a connected graph; keep the largest connected component if it is not
+graph = csr.largest_component()
+if graph is not csr:
+    print(f"Graph is not connected; keeping the largest component ({graph.num_nodes} of {csr.num_nodes} VTDs)")
 
-# TODO: VRA/minority opportunity analysis and county split minimization
+# --- RECURSIVE TREE PARTITIONING ---
+counties = county_codes(graph.geoids.tolist())[0] if COUNTY_AWARE else None
+
+# Race seeded attempts at a very tight population deviation (1%) within a time budget
+with trace.phase("partition") as phase:
+    assignment, seed_log = seed_plan(
+        graph,
+        NUM_DISTRICTS,
+        pop_col="population",
+        epsilon=EPSILON,
+        schedule=SEED_SCHEDULE,
+        workers=SEED_WORKERS,
+        timeout=SEED_TIMEOUT,
+        budget=SEED_BUDGET,
+        counties=counties,
+        trace=trace,
+    )
+    phase.units = len(assignment)
+print(f"Seed plan after {len(seed_log)} attempts, {sum(r['trees'] for r in seed_log)} trees drawn")
+
+# TODO: VRA/minority opportunity analysis
 
 # --- OUTPUT ASSIGNMENT TO CSV ---
 assignment_df = pd.DataFrame({
@@ -42,11 +58,12 @@ assignment_df = pd.DataFrame({
     "district": list(assignment.values())
 })
 
-assignment_df.to_csv(OUTPUT_CSV, index=False)
+with trace.phase("save"):
+    assignment_df.to_csv(OUTPUT_CSV, index=False)
 print(f"Neutral district assignment saved to {OUTPUT_CSV}")
 
 # --- POST-ASSIGNMENT ANALYSIS ---
-vtd_data = pd.read_csv("fl_2020_vtd.csv")
+vtd_data = pd.read_csv("fl_2020_vtd.csv", dtype={"GEOID20": str})
 merged = assignment_df.merge(vtd_data, on="GEOID20")
 
 # Population deviation by district
@@ -60,6 +77,7 @@ print(deviations.describe())
 county_splits = merged.groupby("county")["district"].nunique()
 print("\nCounty splits (number of districts per county):")
 print(county_splits.value_counts().sort_index())
+print(f"{(county_splits > 1).sum()} counties split into {(county_splits - 1).sum()} extra pieces")
 
 # Minority opportunity: districts where Black or Hispanic VAP >= 50%
 merged["vap_black_share"] = merged["vap_black"] / merged["vap"]
@@ -121,11 +139,9 @@ competitive = ((district_votes["dem_share"] > 0.45) & (district_votes["dem_share
 print(f"Competitive districts (45–55% Dem share): {competitive}")
 
 # --- Compactness (Polsby-Popper) ---
-gdf = gpd.read_file(SHAPEFILE)
-gdf = gdf.merge(assignment_df, on="GEOID20")
-district_shapes = gdf.dissolve(by="district")
-district_shapes = district_shapes.to_crs(epsg=6933)  # Equal-area projection for area/perimeter
-district_shapes["area"] = district_shapes.geometry.area
-district_shapes["perim"] = district_shapes.geometry.length
-district_shapes["polsby_popper"] = 4 * 3.141592653589793 * district_shapes["area"] / (district_shapes["perim"] ** 2)
-print("\nMean Polsby-Popper compactness: {:.4f}".format(district_shapes["polsby_popper"].mean()))
+# From the graph's equal-area VTD areas and boundary lengths; no dissolve needed
+labels = np.array([assignment[geoid] for geoid in graph.geoids.tolist()])
+_, _, polsby_popper, cut_edges = district_compactness(labels, graph, NUM_DISTRICTS)
+print("\nMean Polsby-Popper compactness: {:.4f}".format(polsby_popper.mean()))
+print(f"Cut edges: {cut_edges[0]}")
+trace.close()
@@ -0,0 +1,196 @@
+import os
+import json
+import numpy as np
+
+GRAPH_DIR = "vtd_graph_csr"
+
+
+class CSRGraph:
+    """VTD adjacency as NumPy CSR arrays with columnar node and edge attributes.
+
+    Nodes are integers 0..n-1; `geoids[i]` is the GEOID20 of node i. The neighbors of i are
+    `indices[indptr[i]:indptr[i + 1]]`, and every undirected edge is stored in both
+    directions so edge columns line up with `indices`. Saved as a directory of .npy files
+    that `load` memory-maps read-only, so worker processes share the same pages.
+    """
+
+    def __init__(self, indptr, indices, geoids, columns=None, edge_columns=None):
+        self.indptr = indptr
+        self.indices = indices
+        self.geoids = geoids
+        self.columns = columns or {}
+        self.edge_columns = edge_columns or {}
+        self._index = None
+
+    @property
+    def num_nodes(self):
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self):
+        return len(self.indices) // 2
+
+    def neighbors(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def degree(self, i):
+        return int(self.indptr[i + 1] - self.indptr[i])
+
+    def index_of(self, geoid):
+        if self._index is None:
+            self._index = {g: i for i, g in enumerate(self.geoids.tolist())}
+        return self._index[geoid]
+
+    def adjacency_lists(self):
+        """Plain Python lists of neighbor ids, for tight loops that index per node."""
+        indptr = self.indptr.tolist()
+        indices = self.indices.tolist()
+        return [indices[indptr[i]:indptr[i + 1]] for i in range(self.num_nodes)]
+
+    def edge_pairs(self):
+        """(u, v) arrays with u < v, one row per undirected edge."""
+        u = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+        keep = u < self.indices
+        return u[keep], self.indices[keep]
+
+    def subgraph(self, keep):
+        """The graph induced by the nodes where the boolean mask `keep` is set, renumbered in order."""
+        local = np.cumsum(keep) - 1
+        src = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+        once = (src < self.indices) & keep[src] & keep[self.indices]
+        columns = {name: np.asarray(col)[keep] for name, col in self.columns.items()}
+        edge_columns = {name: np.asarray(col)[once] for name, col in self.edge_columns.items()}
+        return CSRGraph.from_edges(self.geoids[keep], local[src[once]], local[self.indices[once]], columns,
+                                   edge_columns)
+
+    def largest_component(self):
+        """The graph itself if it is connected, else the subgraph of its largest component."""
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import connected_components
+        matrix = csr_matrix((np.ones(len(self.indices)), self.indices, self.indptr), shape=(self.num_nodes,) * 2)
+        count, labels = connected_components(matrix, directed=False)
+        if count == 1:
+            return self
+        return self.subgraph(labels == np.argmax(np.bincount(labels)))
+
+    @classmethod
+    def from_edges(cls, geoids, u, v, columns=None, edge_columns=None):
+        """Build from undirected edge endpoint arrays (each edge listed once)."""
+        n = len(geoids)
+        src = np.concatenate([u, v])
+        dst = np.concatenate([v, u])
+        order = np.lexsort((dst, src))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        edge_columns = {name: np.concatenate([col, col])[order] for name, col in (edge_columns or {}).items()}
+        return cls(indptr, dst[order].astype(np.int32), np.asarray(geoids, dtype=str), columns, edge_columns)
+
+    @classmethod
+    def from_gerrychain(cls, graph):
+        """Convert a gerrychain/networkx Graph; numeric node and edge attributes become columns."""
+        nodes = list(graph.nodes)
+        index = {node: i for i, node in enumerate(nodes)}
+        # Some attributes (e.g. gerrychain's boundary_perim) only exist on some nodes; missing means 0
+        numeric = {}
+        for node in nodes:
+            for name, value in graph.nodes[node].items():
+                if name not in numeric and isinstance(value, (int, float, bool, np.number, np.bool_)):
+                    numeric[name] = type(value)(0)
+        columns = {
+            name: np.array([graph.nodes[node].get(name, zero) for node in nodes])
+            for name, zero in numeric.items()
+        }
+        edges = list(graph.edges(data=True))
+        u = np.array([index[a] for a, _, _ in edges], dtype=np.int64)
+        v = np.array([index[b] for _, b, _ in edges], dtype=np.int64)
+        edge_columns = {}
+        if edges:
+            for name, value in edges[0][2].items():
+                if isinstance(value, (int, float, np.number)):
+                    edge_columns[name] = np.array([data[name] for _, _, data in edges], dtype=float)
+        return cls.from_edges([str(node) for node in nodes], u, v, columns, edge_columns)
+
+    def to_gerrychain(self):
+        """Rebuild a gerrychain Graph keyed by GEOID20 with the same attributes."""
+        from gerrychain import Graph
+        graph = Graph()
+        geoids = self.geoids.tolist()
+        columns = {name: col.tolist() for name, col in self.columns.items()}
+        graph.add_nodes_from(
+            (geoid, {name: col[i] for name, col in columns.items()}) for i, geoid in enumerate(geoids)
+        )
+        src = np.repeat(np.arange(self.num_nodes), np.diff(self.indptr))
+        keep = src < self.indices
+        u, v = src[keep], self.indices[keep]
+        edge_columns = {name: col[keep].tolist() for name, col in self.edge_columns.items()}
+        graph.add_edges_from(
+            (geoids[a], geoids[b], {name: col[k] for name, col in edge_columns.items()})
+            for k, (a, b) in enumerate(zip(u.tolist(), v.tolist()))
+        )
+        return graph
+
+    def save(self, path=GRAPH_DIR):
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "indptr.npy"), self.indptr)
+        np.save(os.path.join(path, "indices.npy"), self.indices)
+        np.save(os.path.join(path, "geoids.npy"), self.geoids)
+        for name, col in self.columns.items():
+            np.save(os.path.join(path, f"node.{name}.npy"), col)
+        for name, col in self.edge_columns.items():
+            np.save(os.path.join(path, f"edge.{name}.npy"), col)
+        meta = {
+            "num_nodes": self.num_nodes,
+            "num_edges": self.num_edges,
+            "columns": list(self.columns),
+            "edge_columns": list(self.edge_columns),
+        }
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path=GRAPH_DIR, mmap=True):
+        mode = "r" if mmap else None
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+
+        def read(name):
+            return np.load(os.path.join(path, name), mmap_mode=mode)
+
+        columns = {name: read(f"node.{name}.npy") for name in meta["columns"]}
+        edge_columns = {name: read(f"edge.{name}.npy") for name in meta["edge_columns"]}
+        return cls(read("indptr.npy"), read("indices.npy"), read("geoids.npy"), columns, edge_columns)
+
+
+class GeoidAdjacency:
+    """GEOID20-keyed neighbor lookup over a CSRGraph, for planners that only walk neighbors.
+
+    `neighbors(geoid)` is a plain dict lookup of a neighbor list, as with a networkx graph,
+    but building it takes one pass over the CSR arrays instead of a full networkx graph.
+    """
+
+    def __init__(self, csr):
+        self.csr = csr
+        geoids = csr.geoids.tolist()
+        self._adjacency = {geoid: [geoids[j] for j in nbrs] for geoid, nbrs in zip(geoids, csr.adjacency_lists())}
+        self.neighbors = self._adjacency.__getitem__
+
+    def __len__(self):
+        return len(self._adjacency)
+
+    def __iter__(self):
+        return iter(self._adjacency)
+
+
+def load_adjacency(path=GRAPH_DIR):
+    """GeoidAdjacency of the saved graph, for the annealing planners."""
+    return GeoidAdjacency(CSRGraph.load(path))
+
+
+def load_graph(path=GRAPH_DIR):
+    """gerrychain Graph for scripts that need one (gerrychain partitions and chains).
+
+    This rebuilds a full networkx graph from the CSR arrays, which costs far more than
+    CSRGraph.load; planners that only need neighbors or arrays should use load_adjacency or
+    CSRGraph.load instead.
+    """
+    return CSRGraph.load(path).to_gerrychain()
@@ -0,0 +1,99 @@
+import random
+
+
+class BorderIndex:
+    """Persistent index of (vtd, neighbor district) pairs along district borders.
+
+    Each pair keeps a count of how many of the VTD's neighbors sit in that other district,
+    so a flip only touches the flipped VTD and its neighbors. Pairs live in a list with a
+    position map, which makes add, remove and uniform sampling all O(1).
+    """
+
+    def __init__(self, neighbors, assignment):
+        # neighbors: callable node -> iterable of adjacent nodes (e.g. graph.neighbors)
+        # assignment: node -> district, shared with the caller and kept current by it
+        self.neighbors = neighbors
+        self.assignment = assignment
+        self._counts = {}
+        self._items = []
+        self._pos = {}
+        for node, d in assignment.items():
+            for nbr in neighbors(node):
+                nd = assignment.get(nbr)
+                if nd is not None and nd != d:
+                    self._inc((node, nd))
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._pos
+
+    def _inc(self, key):
+        count = self._counts.get(key, 0)
+        if count == 0:
+            self._pos[key] = len(self._items)
+            self._items.append(key)
+        self._counts[key] = count + 1
+
+    def _dec(self, key):
+        count = self._counts[key] - 1
+        if count:
+            self._counts[key] = count
+            return
+        del self._counts[key]
+        # Swap-remove: move the last pair into the freed slot
+        i = self._pos.pop(key)
+        last = self._items.pop()
+        if i < len(self._items):
+            self._items[i] = last
+            self._pos[last] = i
+
+    def flip(self, node, src, dst):
+        """Update the index after `node` moved from `src` to `dst` (assignment already updated)."""
+        for nbr in self.neighbors(node):
+            c = self.assignment.get(nbr)
+            if c is None:
+                continue
+            # The flipped node now borders every neighbor district except its new one
+            if c != dst:
+                self._inc((node, c))
+            if c != src:
+                self._dec((node, c))
+            # The neighbor saw `node` in src; now it sees it in dst
+            if c != dst:
+                self._inc((nbr, dst))
+            if c != src:
+                self._dec((nbr, src))
+
+    def state(self):
+        """The pair counts and sampling order as plain data, for from_state."""
+        return {"counts": self._counts, "items": self._items}
+
+    @classmethod
+    def from_state(cls, neighbors, assignment, state):
+        """An index for `assignment` rebuilt from state() without rescanning its borders."""
+        index = cls(neighbors, {})
+        index.assignment = assignment
+        index._counts = dict(state["counts"])
+        index._items = list(state["items"])
+        index._pos = {item: i for i, item in enumerate(index._items)}
+        return index
+
+    def items(self):
+        """The border pairs in sampling order (a checkpoint needs the order, not just the set)."""
+        return list(self._items)
+
+    def restore_order(self, items):
+        """Put the pairs back in a saved sampling order; they must be exactly the current pairs."""
+        items = [tuple(item) for item in items]
+        if len(items) != len(self._items) or any(item not in self._pos for item in items):
+            raise ValueError("saved border pairs do not match the assignment")
+        self._items = items
+        self._pos = {item: i for i, item in enumerate(items)}
+
+    def sample(self, rng=random):
+        """Uniformly random (vtd, neighbor district) pair, or None if there are no borders."""
+        if not self._items:
+            return None
+        return self._items[rng.randrange(len(self._items))]
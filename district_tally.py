@@ -0,0 +1,63 @@
+from collections import defaultdict
+
+
+class DistrictTally:
+    """Per-district Republican/Democratic vote totals kept up to date as single VTDs flip.
+
+    `move` is O(1) and remembers what it changed, so a rejected annealing move can be
+    rolled back with `undo` without re-summing anything.
+    """
+
+    def __init__(self, assignment, rep_votes, dem_votes):
+        # rep_votes / dem_votes: GEOID20 -> votes for every VTD in the assignment
+        self.rep_votes = rep_votes
+        self.dem_votes = dem_votes
+        self.rep = defaultdict(float)
+        self.dem = defaultdict(float)
+        for geoid, d in assignment.items():
+            self.rep[d] += rep_votes[geoid]
+            self.dem[d] += dem_votes[geoid]
+        self.rep_seats = sum(1 for d in self.rep if self.rep[d] > self.dem[d])
+        self._last = None
+
+    def restore(self, rep, dem):
+        """Replace the totals with saved ones. Totals built up flip by flip can differ in the
+        last bits from a fresh sum, so a resumed run needs the saved values to stay identical."""
+        self.rep = defaultdict(float, rep)
+        self.dem = defaultdict(float, dem)
+        self.rep_seats = sum(1 for d in self.rep if self.rep[d] > self.dem[d])
+        self._last = None
+
+    @classmethod
+    def from_totals(cls, rep_votes, dem_votes, rep, dem):
+        """A tally that starts from saved totals instead of summing an assignment."""
+        tally = cls({}, rep_votes, dem_votes)
+        tally.restore(rep, dem)
+        return tally
+
+    def winner(self, d):
+        return "Republican" if self.rep[d] > self.dem[d] else "Democrat"
+
+    def dem_seats(self):
+        return len(self.rep) - self.rep_seats
+
+    def move(self, geoid, src, dst):
+        # Keep the old totals so undo restores them exactly (no float drift on rollback)
+        self._last = (src, dst, self.rep[src], self.dem[src], self.rep[dst], self.dem[dst], self.rep_seats)
+        before = (self.rep[src] > self.dem[src]) + (self.rep[dst] > self.dem[dst])
+        rep = self.rep_votes[geoid]
+        dem = self.dem_votes[geoid]
+        self.rep[src] -= rep
+        self.dem[src] -= dem
+        self.rep[dst] += rep
+        self.dem[dst] += dem
+        after = (self.rep[src] > self.dem[src]) + (self.rep[dst] > self.dem[dst])
+        self.rep_seats += after - before
+        return self.rep_seats
+
+    def undo(self):
+        src, dst, rep_src, dem_src, rep_dst, dem_dst, seats = self._last
+        self.rep[src], self.dem[src] = rep_src, dem_src
+        self.rep[dst], self.dem[dst] = rep_dst, dem_dst
+        self.rep_seats = seats
+        self._last = None
@@ -0,0 +1,113 @@
+import argparse
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from plan_metrics import VTD_DATA_CSV, load_plans, partisan_metrics
+
+# Partisan scoring of plans under every contest in fl_2020_vtd.csv at once. Votes are held as
+# two (VTDs x elections) matrices; a batch of plans becomes a sparse one-hot matrix with one
+# row per (plan, district), so every district total for every election is one sparse product.
+
+# name -> (Democratic column, Republican column)
+ELECTIONS = {
+    "PRE16": ("pre_16_dem_cli", "pre_16_rep_tru"),
+    "USS16": ("uss_16_dem_mur", "uss_16_rep_rub"),
+    "USS18": ("uss_18_dem_nel", "uss_18_rep_sco"),
+    "GOV18": ("gov_18_dem_gil", "gov_18_rep_des"),
+    "ATG18": ("atg_18_dem_sha", "atg_18_rep_moo"),
+    "PRE20": ("pre_20_dem_bid", "pre_20_rep_tru"),
+    "COMP16": ("adv_16", "arv_16"),
+    "COMP18": ("adv_18", "arv_18"),
+    "COMP20": ("adv_20", "arv_20"),
+    "COMP": ("ndv", "nrv"),
+}
+
+
+def election_matrices(vtd, elections=ELECTIONS):
+    """(election names, dem votes, rep votes) with vote matrices of shape (VTDs x elections),
+    in the row order of the `vtd` DataFrame."""
+    names = list(elections)
+    dem = vtd[[elections[e][0] for e in names]].to_numpy(dtype=float)
+    rep = vtd[[elections[e][1] for e in names]].to_numpy(dtype=float)
+    return names, dem, rep
+
+
+def load_election_matrices(geoids=None, csv_path=VTD_DATA_CSV, elections=ELECTIONS):
+    """election_matrices for fl_2020_vtd.csv, optionally aligned to `geoids`."""
+    vtd = pd.read_csv(csv_path, dtype={"GEOID20": str}).set_index("GEOID20")
+    if geoids is not None:
+        vtd = vtd.loc[list(geoids)]
+    return election_matrices(vtd, elections)
+
+
+def one_hot(plans, k):
+    """Sparse (plans*k x VTDs) matrix: row p*k + d selects the VTDs of district d in plan p."""
+    plans = np.atleast_2d(plans)
+    num_plans, num_vtds = plans.shape
+    rows = (plans + (np.arange(num_plans) * k)[:, None]).ravel()
+    cols = np.tile(np.arange(num_vtds), num_plans)
+    return sp.csr_matrix((np.ones(rows.size), (rows, cols)), shape=(num_plans * k, num_vtds))
+
+
+def district_votes(plans, dem, rep, k):
+    """Per-district totals as (plans x elections x districts) arrays of dem and rep votes."""
+    plans = np.atleast_2d(plans)
+    onehot = one_hot(plans, k)
+    num_elections = dem.shape[1]
+    # One product for both parties: (plans*k x VTDs) @ (VTDs x 2*elections)
+    totals = onehot @ np.hstack([dem, rep])
+    totals = totals.reshape(plans.shape[0], k, 2 * num_elections).transpose(0, 2, 1)
+    return totals[:, :num_elections], totals[:, num_elections:]
+
+
+def district_margins(plans, dem, rep, k):
+    """Democratic two-party share minus 0.5, (plans x elections x districts)."""
+    d, r = district_votes(plans, dem, rep, k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return d / (d + r) - 0.5
+
+
+def election_scores(plans, dem, rep, names, k=None):
+    """Tidy table indexed by (plan, election): seats, efficiency gap, mean-median, competitive
+    districts, statewide Democratic share and mean absolute district margin."""
+    plans = np.atleast_2d(plans)
+    k = int(plans.max()) + 1 if k is None else k
+    d, r = district_votes(plans, dem, rep, k)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        metrics = partisan_metrics(d, r)
+        metrics["statewide_dem_share"] = d.sum(axis=-1) / (d + r).sum(axis=-1)
+        metrics["mean_abs_margin"] = np.nanmean(np.abs(d / (d + r) - 0.5), axis=-1)
+    index = pd.MultiIndex.from_product([range(plans.shape[0]), names], names=["plan", "election"])
+    return pd.DataFrame({name: np.asarray(values).ravel() for name, values in metrics.items()}, index=index)
+
+
+def robustness(scores):
+    """Per plan: the spread of seats and efficiency gap across elections."""
+    grouped = scores.groupby(level="plan")
+    return pd.DataFrame({
+        "dem_seats_min": grouped["dem_seats"].min(),
+        "dem_seats_max": grouped["dem_seats"].max(),
+        "dem_seats_mean": grouped["dem_seats"].mean(),
+        "efficiency_gap_min": grouped["efficiency_gap"].min(),
+        "efficiency_gap_max": grouped["efficiency_gap"].max(),
+    })
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score assignment CSVs under every election in fl_2020_vtd.csv")
+    parser.add_argument("plans", nargs="+", help="assignment CSVs with GEOID20,district columns")
+    parser.add_argument("--districts", type=int, default=None)
+    parser.add_argument("--output", default=None, help="write the (plan, election) table to this CSV")
+    args = parser.parse_args()
+
+    plans, geoids = load_plans(args.plans)
+    names, dem, rep = load_election_matrices(geoids)
+    scores = election_scores(plans, dem, rep, names, args.districts)
+    print(scores.to_string(float_format="%.4f"))
+    summary = robustness(scores)
+    summary.insert(0, "source", args.plans)
+    print("\nAcross elections:")
+    print(summary.to_string(float_format="%.4f"))
+    if args.output:
+        scores.to_csv(args.output)
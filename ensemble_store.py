@@ -0,0 +1,196 @@
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+
+# Append-only on-disk store for plan ensembles. A store is a directory holding
+#   meta.json    VTD count, metric names, keyframe interval
+#   geoids.npy   the fixed VTD order every plan vector follows
+#   records.bin  one record per plan: a full uint8 district vector, or (with delta encoding)
+#                the VTDs that changed since the previous plan as uint32 count, uint32
+#                indices and uint8 districts; every `keyframe_interval` plans is stored full
+#   index.bin    per plan: record offset, record size and the plan's keyframe
+#   metrics.bin  per plan: float64 scalar metrics, in meta["metrics"] order
+# All .bin files are memory-mapped by the reader, so random access touches only the
+# records it needs and chunked streaming never holds the whole ensemble in memory.
+
+INDEX_DTYPE = np.dtype([("offset", "<i8"), ("size", "<i8"), ("keyframe", "<i8")])
+
+
+def plan_vector(assignment, geoids):
+    """District vector in store order from a GEOID20 -> district mapping."""
+    return np.fromiter((assignment[g] for g in geoids), dtype=np.int64, count=len(geoids))
+
+
+class EnsembleWriter:
+    def __init__(self, path, geoids=None, metrics=(), delta=True, keyframe_interval=100):
+        self.path = path
+        meta_path = os.path.join(path, "meta.json")
+        if os.path.exists(meta_path):
+            # Reopen for appending; the last plan is needed to keep delta-encoding
+            reader = EnsembleReader(path)
+            self.meta = reader.meta
+            self.geoids = reader.geoids
+            self.count = len(reader)
+            self.last = reader[self.count - 1] if self.count else None
+            last = reader.index[self.count - 1] if self.count else None
+            self.last_keyframe = int(last["keyframe"]) if self.count else 0
+            self.offset = int(last["offset"] + last["size"]) if self.count else 0
+            del reader
+            # Drop whatever an interrupted append left past the last complete plan
+            for name, size in (("records.bin", self.offset),
+                               ("index.bin", self.count * INDEX_DTYPE.itemsize),
+                               ("metrics.bin", self.count * 8 * len(self.meta["metrics"]))):
+                os.truncate(os.path.join(path, name), size)
+        else:
+            os.makedirs(path, exist_ok=True)
+            self.geoids = np.asarray(geoids, dtype=str)
+            self.meta = {
+                "num_vtds": len(self.geoids),
+                "metrics": list(metrics),
+                "delta": bool(delta),
+                "keyframe_interval": int(keyframe_interval) if delta else 1,
+            }
+            np.save(os.path.join(path, "geoids.npy"), self.geoids)
+            with open(meta_path, "w") as f:
+                json.dump(self.meta, f, indent=2)
+            self.count = 0
+            self.last = None
+            self.last_keyframe = 0
+            self.offset = 0
+        self._records = open(os.path.join(path, "records.bin"), "ab")
+        self._index = open(os.path.join(path, "index.bin"), "ab")
+        self._metrics = open(os.path.join(path, "metrics.bin"), "ab")
+
+    def append(self, plan, **metrics):
+        plan = np.asarray(plan)
+        if plan.size and (plan.min() < 0 or plan.max() > 255):
+            raise ValueError("district labels must fit in 0..255")
+        plan = plan.astype(np.uint8)
+        if plan.shape != (self.meta["num_vtds"],):
+            raise ValueError(f"plan has {plan.shape} entries, store expects {self.meta['num_vtds']}")
+        full = self.last is None or self.count - self.last_keyframe >= self.meta["keyframe_interval"]
+        if full:
+            record = plan.tobytes()
+            self.last_keyframe = self.count
+        else:
+            changed = np.flatnonzero(plan != self.last).astype(np.uint32)
+            record = (np.uint32(len(changed)).tobytes() + changed.tobytes() + plan[changed].tobytes())
+        self._records.write(record)
+        np.array([(self.offset, len(record), self.last_keyframe)], dtype=INDEX_DTYPE).tofile(self._index)
+        np.array([metrics.get(name, np.nan) for name in self.meta["metrics"]], dtype="<f8").tofile(self._metrics)
+        self.offset += len(record)
+        self.count += 1
+        self.last = plan.copy()
+
+    def flush(self):
+        for f in (self._records, self._index, self._metrics):
+            f.flush()
+
+    def close(self):
+        for f in (self._records, self._index, self._metrics):
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EnsembleReader:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.geoids = np.load(os.path.join(path, "geoids.npy"))
+        self.index = self._map("index.bin", INDEX_DTYPE)
+        self.records = self._map("records.bin", np.uint8)
+        num_metrics = len(self.meta["metrics"])
+        metrics = self._map("metrics.bin", np.dtype("<f8"))
+        # A writer killed mid-append can leave one file a record ahead; trust the shortest
+        self.count = min(len(self.index), len(metrics) // num_metrics if num_metrics else len(self.index))
+        self.metric_values = metrics[:self.count * num_metrics].reshape(self.count, num_metrics)
+
+    def _map(self, name, dtype):
+        path = os.path.join(self.path, name)
+        dtype = np.dtype(dtype)
+        # Whole entries only; a torn trailing write is ignored
+        length = os.path.getsize(path) // dtype.itemsize
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode="r", shape=(length,))
+
+    def __len__(self):
+        return self.count
+
+    def _record(self, i):
+        entry = self.index[i]
+        return self.records[entry["offset"]:entry["offset"] + entry["size"]]
+
+    def _apply(self, plan, i):
+        record = self._record(i)
+        if self.index[i]["keyframe"] == i:
+            plan[:] = record
+            return
+        n = int(record[:4].view(np.uint32)[0])
+        changed = record[4:4 + 4 * n].view(np.uint32)
+        plan[changed] = record[4 + 4 * n:4 + 5 * n]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        plan = np.empty(self.meta["num_vtds"], dtype=np.uint8)
+        for j in range(int(self.index[i]["keyframe"]), i + 1):
+            self._apply(plan, j)
+        return plan
+
+    def iter_chunks(self, chunk_size=1000, start=0, stop=None):
+        """Yield (first plan index, (n x VTDs) array) blocks, replaying deltas sequentially."""
+        stop = self.count if stop is None else min(stop, self.count)
+        if start >= stop:
+            return
+        plan = self[start].copy()
+        for first in range(start, stop, chunk_size):
+            block = np.empty((min(chunk_size, stop - first), self.meta["num_vtds"]), dtype=np.uint8)
+            for row in range(len(block)):
+                if first + row > start:
+                    self._apply(plan, first + row)
+                block[row] = plan
+            yield first, block
+
+    def metrics(self):
+        """Per-plan scalar metrics as a DataFrame indexed by plan number."""
+        table = pd.DataFrame(np.asarray(self.metric_values), columns=self.meta["metrics"])
+        table.index.name = "plan"
+        return table
+
+    def to_csv(self, i, path):
+        """Write plan i in the GEOID20,district layout the other scripts read."""
+        pd.DataFrame({"GEOID20": self.geoids, "district": self[i]}).to_csv(path, index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or export plans from an ensemble store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="print plan count, size on disk and metric summary")
+    info.add_argument("store")
+    export = sub.add_parser("export", help="write one plan as a GEOID20,district CSV")
+    export.add_argument("store")
+    export.add_argument("plan", type=int, help="plan number (negative counts from the end)")
+    export.add_argument("output")
+    args = parser.parse_args()
+
+    reader = EnsembleReader(args.store)
+    if args.command == "info":
+        size = sum(os.path.getsize(os.path.join(args.store, f)) for f in os.listdir(args.store))
+        print(f"{len(reader)} plans over {reader.meta['num_vtds']} VTDs, {size / 1e6:.2f} MB on disk "
+              f"({'delta' if reader.meta['delta'] else 'full'} records)")
+        if reader.meta["metrics"] and len(reader):
+            print(reader.metrics().describe().to_string())
+    else:
+        reader.to_csv(args.plan, args.output)
+        print(f"Plan {args.plan} saved to {args.output}")
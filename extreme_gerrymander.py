@@ -1,77 +1,193 @@
-import pickle
+import argparse
+import heapq
+import numpy as np
 import pandas as pd
-import geopandas as gpd
-import networkx as nx
-from collections import defaultdict
-
-# Load graph and merged data
-graph = pickle.load(open("vtd_graph.gpickle", "rb"))
-merged = gpd.read_file("merged_vtds.shp")
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import shortest_path
+from csr_graph import CSRGraph
+from instrumentation import NULL, telemetry
+from vtd_data import load_vtd_table
 
 NUM_DISTRICTS = 27
+NUM_DEM_PACKED = 2  # Change this to 1 for max GOP, or higher for more Dem seats
 POP_COL = "pop"
 REP_COL = "pre_20_rep"
 DEM_COL = "pre_20_dem"
+OVERFILL = 1.05  # packed districts may run slightly over the ideal population
 
-districts = defaultdict(list)
-district_pops = defaultdict(int)
-assignment = {}
 
-# --- Pack-then-crack algorithm ---
-# 1. Pack the most Democratic VTDs into as few districts as possible
-NUM_DEM_PACKED = 2  # Change this to 1 for max GOP, or higher for more Dem seats
-merged["lean"] = merged[DEM_COL] - merged[REP_COL]  # Dem-leaning most negative
-sorted_vtds = merged.sort_values("lean", ascending=True)  # Most Dem first
-
-# Calculate ideal population per district
-ideal_pop = merged[POP_COL].sum() / NUM_DISTRICTS
-
-# Pack Dems
-packed = set()
-assignment = {}
-for d in range(NUM_DEM_PACKED):
-    pop = 0
-    for idx, row in sorted_vtds.iterrows():
-        geoid = row["GEOID20"]
-        if geoid in packed:
-            continue
-        if pop + row[POP_COL] > ideal_pop * 1.05:  # allow slight overfill
-            break
-        assignment[geoid] = d
-        packed.add(geoid)
-        pop += row[POP_COL]
-
-# 2. Assign the rest to maximize Republican seats (crack Dems)
-remaining = [row for idx, row in sorted_vtds.iterrows() if row["GEOID20"] not in packed]
-num_gop_districts = NUM_DISTRICTS - NUM_DEM_PACKED
-gop_districts = [d for d in range(NUM_DEM_PACKED, NUM_DISTRICTS)]
-district_pops = {d: 0 for d in gop_districts}
-districts = {d: [] for d in gop_districts}
-for row in remaining:
-    geoid = row["GEOID20"]
-    # Assign to GOP district with lowest population
-    min_district = min(district_pops, key=district_pops.get)
-    assignment[geoid] = min_district
-    districts[min_district].append(geoid)
-    district_pops[min_district] += row[POP_COL]
-
-# Save assignment
-
-assign_df = pd.DataFrame(list(assignment.items()), columns=["GEOID20", "district"])
-assign_df["GEOID20"] = assign_df["GEOID20"].astype(str)
-merged["GEOID20"] = merged["GEOID20"].astype(str)
-assign_df.to_csv("district_assignment_extreme.csv", index=False)
-print("Extreme gerrymandered assignment saved to district_assignment_extreme.csv")
-
-# Debug: print sample GEOID20s from both DataFrames
-print("Sample GEOID20s in merged:", merged["GEOID20"].head().tolist())
-print("Sample GEOID20s in assign_df:", assign_df["GEOID20"].head().tolist())
-
-# Summarize seats
-results = merged.join(assign_df.set_index("GEOID20"), on="GEOID20")
-grouped = results.groupby("district").agg({REP_COL: "sum", DEM_COL: "sum"})
-grouped["winner"] = grouped.apply(lambda row: "Republican" if row[REP_COL] > row[DEM_COL] else "Democrat", axis=1)
-print("\nSeat counts by party:")
-print(grouped["winner"].value_counts())
-print("\nDistrict winners:")
-print(grouped["winner"])
+def pack(pops, limit, num_packed):
+    """Packed district d takes sorted positions bounds[d]:bounds[d + 1].
+
+    Each packed district is the longest run of lean-sorted VTDs, starting where the previous
+    one stopped, whose population stays within `limit`; the run is found by a binary search
+    over cumulative populations instead of rescanning the table.
+    """
+    cum = np.concatenate([[0], np.cumsum(pops)])
+    bounds = [0]
+    for _ in range(num_packed):
+        start = bounds[-1]
+        bounds.append(start + int(np.searchsorted(cum[start:] - cum[start], limit, side="right")) - 1)
+    return bounds
+
+
+def crack(pops, districts):
+    """Deal VTDs (in the given order) to whichever district currently has the least
+    population, lowest district number on ties."""
+    heap = [(0, d) for d in districts]
+    out = np.empty(len(pops), dtype=int)
+    for i, p in enumerate(pops.tolist()):
+        pop, d = heap[0]
+        out[i] = d
+        heapq.heapreplace(heap, (pop + p, d))
+    return out
+
+
+def _spread_seeds(adjacency, order, count):
+    # The most Republican VTD seeds the first district; each further seed is the VTD farthest
+    # (in hops) from every seed so far, so districts start spread out over the map. VTDs cut off
+    # from all seeds count as infinitely far and get a seed of their own first.
+    seeds = [order[-1]]
+    dist = shortest_path(adjacency, unweighted=True, indices=seeds[0])
+    for _ in range(min(count, len(order)) - 1):
+        far = dist.copy()
+        far[seeds] = -1
+        seeds.append(int(np.argmax(far)))
+        dist = np.minimum(dist, shortest_path(adjacency, unweighted=True, indices=seeds[-1]))
+    return seeds
+
+
+def crack_contiguous(graph, nodes, lean, pops, districts):
+    """Contiguity-aware crack over the VTDs `nodes` (graph node ids).
+
+    Districts grow from spread-out seeds; the least populated district repeatedly claims the
+    most Democratic unassigned VTD on its frontier, which splits Democratic areas between
+    neighbouring districts. A district whose frontier runs dry stops growing.
+    """
+    local = np.full(graph.num_nodes, -1)
+    local[nodes] = np.arange(len(nodes))
+    u, v = graph.edge_pairs()
+    keep = (local[u] >= 0) & (local[v] >= 0)
+    u, v = local[u[keep]], local[v[keep]]
+    n = len(nodes)
+    out = np.full(n, -1)
+    if n == 0:
+        return out
+    adjacency = csr_matrix((np.ones(2 * len(u)), (np.concatenate([u, v]), np.concatenate([v, u]))), shape=(n, n))
+    neighbors = np.split(adjacency.indices, adjacency.indptr[1:-1])
+
+    lean = lean.tolist()
+    pops = pops.tolist()
+    district_pops = dict.fromkeys(districts, 0)
+    frontiers = {d: [] for d in districts}
+
+    def claim(i, d):
+        out[i] = d
+        district_pops[d] += pops[i]
+        for j in neighbors[i].tolist():
+            if out[j] < 0:
+                heapq.heappush(frontiers[d], (lean[j], j))
+
+    def grow():
+        heap = [(district_pops[d], d) for d in districts]
+        heapq.heapify(heap)
+        while heap:
+            _, d = heapq.heappop(heap)
+            frontier = frontiers[d]
+            while frontier and out[frontier[0][1]] >= 0:
+                heapq.heappop(frontier)
+            if not frontier:
+                continue
+            claim(heapq.heappop(frontier)[1], d)
+            heapq.heappush(heap, (district_pops[d], d))
+
+    order = np.argsort(lean, kind="stable")
+    for d, seed in zip(districts, _spread_seeds(adjacency, order, len(districts))):
+        claim(seed, d)
+    grow()
+    # Whatever is left lies in pieces of the map no district could reach; the lightest district
+    # takes the most Republican VTD of such a piece and grows through it
+    for i in order[::-1].tolist():
+        if out[i] < 0:
+            claim(i, min(districts, key=lambda d: (district_pops[d], d)))
+            grow()
+    return out
+
+
+def lean_order(merged):
+    """Row positions of `merged` from most Democratic to most Republican VTD."""
+    lean = (merged[REP_COL] - merged[DEM_COL]).to_numpy()  # Dem-leaning most negative
+    return lean, pd.Series(lean).sort_values(ascending=True).index.to_numpy()
+
+
+def pack_and_crack(merged, num_packed=NUM_DEM_PACKED, graph=None, trace=NULL):
+    """District label per row of `merged`; crack contiguously when a CSRGraph is given."""
+    lean, order = lean_order(merged)
+    pops = merged[POP_COL].to_numpy()[order]
+    ideal_pop = pops.sum() / NUM_DISTRICTS
+
+    labels = np.empty(len(merged), dtype=int)
+    with trace.phase("pack") as phase:
+        bounds = pack(pops, ideal_pop * OVERFILL, num_packed)
+        for d in range(num_packed):
+            labels[order[bounds[d]:bounds[d + 1]]] = d
+        phase.units = bounds[-1]
+
+    rest = order[bounds[-1]:]
+    gop_districts = list(range(num_packed, NUM_DISTRICTS))
+    with trace.phase("crack") as phase:
+        if graph is None:
+            labels[rest] = crack(pops[bounds[-1]:], gop_districts)
+        else:
+            nodes = pd.Index(graph.geoids).get_indexer(merged["GEOID20"].to_numpy()[rest])
+            labels[rest] = crack_contiguous(graph, nodes, lean[rest], pops[bounds[-1]:], gop_districts)
+        phase.units = len(rest)
+    return labels
+
+
+def seat_counts(merged, labels):
+    rep = np.bincount(labels, weights=merged[REP_COL].to_numpy(), minlength=NUM_DISTRICTS)
+    dem = np.bincount(labels, weights=merged[DEM_COL].to_numpy(), minlength=NUM_DISTRICTS)
+    used = dem + rep > 0  # high packing counts can leave districts empty
+    return int((dem >= rep)[used].sum()), int((rep > dem)[used].sum())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack-then-crack extreme Republican gerrymander")
+    parser.add_argument("--packed", type=int, default=NUM_DEM_PACKED, help="number of packed Democratic districts")
+    parser.add_argument("--contiguous", action="store_true", help="grow the cracked districts over the VTD graph")
+    parser.add_argument("--sweep", action="store_true",
+                        help="report seats for every number of packed districts instead of saving a plan")
+    args = parser.parse_args()
+
+    trace = telemetry("extreme_gerrymander")
+
+    # Load merged data (and the adjacency graph for the contiguous crack)
+    with trace.phase("load"):
+        merged = load_vtd_table(["GEOID20", POP_COL, REP_COL, DEM_COL])
+        graph = CSRGraph.load() if args.contiguous else None
+
+    if args.sweep:
+        rows = []
+        for num_packed in range(NUM_DISTRICTS):
+            dem_seats, rep_seats = seat_counts(merged, pack_and_crack(merged, num_packed, graph, trace))
+            rows.append({"packed": num_packed, "dem_seats": dem_seats, "rep_seats": rep_seats})
+        print(pd.DataFrame(rows).to_string(index=False))
+    else:
+        labels = pack_and_crack(merged, args.packed, graph, trace)
+
+        # Save assignment, rows in lean order (packed VTDs first) as before
+        with trace.phase("save"):
+            assign_df = pd.DataFrame({"GEOID20": merged["GEOID20"].astype(str), "district": labels})
+            assign_df.iloc[lean_order(merged)[1]].to_csv("district_assignment_extreme.csv", index=False)
+        print("Extreme gerrymandered assignment saved to district_assignment_extreme.csv")
+
+        # Summarize seats
+        results = merged.assign(district=labels)
+        grouped = results.groupby("district").agg({REP_COL: "sum", DEM_COL: "sum"})
+        grouped["winner"] = np.where(grouped[REP_COL] > grouped[DEM_COL], "Republican", "Democrat")
+        print("\nSeat counts by party:")
+        print(grouped["winner"].value_counts())
+        print("\nDistrict winners:")
+        print(grouped["winner"])
+    trace.close()
@@ -1,210 +1,431 @@
-import pickle
+import argparse
+import numpy as np
 import pandas as pd
-import geopandas as gpd
 import networkx as nx
-from collections import defaultdict, deque
-
-# Load data
-with open("vtd_graph.gpickle", "rb") as f:
-    graph = pickle.load(f)
-merged = gpd.read_file("merged_vtds.shp")
+import heapq
+import random
+import math
+from itertools import count
+from collections import defaultdict
+from csr_graph import load_adjacency
+from district_tally import DistrictTally
+from county_partition import CountySplitTally
+from cut_edges import BorderIndex
+from contiguity import is_contiguous, removal_keeps_contiguous, addition_keeps_contiguous
+from instrumentation import NULL, telemetry
+from vtd_data import load_vtd_table
+from checkpoint import Checkpointer, read_checkpoint, pack_assignment, unpack_assignment, pack_rng, unpack_rng
 
 NUM_DISTRICTS = 27
 POP_COL = "pop"
 REP_COL = "pre_20_rep"
 DEM_COL = "pre_20_dem"
 
+# Seed selection: pack up to 3 Dem districts, all others most Republican
+NUM_DEM_PACKED = 2
 
-# Calculate ideal population per district
-ideal_pop = merged[POP_COL].sum() / NUM_DISTRICTS
-max_pop = ideal_pop * 1.15  # allow 15% deviation
-min_pop = ideal_pop * 0.85
+# The only shapefile columns the planner reads
+VTD_COLUMNS = ["GEOID20", POP_COL, REP_COL, DEM_COL]
+COUNTY_COL = "county"
 
 
-# Precompute GEOID20 to row dict for fast lookup
-row_dict = {row["GEOID20"]: row for _, row in merged.iterrows()}
+def population_bounds(merged):
+    # Calculate ideal population per district
+    ideal_pop = merged[POP_COL].sum() / NUM_DISTRICTS
+    max_pop = ideal_pop * 1.15  # allow 15% deviation
+    min_pop = ideal_pop * 0.85
+    return min_pop, max_pop
 
 
-# Seed selection: pack up to 3 Dem districts, all others most Republican
-NUM_DEM_PACKED = 2
-merged["lean"] = merged[REP_COL] - merged[DEM_COL]
-seeds = list(merged.sort_values("lean", ascending=False)["GEOID20"][:NUM_DISTRICTS-NUM_DEM_PACKED])
-seeds += list(merged.sort_values("lean", ascending=True)["GEOID20"][:NUM_DEM_PACKED])
-
-# Assignment structures
-assignment = {}
-district_pops = defaultdict(int)
-districts = defaultdict(set)
-frontiers = defaultdict(deque)
-assigned = set()
-
-# Initialize districts with seeds
-for d, geoid in enumerate(seeds):
-    assignment[geoid] = d
-    district_pops[d] += int(row_dict[geoid][POP_COL])
-    districts[d].add(geoid)
-    assigned.add(geoid)
-    # Add neighbors to frontier
-    for nbr in graph.neighbors(geoid):
-        if nbr not in assigned:
-            frontiers[d].append(nbr)
-
-progress = 0
-# Greedy contiguous growing
-while len(assignment) < len(merged):
-    made_progress = False
-    for d in range(NUM_DISTRICTS):
-        # Only grow if under max_pop
-        if district_pops[d] >= max_pop:
-            continue
-        # If frontier is empty, pick next most Republican unassigned VTD as new seed
-        while not frontiers[d]:
-            unassigned = [g for g in row_dict if g not in assigned]
-            if not unassigned:
-                break
-            # Pick most Republican unassigned
-            best_seed = max(unassigned, key=lambda g: row_dict[g][REP_COL] - row_dict[g][DEM_COL])
-            assignment[best_seed] = d
-            district_pops[d] += int(row_dict[best_seed][POP_COL])
-            districts[d].add(best_seed)
-            assigned.add(best_seed)
-            for nbr in graph.neighbors(best_seed):
-                if nbr not in assigned:
-                    frontiers[d].append(nbr)
-        # Pick best available neighbor for this district
-        best_nbr = None
-        best_score = -float('inf')
-        for _ in range(len(frontiers[d])):
-            nbr = frontiers[d].popleft()
-            if nbr in assigned:
+def vtd_lookups(merged):
+    # Per-VTD dicts keyed by GEOID20, in shapefile order (avoid Series access in the inner loops)
+    geoids = merged["GEOID20"].tolist()
+    return {
+        "pop": dict(zip(geoids, merged[POP_COL].astype(int).tolist())),
+        "rep": dict(zip(geoids, merged[REP_COL].astype(float).tolist())),
+        "dem": dict(zip(geoids, merged[DEM_COL].astype(float).tolist())),
+        "lean": dict(zip(geoids, (merged[REP_COL].astype(int) - merged[DEM_COL].astype(int)).tolist())),
+    }
+
+
+def choose_seeds(merged, rng=None, spread=3):
+    # Most Republican VTDs seed the GOP districts, most Democratic ones the packed districts.
+    # With an rng the seeds are drawn from the top `spread` times as many candidates instead.
+    lean = merged[REP_COL] - merged[DEM_COL]
+    width = spread if rng is not None else 1
+    gop = list(merged.loc[lean.sort_values(ascending=False).index, "GEOID20"][:(NUM_DISTRICTS - NUM_DEM_PACKED) * width])
+    dem = list(merged.loc[lean.sort_values(ascending=True).index, "GEOID20"][:NUM_DEM_PACKED * width])
+    if rng is not None:
+        gop = rng.sample(gop, NUM_DISTRICTS - NUM_DEM_PACKED)
+        dem = rng.sample(dem, NUM_DEM_PACKED)
+    return gop + dem
+
+
+def grow_districts(graph, seeds, vtds, max_pop, verbose=True):
+    """Greedy contiguous growth: each district repeatedly takes its most Republican frontier VTD."""
+    vtd_pop, vtd_lean = vtds["pop"], vtds["lean"]
+    num_vtds = len(vtd_pop)
+
+    # Assignment structures
+    assignment = {}
+    district_pops = defaultdict(int)
+    districts = defaultdict(set)
+    # Per-district max-heap of (-lean, insertion order, GEOID20); assigned VTDs are dropped lazily
+    frontiers = defaultdict(list)
+    push_order = count()
+    assigned = set()
+
+    # Global fallback index: all VTDs from most to least Republican, consumed from the front
+    seed_order = sorted(vtds["rep"], key=lambda g: vtds["dem"][g] - vtds["rep"][g])
+    seed_pos = 0
+
+    def claim(geoid, d):
+        assignment[geoid] = d
+        district_pops[d] += vtd_pop[geoid]
+        districts[d].add(geoid)
+        assigned.add(geoid)
+        for nbr in graph.neighbors(geoid):
+            if nbr not in assigned:
+                heapq.heappush(frontiers[d], (-vtd_lean[nbr], next(push_order), nbr))
+
+    # Initialize districts with seeds
+    for d, geoid in enumerate(seeds):
+        claim(geoid, d)
+
+    progress = 0
+    # Greedy contiguous growing
+    while len(assignment) < num_vtds:
+        made_progress = False
+        assigned_before = len(assignment)
+        for d in range(NUM_DISTRICTS):
+            # Only grow if under max_pop
+            if district_pops[d] >= max_pop:
                 continue
-            row = row_dict[nbr]
-            pop = int(row[POP_COL])
-            lean = int(row[REP_COL]) - int(row[DEM_COL])
-            # Prefer most Republican
-            if lean > best_score and district_pops[d] + pop <= max_pop:
-                best_score = lean
-                best_nbr = nbr
-            frontiers[d].append(nbr)  # keep in frontier for next round
-        if best_nbr:
-            assignment[best_nbr] = d
-            district_pops[d] += int(row_dict[best_nbr][POP_COL])
-            districts[d].add(best_nbr)
-            assigned.add(best_nbr)
-            made_progress = True
-            # Add new neighbors
-            for nbr2 in graph.neighbors(best_nbr):
-                if nbr2 not in assigned:
-                    frontiers[d].append(nbr2)
-            progress += 1
-            if progress % 100 == 0:
-                print(f"Assigned {progress} VTDs / {len(merged)}...")
-
-# --- Local search: try to flip border VTDs to maximize GOP seats ---
-import random
-import math
-print("\nStarting advanced local search (multi-pass swaps + simulated annealing) to maximize GOP seats...")
-
-def get_seat_count(assignment):
-    temp_assign_df = pd.DataFrame(list(assignment.items()), columns=["GEOID20", "district"])
-    temp_results = merged.merge(temp_assign_df, on="GEOID20")
-    temp_grouped = temp_results.groupby("district").agg({REP_COL: "sum", DEM_COL: "sum"})
-    temp_grouped["winner"] = temp_grouped.apply(lambda row: "Republican" if row[REP_COL] > row[DEM_COL] else "Democrat", axis=1)
-    return (temp_grouped["winner"] == "Republican").sum(), temp_grouped
-
-def is_contiguous(district_set, remove_geoid=None, add_geoid=None):
-    # Check if a district remains contiguous after removing/adding a VTD
-    nodes = set(district_set)
-    if remove_geoid:
-        nodes.discard(remove_geoid)
-    if add_geoid:
-        nodes.add(add_geoid)
-    if not nodes:
-        return True
-    start = next(iter(nodes))
-    seen = set([start])
-    queue = deque([start])
-    while queue:
-        node = queue.popleft()
-        for nbr in graph.neighbors(node):
-            if nbr in nodes and nbr not in seen:
-                seen.add(nbr)
-                queue.append(nbr)
-    return seen == nodes
-
-current_assignment = assignment.copy()
-current_districts = {d: set(v) for d, v in districts.items()}
-current_pops = district_pops.copy()
-best_assignment = assignment.copy()
-best_seats, _ = get_seat_count(current_assignment)
-T_init = 1.0
-T_final = 0.001
-alpha = 0.995
-T = T_init
-max_iter = 2000
-
-for iteration in range(max_iter):
-    # Pick a random border VTD
-    border_vtds = []
-    for d, vtds in current_districts.items():
-        for geoid in vtds:
-            for nbr in graph.neighbors(geoid):
-                nd = current_assignment.get(nbr)
-                if nd is not None and nd != d:
-                    border_vtds.append((geoid, d, nbr, nd))
-    if not border_vtds:
-        break
-    geoid, d, nbr, nd = random.choice(border_vtds)
-    pop = int(row_dict[geoid][POP_COL])
-    # Only consider move if pop constraints are satisfied
-    if current_pops[d] - pop < min_pop or current_pops[nd] + pop > max_pop:
-        continue
-    # Only move if both districts remain contiguous
-    if not (is_contiguous(current_districts[d], remove_geoid=geoid) and is_contiguous(current_districts[nd], add_geoid=geoid)):
-        continue
-    # Try the move
-    current_assignment[geoid] = nd
-    current_districts[d].remove(geoid)
-    current_districts[nd].add(geoid)
-    current_pops[d] -= pop
-    current_pops[nd] += pop
-    new_seats, _ = get_seat_count(current_assignment)
-    delta = new_seats - best_seats
-    accept = False
-    if delta > 0:
-        accept = True
+            heap = frontiers[d]
+            # If frontier is empty, pick next most Republican unassigned VTD as new seed
+            while not heap:
+                while seed_pos < len(seed_order) and seed_order[seed_pos] in assigned:
+                    seed_pos += 1
+                if seed_pos == len(seed_order):
+                    break
+                claim(seed_order[seed_pos], d)
+            # Pick the most Republican frontier VTD that still fits under max_pop
+            best_nbr = None
+            kept = []
+            while heap:
+                item = heapq.heappop(heap)
+                if item[2] in assigned:
+                    continue
+                kept.append(item)  # keep in frontier for next round
+                if district_pops[d] + vtd_pop[item[2]] <= max_pop:
+                    best_nbr = item[2]
+                    break
+            for item in kept:
+                heapq.heappush(heap, item)
+            if best_nbr is not None:
+                claim(best_nbr, d)
+                made_progress = True
+                progress += 1
+                if verbose and progress % 100 == 0:
+                    print(f"Assigned {progress} VTDs / {num_vtds}...")
+        if len(assignment) == assigned_before:
+            # Every district is full or blocked; another pass would change nothing
+            raise RuntimeError(f"Greedy growth stalled with {num_vtds - len(assignment)} VTDs unassigned")
+    return assignment
+
+
+def anneal(graph, assignment, vtds, min_pop, max_pop, max_iter=2000, T=1.0, alpha=0.995, T_final=0.001,
+           rng=random, verbose=True, telemetry=NULL, sample_every=100, checkpoint=None, resume=None,
+           counties=None, max_splits=None, split_weight=0.0, warm=None):
+    """Simulated annealing over single border-VTD flips to maximize GOP seats.
+
+    Returns a dict with the best plan found, the plan the walk ended on, the final
+    temperature and move counts by outcome, so a caller can continue the same trajectory
+    later. An enabled telemetry gets a sample every `sample_every` iterations.
+
+    With a Checkpointer the loop snapshots its full state whenever the checkpointer says a
+    save is due. `resume` takes such a state (see decode_anneal_state), with `assignment` its
+    current plan and `rng` already restored, and continues the run exactly where it stopped;
+    `max_iter` still counts from the start of the original run.
+
+    `counties` (GEOID20 -> county) turns on county splits: a flip that takes the plan past
+    `max_splits` splits is rejected, unless the plan is already past it and the flip adds
+    none, and the walk maximizes seats minus `split_weight` times the splits.
+
+    The result's "warm" entry is the walk's incremental state (district members and
+    populations, vote totals, border pairs, fragmented districts) as plain data. A caller
+    that anneals in rounds passes it back as `warm`, with the result's "assignment", so the
+    next round starts from it instead of rebuilding everything.
+    """
+    vtd_pop = vtds["pop"]
+    current_assignment = assignment.copy()
+    if warm is None:
+        current_districts = defaultdict(set)
+        current_pops = defaultdict(int)
+        for geoid, d in current_assignment.items():
+            current_districts[d].add(geoid)
+            current_pops[d] += vtd_pop[geoid]
+        # Incremental rep/dem tally: O(1) per flip instead of a statewide merge + groupby
+        tally = DistrictTally(current_assignment, vtds["rep"], vtds["dem"])
+        # Border (vtd, neighbor district) pairs, updated only around accepted flips
+        border = BorderIndex(graph.neighbors, current_assignment)
+        # The greedy grower can leave a district in pieces; those keep using the full BFS check
+        # until a move reconnects them, everything else uses the local oracle
+        contiguous = {d: is_contiguous(graph.neighbors, nodes) for d, nodes in current_districts.items()}
     else:
-        # Simulated annealing: accept with probability exp(delta/T)
-        if random.random() < math.exp(delta / max(T, 1e-6)):
+        current_districts = defaultdict(set, {d: set(nodes) for d, nodes in warm["districts"].items()})
+        current_pops = defaultdict(int, warm["pops"])
+        tally = DistrictTally.from_totals(vtds["rep"], vtds["dem"], warm["tally_rep"], warm["tally_dem"])
+        border = BorderIndex.from_state(graph.neighbors, current_assignment, warm["border"])
+        contiguous = {d: d not in warm["fragmented"] for d in current_districts}
+    best_assignment = assignment.copy()
+    best_seats = tally.rep_seats
+    splits = None if counties is None else CountySplitTally(current_assignment, counties)
+    best_score = best_seats - split_weight * (splits.splits if splits is not None else 0)
+    accepted = 0
+    rejected_population = rejected_contiguity = rejected_county = rejected_metropolis = 0
+    sampling = telemetry.enabled
+    start = 0
+    if resume is not None:
+        best_assignment = resume["best_assignment"].copy()
+        best_seats = resume["best_seats"]
+        T = resume["T"]
+        start = resume["iteration"]
+        counts = resume["counts"]
+        tally.restore(resume["tally_rep"], resume["tally_dem"])
+        accepted = counts["accepted"]
+        rejected_population = counts["rejected_population"]
+        rejected_contiguity = counts["rejected_contiguity"]
+        rejected_metropolis = counts["rejected_metropolis"]
+        # Checkpoints from before county splits have no such count
+        rejected_county = counts.get("rejected_county", 0)
+        if splits is not None:
+            best_score = best_seats - split_weight * CountySplitTally(best_assignment, counties).splits
+        # Border sampling is positional, so the pairs must come back in their saved order
+        border.restore_order(resume["border"])
+        # Which districts still take the full BFS check decides which moves pass, so it is
+        # restored rather than recomputed
+        contiguous = {d: d not in resume["fragmented"] for d in contiguous}
+
+    def move_counts():
+        return {
+            "proposed": accepted + rejected_population + rejected_contiguity + rejected_county + rejected_metropolis,
+            "rejected_population": rejected_population,
+            "rejected_contiguity": rejected_contiguity,
+            "rejected_county": rejected_county,
+            "rejected_metropolis": rejected_metropolis,
+            "accepted": accepted,
+        }
+
+    for iteration in range(start, max_iter):
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save({
+                "iteration": iteration, "T": T, "assignment": current_assignment,
+                "best_assignment": best_assignment, "best_seats": best_seats,
+                "border": border.items(), "counts": move_counts(), "rng": rng.getstate(),
+                "fragmented": [d for d, ok in contiguous.items() if not ok],
+                "tally_rep": dict(tally.rep), "tally_dem": dict(tally.dem),
+            })
+        if sampling and iteration % sample_every == 0:
+            telemetry.sample(iteration=iteration, T=T, best_seats=best_seats, seats=tally.rep_seats,
+                             accepted=accepted)
+        # Pick a random border VTD and one of the districts it touches
+        move = border.sample(rng)
+        if move is None:
+            break
+        geoid, nd = move
+        d = current_assignment[geoid]
+        pop = vtd_pop[geoid]
+        # Only consider move if pop constraints are satisfied
+        if current_pops[d] - pop < min_pop or current_pops[nd] + pop > max_pop:
+            rejected_population += 1
+            continue
+        if max_splits is not None:
+            after = splits.splits_after(geoid, d, nd)
+            if after > max_splits and after > splits.splits:
+                rejected_county += 1
+                continue
+        # Only move if both districts remain contiguous
+        if contiguous[d]:
+            src_ok = removal_keeps_contiguous(graph.neighbors, current_districts[d], geoid)
+        else:
+            src_ok = is_contiguous(graph.neighbors, current_districts[d], remove=geoid)
+        if not src_ok:
+            rejected_contiguity += 1
+            continue
+        if contiguous[nd]:
+            dst_ok = addition_keeps_contiguous(graph.neighbors, current_districts[nd], geoid)
+        else:
+            dst_ok = is_contiguous(graph.neighbors, current_districts[nd], add=geoid)
+        if not dst_ok:
+            rejected_contiguity += 1
+            continue
+        # Try the move
+        current_assignment[geoid] = nd
+        current_districts[d].remove(geoid)
+        current_districts[nd].add(geoid)
+        current_pops[d] -= pop
+        current_pops[nd] += pop
+        new_seats = tally.move(geoid, d, nd)
+        new_score = new_seats
+        if splits is not None:
+            new_score -= split_weight * splits.move(geoid, d, nd)
+        delta = new_score - best_score
+        accept = False
+        if delta > 0:
             accept = True
-    if accept:
-        if new_seats > best_seats:
-            best_assignment = current_assignment.copy()
-            best_seats = new_seats
+        else:
+            # Simulated annealing: accept with probability exp(delta/T)
+            if rng.random() < math.exp(delta / max(T, 1e-6)):
+                accept = True
+        if accept:
+            accepted += 1
+            border.flip(geoid, d, nd)
+            contiguous[d] = contiguous[nd] = True
+            if new_score > best_score:
+                best_assignment = current_assignment.copy()
+                best_seats = new_seats
+                best_score = new_score
+        else:
+            # Revert
+            rejected_metropolis += 1
+            tally.undo()
+            if splits is not None:
+                splits.undo()
+            current_assignment[geoid] = d
+            current_districts[d].add(geoid)
+            current_districts[nd].remove(geoid)
+            current_pops[d] += pop
+            current_pops[nd] -= pop
+        if verbose and iteration % 100 == 0:
+            print(f"Local search iteration {iteration}, best GOP seats: {best_seats}, T={T:.4f}")
+        T = max(T * alpha, T_final)
+    return {
+        "best_assignment": best_assignment,
+        "best_seats": best_seats,
+        "assignment": current_assignment,
+        "seats": tally.rep_seats,
+        "splits": splits.splits if splits is not None else None,
+        "T": T,
+        "accepted": accepted,
+        "counts": move_counts(),
+        "warm": {
+            "districts": dict(current_districts), "pops": dict(current_pops),
+            "tally_rep": dict(tally.rep), "tally_dem": dict(tally.dem), "border": border.state(),
+            "fragmented": [d for d, ok in contiguous.items() if not ok],
+        },
+    }
+
+
+def encode_anneal_state(state):
+    """(arrays, meta) for a checkpoint of the annealing state passed to Checkpointer.save."""
+    order = list(state["assignment"])
+    geoids, labels = pack_assignment(state["assignment"])
+    _, best = pack_assignment(state["best_assignment"], order)
+    position = {g: i for i, g in enumerate(order)}
+    border = state["border"]
+    rng_words, rng_meta = pack_rng(state["rng"])
+    arrays = {
+        "geoids": geoids,
+        "assignment": labels,
+        "best_assignment": best,
+        "border_vtd": np.fromiter((position[g] for g, _ in border), dtype=np.int32, count=len(border)),
+        "border_district": np.fromiter((d for _, d in border), dtype=np.uint8, count=len(border)),
+        "rng": rng_words,
+        "tally_district": np.array(sorted(state["tally_rep"]), dtype=np.int64),
+    }
+    arrays["tally_rep"] = np.array([state["tally_rep"][d] for d in arrays["tally_district"].tolist()])
+    arrays["tally_dem"] = np.array([state["tally_dem"][d] for d in arrays["tally_district"].tolist()])
+    meta = {"iteration": state["iteration"], "T": state["T"], "best_seats": state["best_seats"],
+            "counts": state["counts"], "fragmented": state["fragmented"], **rng_meta}
+    return arrays, meta
+
+
+def decode_anneal_state(arrays, meta):
+    """The state dict encode_anneal_state saved, ready for anneal(..., resume=state)."""
+    geoids = arrays["geoids"].astype(str)
+    order = geoids.tolist()
+    return {
+        "iteration": meta["iteration"],
+        "T": meta["T"],
+        "best_seats": meta["best_seats"],
+        "counts": meta["counts"],
+        "fragmented": meta["fragmented"],
+        "assignment": unpack_assignment(geoids, arrays["assignment"]),
+        "best_assignment": unpack_assignment(geoids, arrays["best_assignment"]),
+        "border": [(order[i], d) for i, d in zip(arrays["border_vtd"].tolist(), arrays["border_district"].tolist())],
+        "rng": unpack_rng(arrays["rng"], meta),
+        "tally_rep": dict(zip(arrays["tally_district"].tolist(), arrays["tally_rep"].tolist())),
+        "tally_dem": dict(zip(arrays["tally_district"].tolist(), arrays["tally_dem"].tolist())),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Greedy contiguous growth plus annealing for an extreme GOP plan")
+    parser.add_argument("--max-iter", type=int, default=2000, help="annealing iterations")
+    parser.add_argument("--checkpoint", default="district_assignment_contig_extreme.ckpt",
+                        help="file the annealer snapshots its state to")
+    parser.add_argument("--checkpoint-every", type=float, default=60.0, help="seconds between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="continue the run saved in --checkpoint")
+    parser.add_argument("--seed", type=int, default=None, help="seed the annealer's RNG for a reproducible run")
+    parser.add_argument("--max-county-splits", type=int, default=None, help="reject flips past this many county splits")
+    parser.add_argument("--county-weight", type=float, default=0.0, help="seats traded for one fewer county split")
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    trace = telemetry("extreme_gerrymander_contiguous")
+    # Load data
+    with trace.phase("load"):
+        graph = load_adjacency()
+        use_counties = args.max_county_splits is not None or args.county_weight > 0
+        merged = load_vtd_table(VTD_COLUMNS + [COUNTY_COL] if use_counties else VTD_COLUMNS)
+        min_pop, max_pop = population_bounds(merged)
+        vtds = vtd_lookups(merged)
+        counties = dict(zip(merged["GEOID20"], merged[COUNTY_COL])) if use_counties else None
+
+    resume = None
+    if args.resume:
+        resume = decode_anneal_state(*read_checkpoint(args.checkpoint))
+        assignment = resume["assignment"]
+        random.setstate(resume["rng"])
+        print(f"Resuming from {args.checkpoint} at iteration {resume['iteration']}")
     else:
-        # Revert
-        current_assignment[geoid] = d
-        current_districts[d].add(geoid)
-        current_districts[nd].remove(geoid)
-        current_pops[d] += pop
-        current_pops[nd] -= pop
-    if iteration % 100 == 0:
-        print(f"Local search iteration {iteration}, best GOP seats: {best_seats}, T={T:.4f}")
-    T = max(T * alpha, T_final)
-assignment = best_assignment.copy()
-
-# Save assignment
-assign_df = pd.DataFrame(list(assignment.items()), columns=["GEOID20", "district"])
-assign_df["GEOID20"] = assign_df["GEOID20"].astype(str)
-assign_df.to_csv("district_assignment_contig_extreme.csv", index=False)
-print("Contiguous extreme gerrymandered assignment saved to district_assignment_contig_extreme.csv")
-
-# Summarize seats
-merged["GEOID20"] = merged["GEOID20"].astype(str)
-results = merged.merge(assign_df, on="GEOID20")
-grouped = results.groupby("district").agg({REP_COL: "sum", DEM_COL: "sum"})
-grouped["winner"] = grouped.apply(lambda row: "Republican" if row[REP_COL] > row[DEM_COL] else "Democrat", axis=1)
-print("\nSeat counts by party:")
-print(grouped["winner"].value_counts())
-print("\nDistrict winners:")
-print(grouped["winner"])
+        with trace.phase("grow") as phase:
+            assignment = grow_districts(graph, choose_seeds(merged), vtds, max_pop)
+            phase.units = len(assignment)
+
+    # --- Local search: try to flip border VTDs to maximize GOP seats ---
+    print("\nStarting advanced local search (multi-pass swaps + simulated annealing) to maximize GOP seats...")
+    checkpoint = Checkpointer(args.checkpoint, encode_anneal_state, every=args.checkpoint_every)
+    with trace.phase("anneal") as phase:
+        result = anneal(graph, assignment, vtds, min_pop, max_pop, max_iter=args.max_iter, telemetry=trace,
+                        checkpoint=checkpoint, resume=resume, counties=counties,
+                        max_splits=args.max_county_splits, split_weight=args.county_weight)
+        phase.units = result["counts"]["proposed"]
+    trace.count("checkpoints", checkpoint.saves)
+    trace.add_counts(result["counts"])
+    trace.sample(best_seats=result["best_seats"], T=result["T"])
+    if counties is not None:
+        print(f"County splits in the best plan: {CountySplitTally(result['best_assignment'], counties).splits}")
+    assignment = result["best_assignment"]
+
+    # Save assignment
+    with trace.phase("save"):
+        assign_df = pd.DataFrame(list(assignment.items()), columns=["GEOID20", "district"])
+        assign_df["GEOID20"] = assign_df["GEOID20"].astype(str)
+        assign_df.to_csv("district_assignment_contig_extreme.csv", index=False)
+    print("Contiguous extreme gerrymandered assignment saved to district_assignment_contig_extreme.csv")
+    # The run finished, so there is nothing left to resume
+    checkpoint.remove()
+
+    # Summarize seats
+    merged["GEOID20"] = merged["GEOID20"].astype(str)
+    results = merged.merge(assign_df, on="GEOID20")
+    grouped = results.groupby("district").agg({REP_COL: "sum", DEM_COL: "sum"})
+    grouped["winner"] = grouped.apply(lambda row: "Republican" if row[REP_COL] > row[DEM_COL] else "Democrat", axis=1)
+    print("\nSeat counts by party:")
+    print(grouped["winner"].value_counts())
+    print("\nDistrict winners:")
+    print(grouped["winner"])
+    trace.close()
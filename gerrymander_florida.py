@@ -1,19 +1,43 @@
 from gerrychain import (GeographicPartition, Partition, MarkovChain, proposals, constraints, accept)
-from gerrychain.updaters import Tally
+from gerrychain.updaters import Tally, county_splits
 import networkx as nx
-import geopandas as gpd
 import random
-from gerrychain.tree import recursive_tree_part
+import argparse
+from tree_partition import recursive_tree_part
+from county_partition import county_tree_part, split_count, within_county_splits
+import objectives
+from vtd_data import load_vtd_table
+from instrumentation import telemetry
+from checkpoint import Checkpointer, read_checkpoint, pack_assignment, unpack_assignment, pack_rng, unpack_rng
+
+parser = argparse.ArgumentParser(description="ReCom chain that keeps the plan with the most target-party seats")
+parser.add_argument("--steps", type=int, default=100, help="chain length")
+parser.add_argument("--checkpoint", default="district_assignment.ckpt", help="file the chain snapshots its state to")
+parser.add_argument("--checkpoint-every", type=float, default=60.0, help="seconds between checkpoints")
+parser.add_argument("--resume", action="store_true", help="continue the run saved in --checkpoint")
+parser.add_argument("--county-seed", action="store_true", help="draw the seed plan splitting as few counties as possible")
+parser.add_argument("--max-county-splits", type=int, default=None,
+                    help="reject plans with more county splits (the seed plan must meet it; see --county-seed)")
+parser.add_argument("--county-weight", type=float, default=0.0, help="seats traded for one fewer county split")
+parser.add_argument("--county-surcharge", type=float, default=0.0,
+                    help="ReCom region surcharge on cut edges between counties (0 disables it)")
+args = parser.parse_args()
+# County data is only loaded and tallied when one of the county options asks for it
+use_counties = (args.county_seed or args.max_county_splits is not None or args.county_weight > 0
+                or args.county_surcharge > 0)
+
+trace = telemetry("gerrymander_florida")
 
 # Load graph and merged data
-import pickle
-with open("vtd_graph.gpickle", "rb") as f:
-    graph = pickle.load(f)
-merged = gpd.read_file("merged_vtds.shp")
+from csr_graph import load_graph
+with trace.phase("load"):
+    graph = load_graph()
+    merged = load_vtd_table()
 
 # Number of districts (set as needed)
 NUM_DISTRICTS = 27  # Example: Florida congressional
 POP_COL = "population"
+COUNTY_COL = "county"
 
 
 # Ensure graph is connected; use largest connected component if not
@@ -21,46 +45,91 @@ import networkx as nx
 if not nx.is_connected(graph):
     largest_cc = max(nx.connected_components(graph), key=len)
     graph = graph.subgraph(largest_cc).copy()
+if use_counties:
+    nx.set_node_attributes(graph, dict(zip(merged["GEOID20"], merged[COUNTY_COL])), COUNTY_COL)
 
 # Calculate ideal population per district
 ideal_pop = sum(graph.nodes[n][POP_COL] for n in graph.nodes) / NUM_DISTRICTS
 
-# Use recursive_tree_part to generate a valid initial assignment
-assignment = recursive_tree_part(
-    graph,
-    parts=list(range(NUM_DISTRICTS)),
-    pop_col=POP_COL,
-    pop_target=ideal_pop,
-    epsilon=0.20,  # 20% deviation, can tighten later
-    node_repeats=1
-)
+
+def encode_chain_state(state):
+    # Plans in graph node order; the RNG is the global one gerrychain's proposals draw from
+    nodes = list(graph.nodes)
+    geoids, labels = pack_assignment(state["assignment"], nodes)
+    _, best = pack_assignment(state["best_assignment"], nodes)
+    rng_words, rng_meta = pack_rng(state["rng"])
+    arrays = {"geoids": geoids, "assignment": labels, "best_assignment": best, "rng": rng_words}
+    return arrays, {"step": state["step"], "best_seats": state["best_seats"], **rng_meta}
+
+
+# A resumed chain restarts from the saved plan, best plan, step and RNG state. gerrychain's
+# ReCom draws from Python sets of GEOID20s, whose order depends on the interpreter's hash
+# seed and the sets' history, so the continuation is a valid chain from the same state
+# rather than a replay of the interrupted one.
+resume = None
+if args.resume:
+    arrays, meta = read_checkpoint(args.checkpoint)
+    resume = {"step": meta["step"], "best_seats": meta["best_seats"],
+              "assignment": unpack_assignment(arrays["geoids"], arrays["assignment"]),
+              "best_assignment": unpack_assignment(arrays["geoids"], arrays["best_assignment"])}
+    random.setstate(unpack_rng(arrays["rng"], meta))
+    assignment = resume["assignment"]
+    print(f"Resuming from {args.checkpoint} at step {resume['step']}")
+else:
+    # Use recursive_tree_part to generate a valid initial assignment
+    with trace.phase("seed_plan"):
+        if args.county_seed:
+            assignment, county_stats = county_tree_part(
+                graph,
+                parts=list(range(NUM_DISTRICTS)),
+                pop_target=ideal_pop,
+                pop_col=POP_COL,
+                epsilon=0.20,
+                counties=nx.get_node_attributes(graph, COUNTY_COL),
+            )
+            trace.count("seed_counties_split", county_stats["counties_split"])
+            trace.count("seed_extra_pieces", county_stats["extra_pieces"])
+        else:
+            assignment = recursive_tree_part(
+                graph,
+                parts=list(range(NUM_DISTRICTS)),
+                pop_col=POP_COL,
+                pop_target=ideal_pop,
+                epsilon=0.20,  # 20% deviation, can tighten later
+                node_repeats=1
+            )
 
 
 # Build initial partition using Tally updaters
-partition = GeographicPartition(
-    graph,
-    assignment,
-    updaters={
-        "population": Tally(POP_COL, alias="population"),
-        "dem": Tally("dem", alias="dem"),
-        "rep": Tally("rep", alias="rep"),
-    },
-)
+chain_updaters = {
+    "population": Tally(POP_COL, alias="population"),
+    "dem": Tally("dem", alias="dem"),
+    "rep": Tally("rep", alias="rep"),
+}
+if use_counties:
+    chain_updaters["county_splits"] = county_splits("county_splits", COUNTY_COL)
+    chain_updaters["splits"] = split_count
+partition = GeographicPartition(graph, assignment, updaters=chain_updaters)
 
 
 # Population constraint: districts within 20% of ideal
 pop_constraint = constraints.within_percent_of_ideal_population(partition, 0.20)
 
-# Objective: maximize number of districts with rep > dem
+# Objective: maximize number of districts with dem > rep, read from the "dem"/"rep" tallies
+seat_objective = objectives.seats("dem")  # Optimize for Democrats
 
 def seat_count(partition):
-    count = 0
-    for part in partition.parts:
-        rep = sum(graph.nodes[n]["rep"] for n in partition.parts[part])
-        dem = sum(graph.nodes[n]["dem"] for n in partition.parts[part])
-        if dem > rep:  # Optimize for Democrats
-            count += 1
-    return count
+    return objectives.score(seat_objective, partition)
+
+# With --county-weight, each county split costs that many seats
+def plan_score(partition):
+    if args.county_weight > 0:
+        return seat_count(partition) - args.county_weight * partition["splits"]
+    return seat_count(partition)
+
+chain_constraints = [trace.counted("rejected_population", pop_constraint)]
+if args.max_county_splits is not None:
+    chain_constraints.append(trace.counted("rejected_county", within_county_splits(args.max_county_splits)))
 
 # Set up MarkovChain with ReCom proposal
 chain = MarkovChain(
@@ -68,27 +137,54 @@ chain = MarkovChain(
         partition,
         pop_col=POP_COL,
         pop_target=ideal_pop,
-        epsilon=0.20
+        epsilon=0.20,
+        region_surcharge={COUNTY_COL: args.county_surcharge} if args.county_surcharge else None
     ),
-    constraints=[pop_constraint],
+    constraints=chain_constraints,
     accept=accept.always_accept,
     initial_state=partition,
-    total_steps=100
+    # A resumed chain first yields the saved plan again, which was already scored
+    total_steps=args.steps if resume is None else args.steps - resume["step"] + 1
 )
 
 # Run chain and save best plan
 best_partition = None
 best_seats = -1
-for step, part in enumerate(chain):
-    seats = seat_count(part)
-    if seats > best_seats:
-        best_seats = seats
-        best_partition = part
-    print(f"Step {step}: {seats} seats for target party")
+first_step = 0
+if resume is not None:
+    best_partition = Partition(graph, resume["best_assignment"])
+    best_seats = resume["best_seats"]
+    first_step = resume["step"] - 1
+checkpoint = Checkpointer(args.checkpoint, encode_chain_state, every=args.checkpoint_every)
+with trace.phase("chain") as phase:
+    for step, part in enumerate(chain, start=first_step):
+        if resume is not None and step == first_step:
+            continue
+        # best_seats is the best plan_score, which is the seat count unless --county-weight is set
+        score = plan_score(part)
+        if score > best_seats:
+            best_seats = score
+            best_partition = part
+            trace.count("improved")
+        trace.count("accepted")
+        if use_counties:
+            trace.sample(step=step, seats=score, best_seats=best_seats, splits=part["splits"])
+            print(f"Step {step}: {seat_count(part)} seats for target party, {part['splits']} county splits")
+        else:
+            trace.sample(step=step, seats=score, best_seats=best_seats)
+            print(f"Step {step}: {score} seats for target party")
+        if checkpoint.due():
+            checkpoint.save({"step": step + 1, "assignment": part.assignment, "best_seats": best_seats,
+                             "best_assignment": best_partition.assignment, "rng": random.getstate()})
+    phase.units = step + 1 - (resume["step"] if resume is not None else 0)
+trace.count("checkpoints", checkpoint.saves)
 
 # Save best assignment
-district_assignment = {node: best_partition.assignment[node] for node in best_partition.graph.nodes}
-import pandas as pd
-assign_df = pd.DataFrame(list(district_assignment.items()), columns=["GEOID20", "district"])
-assign_df.to_csv("district_assignment.csv", index=False)
+with trace.phase("save"):
+    district_assignment = {node: best_partition.assignment[node] for node in best_partition.graph.nodes}
+    import pandas as pd
+    assign_df = pd.DataFrame(list(district_assignment.items()), columns=["GEOID20", "district"])
+    assign_df.to_csv("district_assignment.csv", index=False)
 print("Best district assignment saved to district_assignment.csv")
+checkpoint.remove()
+trace.close()
@@ -1,9 +1,19 @@
+import argparse
 import geopandas as gpd
 import pandas as pd
 import folium
 
+SHAPEFILE = 'newtest/tl_2020_12_vtd20.shp'
+TOOLTIP_FIELDS = ['GEOID20', 'pop', 'county', 'pre_20_rep_tru', 'pre_20_dem_bid']
+TOOLTIP_ALIASES = ['VTD GEOID:', 'Population:', 'County:', 'Trump 2020:', 'Biden 2020:']
+
+parser = argparse.ArgumentParser(description='Interactive map of VTD population and 2020 presidential votes')
+parser.add_argument('--tiles', metavar='DIR', help='pre-render local map tiles and a viewer to DIR instead of one HTML page')
+parser.add_argument('--workers', type=int, default=None)
+args = parser.parse_args()
+
 # Load the new VTD shapefile
-gdf = gpd.read_file('newtest/tl_2020_12_vtd20.shp')
+gdf = gpd.read_file(SHAPEFILE)
 
 # Load the VTD CSV with population and demographic data
 vtd = pd.read_csv('fl_2020_vtd.csv', dtype={'GEOID20': str})
@@ -15,6 +25,22 @@ merged = gdf.merge(vtd, on='GEOID20', how='left')
 print(f"Precincts in shapefile: {len(gdf)}")
 print(f"Precincts with population data after join: {merged['pop'].notnull().sum()}")
 
+if args.tiles:
+    # Tiled mode: outlines only when zoomed out, tooltip attributes from zoom 10
+    from tile_render import render_tiles
+    props = merged.drop(columns='geometry').set_index('GEOID20')[TOOLTIP_FIELDS[1:]]
+    layer = {
+        'name': 'vtds',
+        'shapes': 'vtds',
+        'properties': props.where(props.notnull(), None).to_dict('index'),
+        'fields_by_zoom': {0: [], 10: TOOLTIP_FIELDS[1:]},
+        'labels': dict(zip(TOOLTIP_FIELDS[1:], TOOLTIP_ALIASES[1:])),
+        'style': {'stroke': '#3388ff', 'weight': 0.5},
+    }
+    count = render_tiles(args.tiles, SHAPEFILE, [layer], workers=args.workers, title='VTD population')
+    print(f'{count} tiles written; open {args.tiles}/viewer.html in your browser.')
+    raise SystemExit
+
 # Create interactive map with population tooltip
 center = [merged.geometry.centroid.y.mean(), merged.geometry.centroid.x.mean()]
 m = folium.Map(location=center, zoom_start=7)
@@ -24,8 +50,8 @@ folium.GeoJson(
     merged,
     name='VTDs',
     tooltip=folium.GeoJsonTooltip(
-        fields=['GEOID20', 'pop', 'county', 'pre_20_rep_tru', 'pre_20_dem_bid'],
-        aliases=['VTD GEOID:', 'Population:', 'County:', 'Trump 2020:', 'Biden 2020:'],
+        fields=TOOLTIP_FIELDS,
+        aliases=TOOLTIP_ALIASES,
         localize=True
     )
 ).add_to(m)
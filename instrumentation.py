@@ -0,0 +1,129 @@
+import os
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Opt-in run telemetry for the planners. Set GERRY_TRACE to a file path and every run appends
+# JSON lines to it: one "phase" record per timed phase, periodic "sample" records (iteration,
+# temperature, best objective, ...), and a closing "summary" with wall time per phase,
+# throughput and event counts (proposals, rejections by reason, acceptances). The same
+# summary is printed as a table. With GERRY_TRACE unset the planners get NullTelemetry,
+# whose methods do nothing, and hot loops skip sampling by checking `telemetry.enabled`.
+
+TRACE_ENV = "GERRY_TRACE"
+
+
+class _Phase:
+    __slots__ = ("units",)
+
+    def __init__(self):
+        self.units = None  # set inside the block to report units/second for the phase
+
+
+class Telemetry:
+    enabled = True
+
+    def __init__(self, path, run):
+        self.run = run
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.units = {}
+        self.counts = Counter()
+        # Line-buffered, so every record is on disk as soon as it is written
+        self._file = open(path, "a", buffering=1)
+        self.emit("start", pid=os.getpid())
+
+    def emit(self, kind, **fields):
+        record = {"run": self.run, "kind": kind, "t": round(time.perf_counter() - self.start, 6)}
+        record.update(fields)
+        self._file.write(json.dumps(record) + "\n")
+
+    @contextmanager
+    def phase(self, name):
+        handle = _Phase()
+        t0 = time.perf_counter()
+        try:
+            yield handle
+        finally:
+            seconds = time.perf_counter() - t0
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+            if handle.units is not None:
+                self.units[name] = self.units.get(name, 0) + handle.units
+            self.emit("phase", name=name, seconds=seconds, units=handle.units)
+
+    def count(self, event, n=1):
+        self.counts[event] += n
+
+    def add_counts(self, counts):
+        self.counts.update(counts)
+
+    def sample(self, **fields):
+        self.emit("sample", **fields)
+
+    def counted(self, event, check):
+        """Wrap a boolean check (e.g. a gerrychain constraint) to count its failures as `event`."""
+        def wrapper(*args, **kwargs):
+            ok = check(*args, **kwargs)
+            if not ok:
+                self.counts[event] += 1
+            return ok
+        wrapper.__name__ = getattr(check, "__name__", event)
+        return wrapper
+
+    def summary(self):
+        total = time.perf_counter() - self.start
+        phases = {name: {"seconds": seconds, "share": seconds / total if total else 0.0,
+                         "units_per_sec": self.units[name] / seconds if name in self.units and seconds else None}
+                  for name, seconds in self.phases.items()}
+        return {"total_seconds": total, "phases": phases, "counts": dict(self.counts)}
+
+    def close(self):
+        summary = self.summary()
+        self.emit("summary", **summary)
+        self._file.close()
+        print(f"\nTelemetry for {self.run} ({summary['total_seconds']:.2f}s total):")
+        print(f"{'phase':<16}{'seconds':>10}{'share':>8}{'units/s':>12}")
+        for name, p in summary["phases"].items():
+            rate = f"{p['units_per_sec']:.1f}" if p["units_per_sec"] is not None else "-"
+            print(f"{name:<16}{p['seconds']:>10.3f}{p['share']:>8.1%}{rate:>12}")
+        if summary["counts"]:
+            print(f"{'event':<28}{'count':>10}")
+            for event, n in sorted(summary["counts"].items()):
+                print(f"{event:<28}{n:>10}")
+
+
+class NullTelemetry:
+    enabled = False
+    _phase = _Phase()
+
+    @contextmanager
+    def phase(self, name):
+        yield self._phase
+
+    def emit(self, kind, **fields):
+        pass
+
+    def count(self, event, n=1):
+        pass
+
+    def add_counts(self, counts):
+        pass
+
+    def sample(self, **fields):
+        pass
+
+    def counted(self, event, check):
+        return check
+
+    def close(self):
+        pass
+
+
+NULL = NullTelemetry()
+
+
+def telemetry(run):
+    """Telemetry writing to $GERRY_TRACE, or the no-op NULL when the variable is unset."""
+    path = os.environ.get(TRACE_ENV)
+    return Telemetry(path, run) if path else NULL
@@ -0,0 +1,316 @@
+import os
+import json
+import numpy as np
+import geopandas as gpd
+import shapely
+from shapely.geometry.polygon import orient
+
+from stage_cache import fingerprint, cached_stage
+
+# Shared geometry layer for the folium maps. The VTD polygons are turned once into an arc
+# topology (TopoJSON's model): every stretch of boundary between two junctions is stored a
+# single time as an "arc", and each VTD ring is a list of references to arcs, ~i meaning arc i
+# reversed. Arcs are simplified independently with fixed endpoints, so neighboring VTDs stay
+# gap-free at any tolerance, and the result is cached per shapefile and tolerance.
+#
+# A district outline is the set of its VTDs' arcs that are not shared with another VTD of the
+# same district, chained end to start - no polygon dissolve. Maps embed a TopoJSON with only
+# the arcs they draw, delta-encoded on a coarse integer grid.
+
+GRID = 1_000_000            # topology grid: integer units per degree (about 0.1 m)
+DEFAULT_TOLERANCE = 0.0005  # simplification tolerance in degrees (about 50 m)
+DEFAULT_QUANTIZATION = 100_000  # output grid cells across the map's bounding box
+
+
+def _ring_arrays(gdf):
+    """Quantized rings of every polygon: exteriors counter-clockwise, holes clockwise."""
+    rings, owners = [], []  # owners[i] = (shape index, polygon index, ring index)
+    for s, geom in enumerate(gdf.geometry):
+        if geom is None or geom.is_empty:
+            continue
+        polygons = geom.geoms if geom.geom_type == "MultiPolygon" else [geom]
+        for p, polygon in enumerate(polygons):
+            polygon = orient(polygon, 1.0)
+            for r, ring in enumerate([polygon.exterior, *polygon.interiors]):
+                pts = np.rint(np.asarray(ring.coords)[:-1, :2] * GRID).astype(np.int64)
+                keep = np.any(pts != np.roll(pts, 1, axis=0), axis=1)
+                pts = pts[keep]
+                if len(pts) >= 3:
+                    rings.append(pts)
+                    owners.append((s, p, r))
+    return rings, owners
+
+
+def _junctions(rings):
+    """Per ring, the positions where its boundary must be cut into arcs.
+
+    A vertex is a junction when the segments before and after it are shared with different
+    rings, or when three or more rings meet there.
+    """
+    lengths = np.array([len(r) for r in rings])
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    pts = np.concatenate(rings)
+    origin = pts.min(axis=0)
+    shifted = pts - origin
+    key = shifted[:, 0] * (int(shifted[:, 1].max()) + 1) + shifted[:, 1]
+    ring_of = np.repeat(np.arange(len(rings)), lengths)
+    pos = np.arange(len(pts)) - starts[ring_of]
+    nxt = starts[ring_of] + (pos + 1) % lengths[ring_of]
+    prv = starts[ring_of] + (pos - 1) % lengths[ring_of]
+
+    # Undirected segment i -> next(i), and which rings use each one
+    lo = np.minimum(key, key[nxt])
+    hi = np.maximum(key, key[nxt])
+    _, seg = np.unique(np.stack([lo, hi], axis=1), axis=0, return_inverse=True)
+    seg = seg.ravel()
+    num_segs = seg.max() + 1
+    first = np.full(num_segs, len(rings))
+    last = np.full(num_segs, -1)
+    np.minimum.at(first, seg, ring_of)
+    np.maximum.at(last, seg, ring_of)
+    signature = first[seg] * (len(rings) + 1) + np.where(first[seg] == last[seg], 0, last[seg] + 1)
+    cut = signature != signature[prv]
+
+    # Points where three or more rings meet, even if no segment changes hands there
+    point_ring = np.unique(np.stack([key, ring_of], axis=1), axis=0)
+    _, point_idx, ring_count = np.unique(point_ring[:, 0], return_inverse=True, return_counts=True)
+    crowded = set(point_ring[ring_count[point_idx.ravel()] >= 3, 0].tolist())
+    if crowded:
+        cut |= np.isin(key, list(crowded))
+    return [np.flatnonzero(cut[s:s + n]) for s, n in zip(starts, lengths)]
+
+
+def _cut_arcs(rings):
+    """Split rings into shared arcs. Returns (arcs, refs) with refs[i] the arc list of ring i."""
+    arcs, index, refs = [], {}, []
+
+    def add(chain):
+        forward, backward = chain.tobytes(), chain[::-1].tobytes()
+        if forward in index:
+            return index[forward]
+        if backward in index:
+            return ~index[backward]
+        index[forward] = len(arcs)
+        arcs.append(chain)
+        return len(arcs) - 1
+
+    for ring, cuts in zip(rings, _junctions(rings)):
+        if len(cuts) == 0:
+            # Closed loop with a single neighbor (or none): start at its smallest vertex so
+            # both sides produce the same arc
+            start = np.lexsort((ring[:, 1], ring[:, 0]))[0]
+            loop = np.roll(ring, -start, axis=0)
+            refs.append([add(np.vstack([loop, loop[:1]]))])
+            continue
+        loop = np.roll(ring, -cuts[0], axis=0)
+        loop = np.vstack([loop, loop[:1]])
+        bounds = list(cuts - cuts[0]) + [len(ring)]
+        refs.append([add(loop[a:b + 1]) for a, b in zip(bounds[:-1], bounds[1:])])
+    return arcs, refs
+
+
+def _simplify(arcs, tolerance):
+    """Douglas-Peucker per arc with endpoints fixed; closed arcs keep a valid ring."""
+    if tolerance <= 0:
+        return arcs
+    lines = shapely.linestrings(np.concatenate(arcs).astype(float),
+                                indices=np.repeat(np.arange(len(arcs)), [len(a) for a in arcs]))
+    closed = np.array([len(a) > 3 and (a[0] == a[-1]).all() for a in arcs])
+    simplified = np.empty(len(arcs), dtype=object)
+    simplified[~closed] = shapely.simplify(lines[~closed], tolerance * GRID, preserve_topology=False)
+    simplified[closed] = shapely.simplify(lines[closed], tolerance * GRID, preserve_topology=True)
+    return [np.rint(shapely.get_coordinates(line)).astype(np.int64) for line in simplified]
+
+
+def build_topology(gdf, tolerance=DEFAULT_TOLERANCE, id_col="GEOID20"):
+    """Simplified arc topology of a polygon layer.
+
+    Returns {"arcs": [int64 (n, 2) arrays in GRID units], "shapes": {id: [[ring refs], ...]
+    per polygon, exterior first]}.
+    """
+    gdf = gdf.to_crs(epsg=4326)
+    rings, owners = _ring_arrays(gdf)
+    arcs, refs = _cut_arcs(rings)
+    ids = gdf[id_col].astype(str).tolist()
+    shapes = {}
+    for (s, p, r), ring_refs in zip(owners, refs):
+        polygons = shapes.setdefault(ids[s], {})
+        polygons.setdefault(p, []).append(ring_refs)
+    return {
+        "arcs": _simplify(arcs, tolerance),
+        "shapes": {geoid: list(polygons.values()) for geoid, polygons in shapes.items()},
+    }
+
+
+def _save_topology(topo, path):
+    lengths = np.array([len(a) for a in topo["arcs"]])
+    np.save(os.path.join(path, "arc_lengths.npy"), lengths)
+    np.save(os.path.join(path, "arc_coords.npy"), np.concatenate(topo["arcs"]))
+    with open(os.path.join(path, "shapes.json"), "w") as f:
+        json.dump(topo["shapes"], f)
+
+
+def _load_topology(path):
+    lengths = np.load(os.path.join(path, "arc_lengths.npy"))
+    coords = np.load(os.path.join(path, "arc_coords.npy"))
+    with open(os.path.join(path, "shapes.json")) as f:
+        shapes = json.load(f)
+    return {"arcs": np.split(coords, np.cumsum(lengths)[:-1]), "shapes": shapes}
+
+
+def load_topology(shapefile="merged_vtds.shp", tolerance=DEFAULT_TOLERANCE, id_col="GEOID20", force=False):
+    """Cached build_topology for a shapefile; rebuilt only when the file or tolerance changes."""
+    key = fingerprint("map_topology", inputs=[shapefile],
+                      params={"tolerance": tolerance, "grid": GRID, "id_col": id_col})
+    topo, _, _ = cached_stage(
+        "map_topology", key,
+        build=lambda: build_topology(gpd.read_file(shapefile)[[id_col, "geometry"]], tolerance, id_col),
+        save=_save_topology, load=_load_topology, force=force,
+    )
+    return topo
+
+
+def _endpoints(topo, ref):
+    arc = topo["arcs"][ref if ref >= 0 else ~ref]
+    a, b = (arc[0], arc[-1]) if ref >= 0 else (arc[-1], arc[0])
+    return tuple(a), tuple(b)
+
+
+def _ring_coords(topo, refs):
+    parts = [topo["arcs"][r] if r >= 0 else topo["arcs"][~r][::-1] for r in refs]
+    return np.vstack([parts[0]] + [p[1:] for p in parts[1:]])
+
+
+def shape_geometry(topo, polygons):
+    """Shapely MultiPolygon in degrees for polygons given as arc references."""
+    parts = []
+    for polygon in polygons:
+        rings = [_ring_coords(topo, ring) / GRID for ring in polygon]
+        parts.append(shapely.Polygon(rings[0], rings[1:]))
+    return shapely.MultiPolygon(parts)
+
+
+def _signed_area(coords):
+    x, y = coords[:, 0].astype(float), coords[:, 1].astype(float)
+    return 0.5 * np.sum(x[:-1] * y[1:] - x[1:] * y[:-1])
+
+
+def district_shapes(topo, assignment):
+    """District polygons as arc references, derived from the VTD topology.
+
+    assignment: GEOID20 -> district. Returns {district: [[exterior refs, hole refs...], ...]}.
+    """
+    members = {}
+    for geoid, district in assignment.items():
+        if str(geoid) in topo["shapes"]:
+            members.setdefault(district, []).append(str(geoid))
+    result = {}
+    for district, geoids in members.items():
+        # An arc used by two VTDs of this district is interior; the rest is its outline
+        used = {}
+        for geoid in geoids:
+            for polygon in topo["shapes"][geoid]:
+                for ring in polygon:
+                    for ref in ring:
+                        arc = ref if ref >= 0 else ~ref
+                        used[arc] = None if arc in used else ref
+        outward = {}
+        for ref in used.values():
+            if ref is not None:
+                outward.setdefault(_endpoints(topo, ref)[0], []).append(ref)
+        rings = []
+        while outward:
+            start = next(iter(outward))
+            ring, point = [], start
+            while point in outward:
+                ref = outward[point].pop()
+                if not outward[point]:
+                    del outward[point]
+                ring.append(ref)
+                point = _endpoints(topo, ref)[1]
+                if point == start:
+                    break
+            rings.append(ring)
+        # Counter-clockwise rings are exteriors; each hole goes to the smallest exterior around it
+        exteriors, holes = [], []
+        for ring in rings:
+            coords = _ring_coords(topo, ring)
+            (exteriors if _signed_area(coords) >= 0 else holes).append((ring, coords))
+        polygons = [[ring] for ring, _ in exteriors]
+        shells = [shapely.Polygon(coords) for _, coords in exteriors]
+        for ring, coords in holes:
+            probe = shapely.Point(coords[0])
+            inside = [i for i, shell in enumerate(shells) if shell.covers(probe)]
+            if inside:
+                polygons[min(inside, key=lambda i: shells[i].area)].append(ring)
+        result[district] = polygons
+    return result
+
+
+def to_topojson(topo, objects, quantization=DEFAULT_QUANTIZATION):
+    """TopoJSON dict embedding only the arcs that `objects` reference.
+
+    objects: {name: [(polygons as arc references, properties), ...]}.
+    """
+    used = sorted({r if r >= 0 else ~r for features in objects.values() for polygons, _ in features
+                   for polygon in polygons for ring in polygon for r in ring})
+    renumber = {arc: i for i, arc in enumerate(used)}
+    if not used:
+        return {"type": "Topology", "arcs": [], "objects": {}}
+    coords = np.concatenate([topo["arcs"][a] for a in used])
+    lo, hi = coords.min(axis=0), coords.max(axis=0)
+    step = np.maximum((hi - lo) / (quantization - 1), 1)
+    arcs = []
+    for a in used:
+        q = np.rint((topo["arcs"][a] - lo) / step).astype(np.int64)
+        # Collapse repeats the coarser grid creates, keeping both endpoints
+        keep = np.concatenate([[True], np.any(q[1:] != q[:-1], axis=1)])
+        keep[-1] = True
+        q = q[keep]
+        arcs.append(np.vstack([q[:1], np.diff(q, axis=0)]).tolist())
+
+    def remap(ref):
+        return renumber[ref] if ref >= 0 else ~renumber[~ref]
+
+    out = {}
+    for name, features in objects.items():
+        geometries = []
+        for polygons, properties in features:
+            arcs_ref = [[[remap(r) for r in ring] for ring in polygon] for polygon in polygons]
+            geometries.append({"type": "MultiPolygon", "arcs": arcs_ref, "properties": properties})
+        out[name] = {"type": "GeometryCollection", "geometries": geometries}
+    return {
+        "type": "Topology",
+        "transform": {"scale": (step / GRID).tolist(), "translate": (lo / GRID).tolist()},
+        "arcs": arcs,
+        "objects": out,
+    }
+
+
+def district_topojson(assignment, properties=None, shapefile="merged_vtds.shp", tolerance=DEFAULT_TOLERANCE,
+                      quantization=DEFAULT_QUANTIZATION):
+    """TopoJSON with one "districts" object; properties: district -> dict of feature properties."""
+    topo = load_topology(shapefile, tolerance)
+    shapes = district_shapes(topo, assignment)
+    properties = properties or {}
+    features = [(shapes[d], {"district": d, **properties.get(d, {})}) for d in sorted(shapes)]
+    return to_topojson(topo, {"districts": features}, quantization)
+
+
+def vtd_topojson(properties=None, shapefile="merged_vtds.shp", tolerance=DEFAULT_TOLERANCE,
+                 quantization=DEFAULT_QUANTIZATION):
+    """TopoJSON with one "vtds" object; properties: GEOID20 -> dict of feature properties."""
+    topo = load_topology(shapefile, tolerance)
+    properties = properties or {}
+    features = [(polygons, {"GEOID20": geoid, **properties.get(geoid, {})})
+                for geoid, polygons in topo["shapes"].items()]
+    return to_topojson(topo, {"vtds": features}, quantization)
+
+
+def map_center(topojson):
+    """[lat, lon] at the middle of a TopoJSON's bounding box."""
+    scale, translate = topojson["transform"]["scale"], topojson["transform"]["translate"]
+    ends = [np.cumsum(np.array(arc), axis=0) for arc in topojson["arcs"]]
+    pts = np.concatenate(ends)
+    mid = (pts.min(axis=0) + pts.max(axis=0)) / 2
+    return [translate[1] + scale[1] * mid[1], translate[0] + scale[0] * mid[0]]
@@ -0,0 +1,313 @@
+import time
+import random
+import argparse
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from csr_graph import CSRGraph, GRAPH_DIR
+from instrumentation import NULL, telemetry
+from seed_plans import balance
+from tree_partition import tree_part_labels
+from extreme_gerrymander_contiguous import (
+    NUM_DISTRICTS, POP_COL, REP_COL, DEM_COL, population_bounds, vtd_lookups, choose_seeds, grow_districts, anneal,
+)
+
+# Multilevel planning, METIS-style, for graphs far larger than the VTD layer (census blocks).
+# The adjacency graph is coarsened repeatedly by heavy-edge matching: every node pairs with
+# the unmatched neighbor it shares the longest border with, and each pair becomes one node
+# carrying the summed population and votes. Matching runs as vectorized handshake rounds (a
+# pair forms when both ends pick each other). A cap on merged population keeps coarse nodes
+# small enough to balance districts with. One of the existing planners (tree partitioning,
+# greedy growth, or greedy growth plus annealing) runs on the coarsest graph. Its plan is
+# then projected back one level at a time and refined there with boundary flips: local
+# balancing for the tree planner, local balancing followed by a short low-temperature anneal
+# for the others. The greedy grower can leave districts in pieces, so its plan has every stray
+# piece handed to a neighboring district before it is balanced.
+# Every coarse node is a connected set of fine nodes with the same total population, so a
+# projected plan keeps the population and contiguity it had on the coarser level.
+
+PLANNERS = ("tree", "greedy", "anneal")
+
+
+class Level:
+    """One graph of the hierarchy: per-node columns, weighted undirected edges (u < v), and
+    `coarse`, the node each of its nodes maps to on the next coarser level."""
+
+    def __init__(self, u, v, weights, columns):
+        self.u = u
+        self.v = v
+        self.weights = weights
+        self.columns = columns
+        self.coarse = None
+        self._adjacency = None
+
+    @property
+    def num_nodes(self):
+        return len(self.columns[POP_COL])
+
+    @property
+    def adjacency(self):
+        if self._adjacency is None:
+            n = self.num_nodes
+            src = np.concatenate([self.u, self.v])
+            dst = np.concatenate([self.v, self.u])
+            order = np.argsort(src, kind="stable")
+            bounds = np.searchsorted(src[order], np.arange(n + 1)).tolist()
+            dst = dst[order].tolist()
+            self._adjacency = [dst[bounds[i]:bounds[i + 1]] for i in range(n)]
+            # The planners call graph.neighbors in their inner loops; skip the method call from now on
+            self.neighbors = self._adjacency.__getitem__
+        return self._adjacency
+
+    def neighbors(self, i):
+        return self.adjacency[i]
+
+    @classmethod
+    def from_csr(cls, csr):
+        u, v = csr.edge_pairs()
+        if "shared_perim" in csr.edge_columns:
+            # Same u < v selection as edge_pairs
+            src = np.repeat(np.arange(csr.num_nodes), np.diff(csr.indptr))
+            weights = np.asarray(csr.edge_columns["shared_perim"], dtype=float)[src < csr.indices]
+        else:
+            weights = np.ones(len(u))
+        columns = {name: np.asarray(csr.columns[name], dtype=float) for name in (POP_COL, REP_COL, DEM_COL)}
+        return cls(u, v, weights, columns)
+
+    def table(self):
+        """The level as the planners' VTD table, with node ids in place of GEOID20s."""
+        return pd.DataFrame({"GEOID20": np.arange(self.num_nodes), **self.columns})
+
+
+def heavy_edge_matching(level, max_pop, rng, rounds=8):
+    """Partner of every node (itself if unmatched), pairing along the heaviest edges."""
+    n = level.num_nodes
+    pops = level.columns[POP_COL]
+    src = np.concatenate([level.u, level.v])
+    dst = np.concatenate([level.v, level.u])
+    # Random tie-breaks, so equal borders (lattices, blocks on a grid) do not match in index order
+    key = np.tile(level.weights * (1 + 1e-6 * rng.random(len(level.u))), 2)
+    allowed = pops[src] + pops[dst] <= max_pop
+    match = np.full(n, -1)
+    for _ in range(rounds):
+        free = match < 0
+        live = allowed & free[src] & free[dst]
+        if not live.any():
+            break
+        s, d, k = src[live], dst[live], key[live]
+        order = np.lexsort((-k, s))
+        s, d = s[order], d[order]
+        first = np.r_[True, s[1:] != s[:-1]]
+        choice = np.full(n, -1)
+        choice[s[first]] = d[first]
+        picked = np.flatnonzero(choice >= 0)
+        mutual = picked[choice[choice[picked]] == picked]
+        match[mutual] = choice[mutual]
+    unmatched = match < 0
+    match[unmatched] = np.flatnonzero(unmatched)
+    return match
+
+
+def coarsen(level, max_pop, rng):
+    """The next coarser Level; sets `level.coarse`."""
+    match = heavy_edge_matching(level, max_pop, rng)
+    _, coarse = np.unique(np.minimum(np.arange(level.num_nodes), match), return_inverse=True)
+    m = int(coarse.max()) + 1
+    level.coarse = coarse
+    columns = {name: np.bincount(coarse, weights=col, minlength=m) for name, col in level.columns.items()}
+    cu, cv = coarse[level.u], coarse[level.v]
+    keep = cu != cv
+    a, b = np.minimum(cu, cv)[keep], np.maximum(cu, cv)[keep]
+    # Parallel edges between the same pair of coarse nodes merge, summing their borders
+    keys, inverse = np.unique(a.astype(np.int64) * m + b, return_inverse=True)
+    weights = np.bincount(inverse, weights=level.weights[keep])
+    return Level(keys // m, keys % m, weights, columns)
+
+
+def hierarchy(finest, pop_target, max_share=0.05, min_nodes=1000, min_shrink=0.9, rng=None, verbose=True):
+    """Levels from finest to coarsest. Coarsening stops at `min_nodes` nodes, or when a round
+    removes under 1 - `min_shrink` of them; no coarse node exceeds `max_share` of `pop_target`."""
+    rng = np.random.default_rng() if rng is None else rng
+    levels = [finest]
+    while levels[-1].num_nodes > min_nodes:
+        coarse = coarsen(levels[-1], max_share * pop_target, rng)
+        if coarse.num_nodes > min_shrink * levels[-1].num_nodes:
+            levels[-1].coarse = None
+            break
+        levels.append(coarse)
+        if verbose:
+            print(f"Level {len(levels) - 1}: {coarse.num_nodes} nodes, {len(coarse.u)} edges")
+    return levels
+
+
+def check_plan(level, labels, num_districts, pop_target):
+    """(max population deviation, whether every district is one connected piece)."""
+    part_pops = np.bincount(labels, weights=level.columns[POP_COL], minlength=num_districts)
+    same = labels[level.u] == labels[level.v]
+    n = level.num_nodes
+    inside = coo_matrix((np.ones(same.sum()), (level.u[same], level.v[same])), shape=(n, n))
+    pieces = connected_components(inside, directed=False)[0]
+    return float(np.abs(part_pops / pop_target - 1).max()), bool(pieces == len(np.unique(labels)))
+
+
+def repair_contiguity(level, labels):
+    """Give every piece of a district but its most populous one to a neighboring district.
+
+    Works in place on `labels`; a stray piece joins the least populated district whose main
+    piece it touches, so main pieces only grow. Returns the number of pieces moved.
+    """
+    pops = level.columns[POP_COL]
+    n = level.num_nodes
+    moved = 0
+    while True:
+        same = labels[level.u] == labels[level.v]
+        inside = coo_matrix((np.ones(same.sum()), (level.u[same], level.v[same])), shape=(n, n))
+        count, piece = connected_components(inside, directed=False)
+        if count == len(np.unique(labels)):
+            return moved
+        piece_pops = np.bincount(piece, weights=pops, minlength=count)
+        piece_label = np.empty(count, dtype=labels.dtype)
+        piece_label[piece] = labels
+        order = np.lexsort((-piece_pops, piece_label))
+        main = np.zeros(count, dtype=bool)
+        main[order[np.r_[True, piece_label[order][1:] != piece_label[order][:-1]]]] = True
+        a = np.concatenate([piece[level.u], piece[level.v]])
+        b = np.concatenate([piece[level.v], piece[level.u]])
+        live = ~main[a] & main[b]
+        district_pops = np.bincount(labels, weights=pops)
+        a, b = a[live], b[live]
+        order = np.lexsort((district_pops[piece_label[b]], a))
+        a, b = a[order], b[order]
+        first = np.r_[True, a[1:] != a[:-1]]
+        piece_label[a[first]] = piece_label[b[first]]
+        labels[:] = piece_label[piece]
+        moved += int(first.sum())
+
+
+def _anneal_level(level, labels, iterations, T, rng, pop_target, epsilon):
+    # Population bounds at `epsilon`, or wide enough for the plan as it is, so that every
+    # state the annealer walks through is at least as balanced as the one it starts from
+    part_pops = np.bincount(labels, weights=level.columns[POP_COL])
+    tolerance = max(epsilon, float(np.abs(part_pops / pop_target - 1).max()))
+    min_pop, max_pop = pop_target * (1 - tolerance), pop_target * (1 + tolerance)
+    table = level.table()
+    assignment = dict(enumerate(labels.tolist()))
+    result = anneal(level, assignment, vtd_lookups(table), min_pop, max_pop, max_iter=iterations, T=T, rng=rng,
+                    verbose=False)
+    return np.fromiter((result["best_assignment"][i] for i in range(level.num_nodes)), dtype=np.int64,
+                       count=level.num_nodes), result["best_seats"]
+
+
+def multilevel_plan(csr, planner="tree", num_districts=None, epsilon=0.01, coarse_epsilon=0.05, max_share=0.05,
+                    min_nodes=None, anneal_iter=2000, refine_iter=500, refine_T=0.05, rng=random, trace=NULL,
+                    verbose=True, require_valid=True):
+    """(GEOID20 -> district, per-level log) from a coarsen-plan-refine run on a CSRGraph.
+
+    "tree" draws a plan within `coarse_epsilon` on the coarsest graph (`epsilon` if there is
+    no finer level) and balances it toward `epsilon` on every level on the way back. "greedy"
+    and "anneal" are the GOP-seat planners of extreme_gerrymander_contiguous.py, which always
+    draw NUM_DISTRICTS districts; their plan is made contiguous and balanced the same way, and
+    each level then gets `refine_iter` annealing flips at temperature `refine_T` that keep it
+    so. The last log entry says whether the finest plan is "valid": within `epsilon` with
+    every district in one piece. An invalid plan raises RuntimeError unless `require_valid`
+    is False.
+    """
+    if planner not in PLANNERS:
+        raise ValueError(f"planner must be one of {PLANNERS}")
+    if planner != "tree" and num_districts not in (None, NUM_DISTRICTS):
+        raise ValueError(f"the {planner} planner draws {NUM_DISTRICTS} districts, not {num_districts}")
+    if num_districts is None:
+        num_districts = NUM_DISTRICTS
+    gen = np.random.default_rng(rng.getrandbits(64))
+    finest = Level.from_csr(csr)
+    pop_target = finest.columns[POP_COL].sum() / num_districts
+    with trace.phase("coarsen"):
+        levels = hierarchy(finest, pop_target, max_share, min_nodes or 40 * num_districts, rng=gen, verbose=verbose)
+    log = []
+
+    def record(depth, level, labels, seconds, **extra):
+        deviation, contiguous = check_plan(level, labels, num_districts, pop_target)
+        entry = {"level": depth, "nodes": level.num_nodes, "edges": len(level.u), "seconds": seconds,
+                 "max_deviation": deviation, "contiguous": contiguous, **extra}
+        log.append(entry)
+        trace.sample(**entry)
+        if verbose:
+            print(f"Level {depth} ({level.num_nodes} nodes): max deviation {deviation:.4f}, "
+                  f"contiguous {contiguous}, {seconds:.2f}s")
+
+    start = time.perf_counter()
+    coarsest = levels[-1]
+    # With nothing left to refine, the coarsest plan is the final one
+    plan_epsilon = coarse_epsilon if len(levels) > 1 else epsilon
+    with trace.phase("plan"):
+        if planner == "tree":
+            labels = tree_part_labels(coarsest.num_nodes, coarsest.u, coarsest.v, coarsest.columns[POP_COL],
+                                      num_districts, pop_target, plan_epsilon, gen)
+            extra = {}
+        else:
+            table = coarsest.table()
+            _, max_pop = population_bounds(table)
+            assignment = grow_districts(coarsest, choose_seeds(table), vtd_lookups(table), max_pop, verbose=False)
+            labels = np.array([assignment[i] for i in range(coarsest.num_nodes)])
+            repaired = repair_contiguity(coarsest, labels)
+            moves = balance(coarsest.adjacency, labels, coarsest.columns[POP_COL], num_districts, pop_target,
+                            plan_epsilon)
+            extra = {"repaired": repaired, "moves": moves}
+            if planner == "anneal":
+                labels, seats = _anneal_level(coarsest, labels, anneal_iter, 1.0, rng, pop_target, plan_epsilon)
+                extra["seats"] = seats
+    record(len(levels) - 1, coarsest, labels, time.perf_counter() - start, **extra)
+
+    with trace.phase("refine") as phase:
+        for depth in range(len(levels) - 2, -1, -1):
+            start = time.perf_counter()
+            level = levels[depth]
+            labels = labels[level.coarse]
+            moves = balance(level.adjacency, labels, level.columns[POP_COL], num_districts, pop_target, epsilon)
+            extra = {"moves": moves}
+            if planner != "tree":
+                labels, extra["seats"] = _anneal_level(level, labels, refine_iter, refine_T, rng, pop_target, epsilon)
+            record(depth, level, labels, time.perf_counter() - start, **extra)
+        phase.units = sum(level.num_nodes for level in levels[:-1])
+    # A relative slack, as the deviation is recomputed from the same sums in another order
+    balanced = bool(log[-1]["max_deviation"] <= epsilon * (1 + 1e-9))
+    log[-1]["valid"] = balanced and log[-1]["contiguous"]
+    if require_valid and not balanced:
+        raise RuntimeError(f"refined plan deviates {log[-1]['max_deviation']:.4f}, more than {epsilon}")
+    if require_valid and not log[-1]["contiguous"]:
+        raise RuntimeError("refined plan has a district in more than one piece")
+    return dict(zip(csr.geoids.tolist(), labels.tolist())), log
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Coarsen the VTD graph, plan on the coarsest level, refine back")
+    parser.add_argument("--planner", choices=PLANNERS, default="tree")
+    parser.add_argument("--districts", type=int, default=None,
+                        help=f"districts for the tree planner (default 28); the others always draw {NUM_DISTRICTS}")
+    parser.add_argument("--epsilon", type=float, default=0.01)
+    parser.add_argument("--coarse-epsilon", type=float, default=0.05)
+    parser.add_argument("--max-share", type=float, default=0.05, help="coarse node population cap, as a share of a district")
+    parser.add_argument("--min-nodes", type=int, default=None, help="stop coarsening at this many nodes")
+    parser.add_argument("--anneal-iter", type=int, default=2000)
+    parser.add_argument("--refine-iter", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--graph", default=GRAPH_DIR)
+    parser.add_argument("--output", default="multilevel_assignment.csv")
+    args = parser.parse_args()
+
+    trace = telemetry("multilevel")
+    random.seed(args.seed)
+    with trace.phase("load"):
+        csr = CSRGraph.load(args.graph)
+    start = time.perf_counter()
+    if args.districts is None and args.planner == "tree":
+        args.districts = 28
+    assignment, log = multilevel_plan(csr, args.planner, args.districts, args.epsilon, args.coarse_epsilon,
+                                      args.max_share, args.min_nodes, args.anneal_iter, args.refine_iter, trace=trace)
+    print(f"\n{len(log)} levels in {time.perf_counter() - start:.2f}s")
+    print(pd.DataFrame(log).set_index("level").to_string(float_format="%.4f"))
+    pd.DataFrame(list(assignment.items()), columns=["GEOID20", "district"]).to_csv(args.output, index=False)
+    print(f"Multilevel assignment saved to {args.output}")
+    trace.close()
@@ -0,0 +1,67 @@
+import math
+
+# Plan objectives computed from per-district vote tallies. Each objective is a function of
+# two mappings, district -> Democratic votes and district -> Republican votes, so scoring
+# costs O(#districts). Those mappings can be a gerrychain partition's "dem"/"rep" Tally
+# updaters or DistrictTally.dem / DistrictTally.rep in the annealer.
+
+
+def _votes(party, dem, rep, part):
+    return (dem[part], rep[part]) if party == "dem" else (rep[part], dem[part])
+
+
+def seats(party="dem"):
+    """Number of districts the party wins outright."""
+    def objective(dem, rep):
+        count = 0
+        for part in dem:
+            ours, theirs = _votes(party, dem, rep, part)
+            if ours > theirs:
+                count += 1
+        return count
+    return objective
+
+
+def margin_sum(party="dem"):
+    """Sum over districts of the party's two-party margin, (ours - theirs) / (ours + theirs)."""
+    def objective(dem, rep):
+        total = 0.0
+        for part in dem:
+            ours, theirs = _votes(party, dem, rep, part)
+            if ours + theirs:
+                total += (ours - theirs) / (ours + theirs)
+        return total
+    return objective
+
+
+def smoothed_seats(party="dem", scale=0.02):
+    """Expected seats with a logistic win probability in the two-party margin.
+
+    Unlike the seat count this moves with every flip, so a chain or annealer gets credit
+    for pushing a close district toward the line before it actually changes hands.
+    """
+    def objective(dem, rep):
+        total = 0.0
+        for part in dem:
+            ours, theirs = _votes(party, dem, rep, part)
+            if ours + theirs:
+                margin = (ours - theirs) / (ours + theirs)
+                total += 1.0 / (1.0 + math.exp(-margin / scale))
+        return total
+    return objective
+
+
+OBJECTIVES = {
+    "seats": seats,
+    "margin": margin_sum,
+    "smoothed": smoothed_seats,
+}
+
+
+def make_objective(name, party="dem", **kwargs):
+    return OBJECTIVES[name](party, **kwargs)
+
+
+def score(objective, partition):
+    """Score a gerrychain partition that registers "dem" and "rep" Tally updaters."""
+    return objective(partition["dem"], partition["rep"])
@@ -0,0 +1,158 @@
+import time
+import random
+import argparse
+import multiprocessing as mp
+import pandas as pd
+
+from csr_graph import load_adjacency, GRAPH_DIR
+from vtd_data import load_vtd_table
+from extreme_gerrymander_contiguous import (
+    VTD_COLUMNS, population_bounds, vtd_lookups, choose_seeds, grow_districts, anneal,
+)
+
+# Multi-start simulated annealing for the contiguous extreme planner. K workers each grow a
+# plan from a randomized seed set and anneal it with their own cooling rate. Work proceeds in
+# rounds; after every round, workers that trail the global best restart from it (best-of
+# restarts) with a reheated temperature. Only the plan and the RNG state travel between
+# rounds; each round rebuilds the annealer's tallies from the plan in the worker.
+
+SCHEDULES = [0.995, 0.999, 0.9995, 0.9999]  # cooling rate per worker, assigned round-robin
+
+GRAPH = None
+MERGED = None
+VTDS = None
+BOUNDS = None
+
+
+def load_inputs(graph_dir, shapefile):
+    global GRAPH, MERGED, VTDS, BOUNDS
+    GRAPH = load_adjacency(graph_dir)
+    MERGED = load_vtd_table(VTD_COLUMNS, shapefile)
+    VTDS = vtd_lookups(MERGED)
+    BOUNDS = population_bounds(MERGED)
+
+
+def init_worker(graph_dir, shapefile):
+    # Forked workers inherit the parent's inputs; spawned ones load their own
+    if GRAPH is None:
+        load_inputs(graph_dir, shapefile)
+
+
+def start_worker(state):
+    rng = random.Random(state["seed"])
+    min_pop, max_pop = BOUNDS
+    for attempt in range(20):
+        try:
+            assignment = grow_districts(GRAPH, choose_seeds(MERGED, rng), VTDS, max_pop, verbose=False)
+            break
+        except RuntimeError:
+            continue
+    else:
+        raise RuntimeError(f"worker {state['worker']}: greedy growth stalled for 20 seed sets")
+    state.update(assignment=assignment, best_assignment=assignment, rng=rng.getstate())
+    return state
+
+
+def run_round(state):
+    rng = random.Random()
+    rng.setstate(state["rng"])
+    min_pop, max_pop = BOUNDS
+    start = time.perf_counter()
+    result = anneal(GRAPH, state["assignment"], VTDS, min_pop, max_pop, max_iter=state["round_iters"],
+                    T=state["T"], alpha=state["alpha"], rng=rng, verbose=False)
+    state["elapsed"] += time.perf_counter() - start
+    # anneal stops early when no border is left, so count the iterations it ran
+    state["iterations"] += result["counts"]["proposed"]
+    state["accepted"] += result["accepted"]
+    state.update(assignment=result["assignment"], T=result["T"], rng=rng.getstate())
+    if result["best_seats"] > state["best_seats"]:
+        state.update(best_seats=result["best_seats"], best_assignment=result["best_assignment"])
+    return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-start parallel simulated annealing with best-of restarts")
+    parser.add_argument("--workers", type=int, default=mp.cpu_count())
+    parser.add_argument("--round-iters", type=int, default=5000, help="annealing iterations per worker per round")
+    parser.add_argument("--time-limit", type=float, default=600.0, help="wall-clock budget in seconds")
+    parser.add_argument("--patience", type=int, default=10, help="stop after this many rounds without improvement")
+    parser.add_argument("--max-rounds", type=int, default=1000)
+    parser.add_argument("--T-init", type=float, default=1.0)
+    parser.add_argument("--restart-T", type=float, default=0.5, help="temperature a restarted worker reheats to")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--graph", default=GRAPH_DIR)
+    parser.add_argument("--shapefile", default="merged_vtds.shp")
+    parser.add_argument("--output", default="district_assignment_contig_extreme.csv")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if "fork" in mp.get_all_start_methods():
+        ctx = mp.get_context("fork")
+        load_inputs(args.graph, args.shapefile)
+    else:
+        ctx = mp.get_context()
+
+    states = [{
+        "worker": w,
+        "seed": args.seed * 100003 + w,
+        "alpha": SCHEDULES[w % len(SCHEDULES)],
+        "T": args.T_init,
+        "round_iters": args.round_iters,
+        "best_seats": -1,
+        "iterations": 0,
+        "accepted": 0,
+        "restarts": 0,
+        "elapsed": 0.0,
+    } for w in range(args.workers)]
+
+    best = {"seats": -1, "worker": None, "round": None, "assignment": None}
+    stale_rounds = 0
+    rnd = -1
+    with ctx.Pool(args.workers, initializer=init_worker, initargs=(args.graph, args.shapefile)) as pool:
+        states = pool.map(start_worker, states)
+        for rnd in range(args.max_rounds):
+            states = pool.map(run_round, states)
+            leader = max(states, key=lambda st: st["best_seats"])
+            if leader["best_seats"] > best["seats"]:
+                best = {"seats": leader["best_seats"], "worker": leader["worker"], "round": rnd,
+                        "assignment": leader["best_assignment"]}
+                stale_rounds = 0
+                print(f"Round {rnd}: new best {best['seats']} GOP seats from worker {leader['worker']} "
+                      f"(alpha={leader['alpha']}, T={leader['T']:.4f})")
+            else:
+                stale_rounds += 1
+            elapsed = time.perf_counter() - start
+            if elapsed > args.time_limit or stale_rounds >= args.patience:
+                break
+            # Best-of restarts: trailing workers continue from the global best, reheated
+            for st in states:
+                if st["best_seats"] < best["seats"]:
+                    st.update(assignment=best["assignment"], best_assignment=best["assignment"],
+                              best_seats=best["seats"], T=max(st["T"], args.restart_T))
+                    st["restarts"] += 1
+    elapsed = time.perf_counter() - start
+    reason = "time limit" if elapsed > args.time_limit else ("no improvement" if stale_rounds >= args.patience else "max rounds")
+
+    summary = pd.DataFrame([{
+        "worker": st["worker"],
+        "seed": st["seed"],
+        "alpha": st["alpha"],
+        "best_seats": st["best_seats"],
+        "restarts": st["restarts"],
+        "accept_rate": st["accepted"] / max(st["iterations"], 1),
+        "iters_per_sec": st["iterations"] / max(st["elapsed"], 1e-9),
+        "final_T": st["T"],
+    } for st in states]).set_index("worker")
+    print("\nPer-worker statistics:")
+    print(summary.to_string(float_format="%.4f"))
+    print(f"\nStopped after {rnd + 1} rounds ({reason}, {elapsed:.1f}s)")
+    if best["assignment"] is None:
+        raise SystemExit("No annealing round ran; nothing to save")
+    winner = states[best["worker"]]
+    print(f"Best: {best['seats']} GOP seats from worker {best['worker']} "
+          f"(seed {winner['seed']}, alpha={winner['alpha']}) in round {best['round']}")
+
+    assign_df = pd.DataFrame(list(best["assignment"].items()), columns=["GEOID20", "district"])
+    assign_df["GEOID20"] = assign_df["GEOID20"].astype(str)
+    assign_df.to_csv(args.output, index=False)
+    print(f"Best assignment saved to {args.output}")
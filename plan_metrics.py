@@ -0,0 +1,139 @@
+import argparse
+import warnings
+import numpy as np
+import pandas as pd
+
+# Vectorized plan metrics for many plans at once. A batch of plans is a (plans x VTDs)
+# integer matrix of district labels 0..k-1 in a fixed VTD order; every per-district total
+# is one bincount over (plan, district) pairs, so scoring an ensemble is a few array passes.
+
+VTD_DATA_CSV = "fl_2020_vtd.csv"
+DEM_COL = "pre_20_dem_bid"
+REP_COL = "pre_20_rep_tru"
+VTD_COLUMNS = ["pop", "vap", "vap_black", "vap_hisp", "pop_white", "pop_black", "pop_hisp", DEM_COL, REP_COL]
+
+
+def load_vtd_arrays(geoids, csv_path=VTD_DATA_CSV):
+    """VTD attribute arrays aligned to `geoids`, plus integer county codes."""
+    vtd = pd.read_csv(csv_path, dtype={"GEOID20": str}).set_index("GEOID20").loc[list(geoids)]
+    arrays = {col: vtd[col].to_numpy(dtype=float) for col in VTD_COLUMNS}
+    arrays["county"] = pd.factorize(vtd["county"])[0]
+    return arrays
+
+
+def load_plans(paths, geoids=None):
+    """Stack assignment CSVs (GEOID20,district) into a plan matrix in one VTD order."""
+    frames = [pd.read_csv(p, dtype={"GEOID20": str}).set_index("GEOID20")["district"] for p in paths]
+    if geoids is None:
+        geoids = frames[0].index
+    plans = np.vstack([f.loc[geoids].to_numpy() for f in frames])
+    return plans, list(geoids)
+
+
+def district_sums(plans, values, k):
+    """(plans x k) per-district totals of a per-VTD array."""
+    plans = np.atleast_2d(plans)
+    num_plans = plans.shape[0]
+    flat = plans + (np.arange(num_plans) * k)[:, None]
+    weights = np.broadcast_to(values, plans.shape)
+    return np.bincount(flat.ravel(), weights=weights.ravel(), minlength=num_plans * k).reshape(num_plans, k)
+
+
+def partisan_metrics(dem, rep):
+    """Seat and vote metrics from per-district vote totals; the district axis is last.
+
+    Democrats win a district only with a strict majority and a tie goes to Republicans, as
+    in create_neutral_districts.py. The other scripts keep their own tie rules.
+    """
+    total = dem + rep
+    dem_share = dem / total
+    dem_wins = dem_share > 0.5
+    rep_wins = dem_share <= 0.5
+    # Winner's votes above half the district total are wasted; all of the loser's are
+    dem_wasted = np.where(dem_wins, dem - total / 2, dem)
+    rep_wasted = np.where(rep_wins, rep - total / 2, rep)
+    return {
+        "dem_seats": dem_wins.sum(axis=-1),
+        "rep_seats": rep_wins.sum(axis=-1),
+        "efficiency_gap": (rep_wasted.sum(axis=-1) - dem_wasted.sum(axis=-1)) / total.sum(axis=-1),
+        "mean_median": dem_share.mean(axis=-1) - np.median(dem_share, axis=-1),
+        "competitive": ((dem_share > 0.45) & (dem_share < 0.55)).sum(axis=-1),
+    }
+
+
+def county_splits(plans, county, k):
+    """Per plan: number of counties in more than one district and total extra pieces."""
+    plans = np.atleast_2d(plans)
+    num_plans = plans.shape[0]
+    num_counties = county.max() + 1
+    flat = (np.arange(num_plans)[:, None] * num_counties + county) * k + plans
+    present = np.bincount(flat.ravel(), minlength=num_plans * num_counties * k) > 0
+    pieces = present.reshape(num_plans, num_counties, k).sum(axis=2)
+    return (pieces > 1).sum(axis=1), (pieces - 1).clip(min=0).sum(axis=1)
+
+
+def homogeneity(plans, arrays, k, groups=("pop_white", "pop_black", "pop_hisp")):
+    """Mean within-district variance of racial/ethnic population shares (sample variance)."""
+    pop = arrays["pop"]
+    valid = pop > 0
+    n = district_sums(plans, valid.astype(float), k)
+    per_group = []
+    for group in groups:
+        share = np.where(valid, arrays[group] / np.where(valid, pop, 1), 0.0)
+        s1 = district_sums(plans, share, k)
+        s2 = district_sums(plans, share ** 2, k)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            per_group.append((s2 - s1 ** 2 / n) / (n - 1))
+    # Like pandas' var/mean, skip districts and groups with too few populated VTDs
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        district_var = np.nanmean(np.stack(per_group), axis=0)
+        return np.nanmean(district_var, axis=1)
+
+
+def plan_metrics(plans, arrays, k=None):
+    """Tidy table with one row per plan and one column per metric.
+
+    Districts are labelled 0..k-1 in every plan; a label with no VTDs shows up as NaN shares.
+    """
+    plans = np.atleast_2d(plans)
+    k = int(plans.max()) + 1 if k is None else k
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return _plan_metrics(plans, arrays, k)
+
+
+def _plan_metrics(plans, arrays, k):
+    pop = district_sums(plans, arrays["pop"], k)
+    ideal_pop = pop.sum(axis=1, keepdims=True) / k
+    deviation = np.abs(pop - ideal_pop) / ideal_pop
+    vap = district_sums(plans, arrays["vap"], k)
+    black_share = district_sums(plans, arrays["vap_black"], k) / vap
+    hisp_share = district_sums(plans, arrays["vap_hisp"], k) / vap
+    counties_split, county_pieces = county_splits(plans, arrays["county"], k)
+    metrics = {
+        "max_pop_deviation": deviation.max(axis=1),
+        "mean_pop_deviation": deviation.mean(axis=1),
+        "counties_split": counties_split,
+        "county_splits": county_pieces,
+        "minority_opportunity": ((black_share >= 0.5) | (hisp_share >= 0.5)).sum(axis=1),
+        "homogeneity": homogeneity(plans, arrays, k),
+    }
+    metrics.update(partisan_metrics(district_sums(plans, arrays[DEM_COL], k), district_sums(plans, arrays[REP_COL], k)))
+    table = pd.DataFrame(metrics)
+    table.index.name = "plan"
+    return table
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score assignment CSVs in one vectorized pass")
+    parser.add_argument("plans", nargs="+", help="assignment CSVs with GEOID20,district columns")
+    parser.add_argument("--districts", type=int, default=None)
+    parser.add_argument("--output", default=None, help="write the metrics table to this CSV")
+    args = parser.parse_args()
+
+    plans, geoids = load_plans(args.plans)
+    table = plan_metrics(plans, load_vtd_arrays(geoids), args.districts)
+    table.insert(0, "source", args.plans)
+    print(table.to_string(float_format="%.4f"))
+    if args.output:
+        table.to_csv(args.output)
@@ -1,18 +1,33 @@
 import geopandas as gpd
 import pandas as pd
 
-# Load VTD shapefile (Florida 2020 VTDs)
-vtds = gpd.read_file("newtest/tl_2020_12_vtd20.shp")
+SHAPEFILE = "newtest/tl_2020_12_vtd20.shp"
+ELECTION_CSV = "fl_2020_vtd.csv"
 
-# Load election data (precinct-level or VTD-level)
-election = pd.read_csv("fl_2020_vtd.csv")
 
-# Merge on a common key (assume 'GEOID20' in shapefile, 'GEOID20' in CSV)
-merged = vtds.merge(election, on="GEOID20")
+def merge_vtds(shapefile=SHAPEFILE, election_csv=ELECTION_CSV):
+    # Load VTD shapefile (Florida 2020 VTDs)
+    vtds = gpd.read_file(shapefile)
 
-# Print a summary to check
-print(merged.head())
-print(merged.columns)
+    # Load election data (precinct-level or VTD-level)
+    election = pd.read_csv(election_csv, dtype={"GEOID20": str})
 
-# Save merged GeoDataFrame for next steps
-merged.to_file("merged_vtds.shp")
+    # Merge on a common key (assume 'GEOID20' in shapefile, 'GEOID20' in CSV)
+    return vtds.merge(election, on="GEOID20")
+
+
+def shapefile_columns(merged):
+    # Column names as they come back from merged_vtds.shp (DBF field names are capped at
+    # 10 characters, which is why the planners use "pre_20_rep" for "pre_20_rep_tru")
+    return merged.rename(columns={c: c[:10] for c in merged.columns if c != "geometry"})
+
+
+if __name__ == "__main__":
+    merged = merge_vtds()
+
+    # Print a summary to check
+    print(merged.head())
+    print(merged.columns)
+
+    # Save merged GeoDataFrame for next steps
+    merged.to_file("merged_vtds.shp")
@@ -0,0 +1,180 @@
+import os
+import time
+import random
+import argparse
+import multiprocessing as mp
+from queue import Empty
+import networkx as nx
+import pandas as pd
+from gerrychain import (GeographicPartition, MarkovChain, proposals, constraints, accept)
+from gerrychain.updaters import Tally
+from gerrychain.tree import recursive_tree_part
+
+import objectives
+from csr_graph import load_graph, GRAPH_DIR
+from ensemble_store import EnsembleWriter, plan_vector
+
+# Independent ReCom chains across a process pool. Each chain draws its own seed plan and
+# streams progress and improved plans back to the parent, which keeps the global best.
+
+POP_COL = "population"
+
+GRAPH = None
+QUEUE = None
+
+
+def connected_graph(graph_dir):
+    graph = load_graph(graph_dir)
+    # Ensure graph is connected; use largest connected component if not
+    if not nx.is_connected(graph):
+        largest_cc = max(nx.connected_components(graph), key=len)
+        graph = graph.subgraph(largest_cc).copy()
+    return graph
+
+
+def init_worker(graph_dir, queue):
+    global GRAPH, QUEUE
+    QUEUE = queue
+    # Forked workers inherit the parent's graph copy-on-write. Spawned ones build a private
+    # networkx graph from the CSR arrays, since gerrychain needs one in every process.
+    if GRAPH is None:
+        GRAPH = connected_graph(graph_dir)
+
+
+def run_chain(job):
+    chain_id, seed, args = job
+    random.seed(seed)
+    graph = GRAPH
+    ideal_pop = sum(graph.nodes[n][POP_COL] for n in graph.nodes) / args.districts
+    assignment = recursive_tree_part(
+        graph,
+        parts=list(range(args.districts)),
+        pop_col=POP_COL,
+        pop_target=ideal_pop,
+        epsilon=args.epsilon,
+        node_repeats=1
+    )
+    partition = GeographicPartition(
+        graph,
+        assignment,
+        updaters={
+            "population": Tally(POP_COL, alias="population"),
+            "dem": Tally("dem", alias="dem"),
+            "rep": Tally("rep", alias="rep"),
+        },
+    )
+    pop_constraint = constraints.within_percent_of_ideal_population(partition, args.epsilon)
+    chain = MarkovChain(
+        proposal=lambda partition: proposals.recom(
+            partition,
+            pop_col=POP_COL,
+            pop_target=ideal_pop,
+            epsilon=args.epsilon
+        ),
+        constraints=[pop_constraint],
+        accept=accept.always_accept,
+        initial_state=partition,
+        total_steps=args.steps
+    )
+    objective = objectives.make_objective(args.objective, args.party)
+    dem_seats, rep_seats = objectives.seats("dem"), objectives.seats("rep")
+    store = None
+    if args.store:
+        # One store per chain, so consecutive plans delta-encode against each other
+        geoids = list(graph.nodes)
+        store = EnsembleWriter(os.path.join(args.store, f"chain{chain_id:03d}"), geoids,
+                               metrics=[args.objective, "dem_seats", "rep_seats"])
+    start = time.perf_counter()
+    best_score = -float("inf")
+    total_score = 0
+    try:
+        for step, part in enumerate(chain):
+            value = objectives.score(objective, part)
+            total_score += value
+            if store is not None:
+                store.append(plan_vector(part.assignment, geoids), **{
+                    args.objective: value,
+                    "dem_seats": objectives.score(dem_seats, part),
+                    "rep_seats": objectives.score(rep_seats, part),
+                })
+            if value > best_score:
+                best_score = value
+                QUEUE.put(("best", chain_id, step, value, dict(part.assignment)))
+            if step % args.report_every == 0:
+                QUEUE.put(("progress", chain_id, step, value, best_score))
+    finally:
+        # A chain that fails part way still leaves a readable store of the plans so far
+        if store is not None:
+            store.close()
+    elapsed = time.perf_counter() - start
+    steps = step + 1
+    QUEUE.put(("done", chain_id, {
+        "seed": seed,
+        "steps": steps,
+        "best_score": best_score,
+        "mean_score": total_score / steps,
+        "steps_per_sec": steps / elapsed,
+    }))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run independent ReCom chains in parallel")
+    parser.add_argument("--chains", type=int, default=mp.cpu_count())
+    parser.add_argument("--workers", type=int, default=mp.cpu_count())
+    parser.add_argument("--steps", type=int, default=1000, help="steps per chain")
+    parser.add_argument("--districts", type=int, default=27)
+    parser.add_argument("--epsilon", type=float, default=0.20)
+    parser.add_argument("--party", choices=["dem", "rep"], default="dem", help="party to optimize for")
+    parser.add_argument("--objective", choices=sorted(objectives.OBJECTIVES), default="seats")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report-every", type=int, default=100)
+    parser.add_argument("--graph", default=GRAPH_DIR)
+    parser.add_argument("--output", default="district_assignment.csv")
+    parser.add_argument("--store", default=None, help="record every plan under this directory (see ensemble_store.py)")
+    args = parser.parse_args()
+
+    if "fork" in mp.get_all_start_methods():
+        ctx = mp.get_context("fork")
+        GRAPH = connected_graph(args.graph)
+    else:
+        ctx = mp.get_context()
+    queue = ctx.Queue()
+    jobs = [(c, args.seed * 100003 + c, args) for c in range(args.chains)]
+
+    start = time.perf_counter()
+    best = (-float("inf"), None, None, None)  # score, chain, step, assignment
+    stats = {}
+    with ctx.Pool(args.workers, initializer=init_worker, initargs=(args.graph, queue)) as pool:
+        result = pool.map_async(run_chain, jobs)
+        while len(stats) < args.chains:
+            try:
+                msg = queue.get(timeout=1.0)
+            except Empty:
+                if result.ready():
+                    result.get()  # re-raise a worker's exception instead of waiting forever
+                continue
+            if msg[0] == "best":
+                _, chain_id, step, value, assignment = msg
+                if value > best[0]:
+                    best = (value, chain_id, step, assignment)
+                    print(f"New best {args.objective}: {value:g} (chain {chain_id}, step {step})")
+            elif msg[0] == "progress":
+                _, chain_id, step, value, chain_best = msg
+                print(f"Chain {chain_id} step {step}: {args.objective} {value:g} (chain best {chain_best:g})")
+            else:
+                _, chain_id, chain_stats = msg
+                stats[chain_id] = chain_stats
+        result.get()
+    elapsed = time.perf_counter() - start
+
+    summary = pd.DataFrame.from_dict(stats, orient="index").sort_index()
+    summary.index.name = "chain"
+    print("\nPer-chain statistics:")
+    print(summary.to_string(float_format="%.2f"))
+    total_steps = summary["steps"].sum()
+    print(f"\n{total_steps} steps in {elapsed:.1f}s ({total_steps / elapsed:.1f} steps/s across {args.workers} workers)")
+
+    value, chain_id, step, assignment = best
+    assign_df = pd.DataFrame(list(assignment.items()), columns=["GEOID20", "district"])
+    assign_df.to_csv(args.output, index=False)
+    print(f"Best plan: {args.objective} {value:g} for {args.party} (chain {chain_id}, step {step}), saved to {args.output}")
@@ -0,0 +1,93 @@
+import os
+import time
+import random
+import argparse
+import shutil
+import pandas as pd
+import geopandas as gpd
+from gerrychain.tree import recursive_tree_part
+
+from stage_cache import fingerprint, cached_stage
+from preprocess_vtd_data import merge_vtds, shapefile_columns, SHAPEFILE, ELECTION_CSV
+from build_vtd_graph import build_csr_graph
+from csr_graph import CSRGraph, GRAPH_DIR
+
+# preprocess -> graph -> plan, each stage skipped when its inputs and parameters are unchanged.
+# Stage outputs live in .stage_cache/<stage>-<key>/ as GeoParquet, CSR .npy files and CSV.
+
+parser = argparse.ArgumentParser(description="Run the preprocess/graph/plan pipeline with a content-hashed cache")
+parser.add_argument("--shapefile", default=SHAPEFILE)
+parser.add_argument("--election-csv", default=ELECTION_CSV)
+parser.add_argument("--districts", type=int, default=28)
+parser.add_argument("--epsilon", type=float, default=0.01)
+parser.add_argument("--seed", type=int, default=0)
+parser.add_argument("--output", default="neutral_district_assignment.csv")
+parser.add_argument("--force", nargs="*", default=[], choices=["preprocess", "graph", "plan"],
+                    help="rerun these stages even if cached")
+parser.add_argument("--export-graph", action="store_true", help=f"also copy the graph to {GRAPH_DIR}/")
+args = parser.parse_args()
+
+
+def report(stage, path, hit, start):
+    status = "cached" if hit else "built"
+    print(f"[{stage}] {status} in {time.perf_counter() - start:.2f}s -> {path}")
+
+
+# --- PREPROCESS: shapefile + election CSV -> GeoParquet ---
+start = time.perf_counter()
+merged_key = fingerprint("preprocess", inputs=[args.shapefile, args.election_csv])
+merged, merged_path, hit = cached_stage(
+    "preprocess", merged_key,
+    build=lambda: shapefile_columns(merge_vtds(args.shapefile, args.election_csv)),
+    save=lambda gdf, path: gdf.to_parquet(os.path.join(path, "merged.parquet")),
+    load=lambda path: gpd.read_parquet(os.path.join(path, "merged.parquet")),
+    force="preprocess" in args.force,
+)
+report("preprocess", merged_path, hit, start)
+
+# --- GRAPH: adjacency + node attributes -> CSR arrays ---
+start = time.perf_counter()
+graph_key = fingerprint("graph", upstream=[merged_key])
+csr, graph_path, hit = cached_stage(
+    "graph", graph_key,
+    build=lambda: build_csr_graph(merged),
+    save=lambda g, path: g.save(path),
+    load=CSRGraph.load,
+    force="graph" in args.force or "preprocess" in args.force,
+)
+report("graph", graph_path, hit, start)
+if args.export_graph:
+    shutil.rmtree(GRAPH_DIR, ignore_errors=True)
+    shutil.copytree(graph_path, GRAPH_DIR)
+
+# --- PLAN: recursive tree partition at the requested tolerance ---
+start = time.perf_counter()
+params = {"districts": args.districts, "epsilon": args.epsilon, "seed": args.seed}
+
+
+def build_plan():
+    graph = csr.to_gerrychain()
+    ideal_pop = sum(graph.nodes[n]["population"] for n in graph.nodes) / args.districts
+    random.seed(args.seed)
+    assignment = recursive_tree_part(
+        graph,
+        parts=list(range(args.districts)),
+        pop_col="population",
+        pop_target=ideal_pop,
+        epsilon=args.epsilon,
+        node_repeats=1
+    )
+    return pd.DataFrame({"GEOID20": list(assignment.keys()), "district": list(assignment.values())})
+
+
+plan_key = fingerprint("plan", params=params, upstream=[graph_key])
+plan, plan_path, hit = cached_stage(
+    "plan", plan_key,
+    build=build_plan,
+    save=lambda df, path: df.to_csv(os.path.join(path, "assignment.csv"), index=False),
+    load=lambda path: pd.read_csv(os.path.join(path, "assignment.csv"), dtype={"GEOID20": str}),
+    force=bool(args.force),
+)
+report("plan", plan_path, hit, start)
+plan.to_csv(args.output, index=False)
+print(f"District assignment saved to {args.output}")
@@ -0,0 +1,222 @@
+import time
+import argparse
+import multiprocessing as mp
+from multiprocessing import TimeoutError as PoolTimeout
+import numpy as np
+import pandas as pd
+
+from csr_graph import CSRGraph
+from contiguity import removal_keeps_contiguous
+from instrumentation import NULL, telemetry
+from tree_partition import MAX_ATTEMPTS, graph_arrays, tree_part_labels
+from county_partition import county_tree_part_labels
+
+# Bounded-cost seed plans. recursive_tree_part at a tight tolerance can draw trees for a long
+# time before a balanced cut shows up, and how long depends mostly on the seed. seed_plan
+# races independent attempts with different seeds across a process pool and keeps the first
+# valid plan. Each attempt has its own deadline, and the whole search has a budget.
+# An optional epsilon schedule draws the plan at a loose tolerance, where cuts are plentiful,
+# and then tightens it step by step with local balancing: contiguity-preserving boundary
+# flips from over- to under-populated districts. An attempt whose balancing gets stuck draws
+# again directly at the final tolerance. Every attempt is logged with its seed, outcome,
+# trees drawn (cuts tried), balancing moves, whether it fell back to a direct draw, and seconds.
+
+ARRAYS = None  # (u, v, pops, neighbor lists, county codes or None) of the graph, set in each worker
+
+
+def init_worker(u, v, pops, codes=None):
+    global ARRAYS
+    neighbors = [[] for _ in range(len(pops))]
+    for a, b in zip(u.tolist(), v.tolist()):
+        neighbors[a].append(b)
+        neighbors[b].append(a)
+    ARRAYS = (u, v, pops, neighbors, codes)
+
+
+def balance(neighbors, labels, pops, num_parts, pop_target, epsilon, max_moves=100000, deadline=None):
+    """Flip boundary nodes until every part is within `epsilon` of `pop_target`.
+
+    Works in place on `labels` and keeps every part contiguous and non-empty. Every move
+    lowers the sum of squared deviations from the target, so the search cannot cycle. Parts
+    outside the tolerance move first: over-full parts push boundary nodes out and short parts
+    pull neighbors in. When none of them can, any other part may move, which diffuses surplus
+    through neighbors that are already full. Returns the number of moves, or None if it got
+    stuck or ran out of moves or time.
+    """
+    lb_pop, ub_pop = pop_target * (1 - epsilon), pop_target * (1 + epsilon)
+    members = [set() for _ in range(num_parts)]
+    for node, d in enumerate(labels.tolist()):
+        members[d].add(node)
+    part_pops = np.bincount(labels, weights=pops, minlength=num_parts).tolist()
+    pops = pops.tolist()
+
+    def move(d):
+        candidates = set()
+        for x in members[d]:
+            for y in neighbors[x]:
+                e = labels[y]
+                if e != d:
+                    candidates.add((x, d, e) if part_pops[d] > pop_target else (y, e, d))
+        # Change in the sum of squared deviations when x moves from src to dst
+        scored = sorted((pops[x] * (part_pops[dst] + pops[x] - part_pops[src]), x, src, dst)
+                        for x, src, dst in candidates)
+        for change, x, src, dst in scored:
+            if change >= 0:
+                break
+            if len(members[src]) > 1 and removal_keeps_contiguous(neighbors.__getitem__, members[src], x):
+                members[src].discard(x)
+                members[dst].add(x)
+                labels[x] = dst
+                part_pops[src] -= pops[x]
+                part_pops[dst] += pops[x]
+                return True
+        return False
+
+    for moves in range(max_moves + 1):
+        by_deviation = sorted(range(num_parts), key=lambda d: -abs(part_pops[d] - pop_target))
+        outside = [d for d in by_deviation if not lb_pop <= part_pops[d] <= ub_pop]
+        if not outside:
+            return moves
+        if moves == max_moves or (deadline is not None and time.perf_counter() > deadline):
+            return None
+        if not any(move(d) for d in outside) and not any(move(d) for d in by_deviation if d not in outside):
+            return None
+
+
+def attempt(job):
+    """One seed-plan attempt in a worker: a dict for the log, with the labels if it succeeded."""
+    index, seed, num_parts, pop_target, schedule, timeout, max_attempts = job
+    u, v, pops, neighbors, codes = ARRAYS
+    start = time.perf_counter()
+    deadline = start + timeout if timeout else None
+    stats = {"trees": 0}
+    record = {"attempt": index, "seed": seed, "status": "ok", "epsilon": None, "trees": 0, "moves": 0,
+              "direct": False}
+    labels = None
+
+    def draw(epsilon):
+        if codes is None:
+            return tree_part_labels(len(pops), u, v, pops, num_parts, pop_target, epsilon, gen, max_attempts,
+                                    deadline, stats)
+        return county_tree_part_labels(len(pops), u, v, pops, codes, num_parts, pop_target, epsilon, gen,
+                                       max_attempts, deadline, stats)
+
+    try:
+        gen = np.random.default_rng(seed)
+        labels = draw(schedule[0])
+        record["epsilon"] = schedule[0]
+        for epsilon in schedule[1:]:
+            moves = balance(neighbors, labels, pops, num_parts, pop_target, epsilon, deadline=deadline)
+            if moves is None:
+                if deadline is not None and time.perf_counter() > deadline:
+                    record["status"] = "timeout"
+                    labels = None
+                    break
+                # Balancing got stuck; draw straight at the final tolerance before giving up
+                record["direct"] = True
+                labels = draw(schedule[-1])
+                record["epsilon"] = schedule[-1]
+                break
+            record["moves"] += moves
+            record["epsilon"] = epsilon
+    except TimeoutError:
+        record["status"] = "timeout"
+    except RuntimeError:
+        record["status"] = "no_cut"
+    record["trees"] = stats["trees"]
+    record["seconds"] = time.perf_counter() - start
+    record["labels"] = labels
+    return record
+
+
+def seed_plan(graph, num_districts, pop_col, epsilon, schedule=None, attempts=32, workers=1, timeout=60.0,
+              budget=None, seed=0, max_attempts=MAX_ATTEMPTS, counties=None, trace=NULL, verbose=True):
+    """(assignment, log) for the first attempt that balances every district within `epsilon`.
+
+    `schedule` is a list of tolerances, loosest first, ending at `epsilon`: the plan is drawn
+    at the first and balanced down through the rest. Each attempt gives up after `timeout`
+    seconds; the search gives up after `attempts` attempts or `budget` seconds and raises
+    RuntimeError. `log` holds one dict per finished attempt. Attempt i uses seed
+    `seed * 100003 + i`, so a run is reproducible for a given seed. With `counties`, an
+    array of county codes in graph node order, plans are drawn with county_tree_part_labels.
+    """
+    schedule = list(schedule) if schedule else [epsilon]
+    if schedule[-1] != epsilon or sorted(schedule, reverse=True) != schedule:
+        raise ValueError("schedule must be non-increasing and end at epsilon")
+    nodes, u, v, pops = graph_arrays(graph, pop_col)
+    pop_target = float(pops.sum()) / num_districts
+    jobs = [(i, seed * 100003 + i, num_districts, pop_target, schedule, timeout, max_attempts)
+            for i in range(attempts)]
+    start = time.perf_counter()
+    log = []
+    found = None
+
+    def record(result):
+        labels = result.pop("labels")
+        log.append(result)
+        trace.count("seed_attempts")
+        trace.count(f"seed_{result['status']}")
+        trace.count("seed_trees", result["trees"])
+        trace.sample(**result)
+        if verbose:
+            print(f"Attempt {result['attempt']} (seed {result['seed']}): {result['status']} at "
+                  f"epsilon {result['epsilon']}, {result['trees']} trees, {result['moves']} moves, "
+                  f"{result['seconds']:.2f}s")
+        return labels
+
+    if workers <= 1:
+        init_worker(u, v, pops, counties)
+        for job in jobs:
+            if budget is not None and time.perf_counter() - start > budget:
+                break
+            found = record(attempt(job))
+            if found is not None:
+                break
+    else:
+        ctx = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else mp.get_context()
+        # Leaving the block terminates the pool, which stops the attempts still running
+        with ctx.Pool(workers, initializer=init_worker, initargs=(u, v, pops, counties)) as pool:
+            results = pool.imap_unordered(attempt, jobs)
+            for _ in jobs:
+                remaining = None if budget is None else budget - (time.perf_counter() - start)
+                if remaining is not None and remaining <= 0:
+                    break
+                try:
+                    found = record(results.next(timeout=remaining))
+                except PoolTimeout:
+                    break
+                if found is not None:
+                    break
+    if found is None:
+        raise RuntimeError(f"no plan within {epsilon:g} after {len(log)} attempts "
+                           f"in {time.perf_counter() - start:.1f}s")
+    return {node: int(k) for node, k in zip(nodes, found.tolist())}, log
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Race seed-plan attempts for a tight population tolerance")
+    parser.add_argument("--districts", type=int, default=28)
+    parser.add_argument("--epsilon", type=float, default=0.01)
+    parser.add_argument("--schedule", type=float, nargs="+", default=None,
+                        help="tolerances from loosest to --epsilon, e.g. 0.05 0.02 0.01")
+    parser.add_argument("--attempts", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=mp.cpu_count())
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds per attempt")
+    parser.add_argument("--budget", type=float, default=None, help="seconds for the whole search")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="seed_plan.csv")
+    args = parser.parse_args()
+
+    trace = telemetry("seed_plans")
+    with trace.phase("load"):
+        csr = CSRGraph.load()
+    with trace.phase("search"):
+        assignment, log = seed_plan(csr, args.districts, "population", args.epsilon, args.schedule,
+                                    args.attempts, args.workers, args.timeout, args.budget, args.seed, trace=trace)
+    summary = pd.DataFrame(log).set_index("attempt").sort_index()
+    print("\nAttempts:")
+    print(summary.to_string(float_format="%.2f"))
+    print(f"\n{summary['trees'].sum()} trees drawn and {summary['seconds'].sum():.1f}s spent across attempts")
+    pd.DataFrame(list(assignment.items()), columns=["GEOID20", "district"]).to_csv(args.output, index=False)
+    print(f"Seed plan saved to {args.output}")
+    trace.close()
@@ -0,0 +1,69 @@
+import os
+import json
+import shutil
+import hashlib
+
+CACHE_DIR = ".stage_cache"
+SHAPEFILE_PARTS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+
+def input_files(path):
+    # A shapefile is several files on disk; all of them feed the parsed result
+    stem, ext = os.path.splitext(path)
+    if ext.lower() != ".shp":
+        return [path]
+    return [stem + part for part in SHAPEFILE_PARTS if os.path.exists(stem + part)]
+
+
+def file_digest(path, cache_dir=CACHE_DIR):
+    """sha256 of a file's contents, memoized on (size, mtime) so unchanged inputs are not rehashed."""
+    index_path = os.path.join(cache_dir, "digests.json")
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+    st = os.stat(path)
+    stamp = [st.st_size, st.st_mtime_ns]
+    entry = index.get(os.path.abspath(path))
+    if entry and entry["stamp"] == stamp:
+        return entry["sha256"]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    index[os.path.abspath(path)] = {"stamp": stamp, "sha256": h.hexdigest()}
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = index_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp, index_path)
+    return h.hexdigest()
+
+
+def fingerprint(stage, inputs=(), params=None, upstream=(), cache_dir=CACHE_DIR):
+    """Key for a stage run: its name, the contents of its input files, its parameters and
+    the keys of the stages it reads from."""
+    files = {}
+    for path in inputs:
+        for part in input_files(path):
+            # Keyed by the path relative to the working directory, so same-named files in
+            # different directories stay apart
+            files[os.path.relpath(part).replace(os.sep, "/")] = file_digest(part, cache_dir)
+    payload = {"stage": stage, "files": files, "params": params or {}, "upstream": list(upstream)}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def cached_stage(stage, key, build, save, load, cache_dir=CACHE_DIR, force=False):
+    """Return (result, path, hit). On a miss, `build()` runs and `save(result, dir)` writes its
+    output to a fresh directory that is only moved into place once complete."""
+    path = os.path.join(cache_dir, f"{stage}-{key[:16]}")
+    if not force and os.path.isdir(path):
+        return load(path), path, True
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    result = build()
+    save(result, tmp)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+    return result, path, False
@@ -1,9 +1,9 @@
 import pandas as pd
-import geopandas as gpd
+from vtd_data import load_vtd_table
 
-# Load merged VTDs and district assignment
-merged = gpd.read_file("merged_vtds.shp")
-districts = pd.read_csv("district_assignment.csv")
+# Load merged VTD attributes (no geometry needed) and district assignment
+merged = load_vtd_table(["GEOID20", "pre_20_rep", "pre_20_dem"])
+districts = pd.read_csv("district_assignment.csv", dtype={"GEOID20": str})
 
 # Merge assignment into GeoDataFrame
 merged = merged.merge(districts, on="GEOID20")
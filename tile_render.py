@@ -0,0 +1,338 @@
+import os
+import json
+import math
+import shutil
+import argparse
+import multiprocessing as mp
+import numpy as np
+import pandas as pd
+import shapely
+
+from map_render import load_topology, district_shapes, shape_geometry
+
+# Pre-rendered tiles for the VTD-level maps. Each layer is cut into Web Mercator z/x/y tiles
+# written under <out>/tiles/<layer>/<z>/<x>/<y>.js; every tile holds only the features that
+# touch it, clipped to the tile, simplified for its zoom (via map_render's cached topology)
+# and projected to integer tile coordinates, with only the attributes listed for that zoom.
+# Tiles are JSON wrapped in a function call, so viewer.html can load them with <script> tags
+# straight from disk (file://) or from any static server - no network access needed.
+
+TILE_SIZE = 256
+EXTENT = 4096       # integer coordinate range inside a tile
+BUFFER = 64         # clip margin in tile units, so strokes don't show seams at tile edges
+DEFAULT_ZOOMS = range(6, 13)
+
+TASK_DATA = None
+
+
+def tile_tolerance(z):
+    """Simplification tolerance in degrees: about half a screen pixel at zoom z."""
+    return 180.0 / (TILE_SIZE * 2 ** z)
+
+
+def lonlat_to_tile(lon, lat, z):
+    """Fractional tile coordinates of points (Web Mercator)."""
+    n = 2 ** z
+    lat = np.clip(np.radians(lat), -1.4844, 1.4844)
+    x = (np.asarray(lon) + 180.0) / 360.0 * n
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / math.pi) / 2.0 * n
+    return x, y
+
+
+def tile_bounds(z, x, y):
+    """(west, south, east, north) of a tile in degrees."""
+    n = 2 ** z
+
+    def lat(t):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * t / n))))
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def layer_features(topo, shapes, properties, fields_by_zoom, z):
+    """[(geometry, properties for zoom z)] for one layer at one zoom."""
+    thresholds = sorted(k for k in fields_by_zoom if k <= z)
+    fields = fields_by_zoom[thresholds[-1]] if thresholds else []
+    features = []
+    for key, polygons in shapes.items():
+        props = properties.get(key, {})
+        features.append((shape_geometry(topo, polygons), {f: props.get(f) for f in fields}))
+    return features
+
+
+def _encode(geom, z, x, y):
+    """Polygon rings of a clipped geometry in integer tile coordinates."""
+    polygons = []
+    for part in getattr(geom, "geoms", [geom]):
+        if part.geom_type != "Polygon" or part.is_empty:
+            continue
+        rings = []
+        for ring in [part.exterior, *part.interiors]:
+            coords = np.asarray(ring.coords)
+            tx, ty = lonlat_to_tile(coords[:, 0], coords[:, 1], z)
+            pts = np.rint(np.column_stack([(tx - x) * EXTENT, (ty - y) * EXTENT])).astype(np.int64)
+            keep = np.concatenate([[True], np.any(pts[1:] != pts[:-1], axis=1)])
+            pts = pts[keep]
+            if len(pts) >= 4:
+                rings.append(pts.tolist())
+        if rings:
+            polygons.append(rings)
+    return polygons
+
+
+def render_tile(task):
+    layer, z, x, y, members = task
+    features = TASK_DATA[(layer, z)]
+    west, south, east, north = tile_bounds(z, x, y)
+    pad_x = (east - west) * BUFFER / EXTENT
+    pad_y = (north - south) * BUFFER / EXTENT
+    out = []
+    for i in members:
+        geom, props = features[i]
+        clipped = shapely.clip_by_rect(geom, west - pad_x, south - pad_y, east + pad_x, north + pad_y)
+        polygons = _encode(clipped, z, x, y)
+        if polygons:
+            out.append({"polygons": polygons, "properties": props})
+    if not out:
+        return 0
+    path = os.path.join(TASK_DATA["out_dir"], "tiles", layer, str(z), str(x))
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, f"{y}.js"), "w") as f:
+        f.write(f"tileLoaded({json.dumps(f'{layer}/{z}/{x}/{y}')},{json.dumps(out, separators=(',', ':'))});\n")
+    return 1
+
+
+def init_worker(data):
+    global TASK_DATA
+    # Forked workers inherit the parent's features; spawned ones receive them here
+    if TASK_DATA is None:
+        TASK_DATA = data
+
+
+def render_tiles(out_dir, shapefile, layers, zooms=DEFAULT_ZOOMS, workers=None, title="VTD map"):
+    """Write tiles for every layer and zoom plus viewer.html; returns the tile count.
+
+    layers: list of dicts with
+      name            layer directory and toggle label
+      shapes          "vtds", or a GEOID20 -> district assignment to draw district outlines
+      properties      feature key -> dict of attributes (GEOID20 or district)
+      fields_by_zoom  {min zoom: [attribute names]}; a zoom gets the entry with the largest
+                      key not above it. "fill" colors the feature.
+      labels          attribute -> tooltip label
+      style           {"stroke": color, "weight": px, "opacity": fill opacity}
+    """
+    global TASK_DATA
+    shutil.rmtree(os.path.join(out_dir, "tiles"), ignore_errors=True)
+    data = {"out_dir": out_dir}
+    tasks = []
+    bounds = None
+    for z in zooms:
+        topo = load_topology(shapefile, tile_tolerance(z))
+        for layer in layers:
+            shapes = topo["shapes"] if layer["shapes"] == "vtds" else district_shapes(topo, layer["shapes"])
+            features = layer_features(topo, shapes, layer.get("properties", {}), layer["fields_by_zoom"], z)
+            data[(layer["name"], z)] = features
+            # Bucket features by the tiles their bounding boxes cover
+            boxes = shapely.bounds([geom for geom, _ in features])
+            if bounds is None:
+                bounds = [np.nanmin(boxes[:, 0]), np.nanmin(boxes[:, 1]), np.nanmax(boxes[:, 2]), np.nanmax(boxes[:, 3])]
+            x0, y1 = lonlat_to_tile(boxes[:, 0], boxes[:, 1], z)
+            x1, y0 = lonlat_to_tile(boxes[:, 2], boxes[:, 3], z)
+            buckets = {}
+            for i, (a, b, c, d) in enumerate(zip(x0, y0, x1, y1)):
+                if np.isnan(a):
+                    continue
+                for tx in range(int(a), int(c) + 1):
+                    for ty in range(int(b), int(d) + 1):
+                        buckets.setdefault((tx, ty), []).append(i)
+            tasks.extend((layer["name"], z, tx, ty, members) for (tx, ty), members in buckets.items())
+
+    if "fork" in mp.get_all_start_methods():
+        ctx = mp.get_context("fork")
+        TASK_DATA = data
+    else:
+        ctx = mp.get_context()
+    with ctx.Pool(workers or mp.cpu_count(), initializer=init_worker,
+                  initargs=(None if TASK_DATA is data else data,)) as pool:
+        written = sum(pool.imap_unordered(render_tile, tasks, chunksize=16))
+    TASK_DATA = None
+
+    write_viewer(out_dir, layers, zooms, bounds, title)
+    return written
+
+
+def write_viewer(out_dir, layers, zooms, bounds, title):
+    config = {
+        "title": title,
+        "minZoom": min(zooms),
+        "maxZoom": max(zooms),
+        "extent": EXTENT,
+        "bounds": [float(b) for b in bounds],
+        "layers": [{"name": layer["name"], "labels": layer.get("labels", {}),
+                    "style": layer.get("style", {})} for layer in layers],
+    }
+    with open(os.path.join(out_dir, "viewer.html"), "w") as f:
+        f.write(VIEWER_HTML.replace("__CONFIG__", json.dumps(config)).replace("__TITLE__", title))
+
+
+VIEWER_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>__TITLE__</title>
+<style>
+html, body { margin: 0; height: 100%; overflow: hidden; font: 13px sans-serif; }
+canvas { display: block; cursor: grab; }
+#panel { position: absolute; top: 8px; left: 8px; background: #fff; padding: 6px 8px; border: 1px solid #999; }
+#tip { position: absolute; pointer-events: none; background: #fff; border: 1px solid #666; padding: 4px 6px; display: none; }
+</style></head>
+<body><canvas id="map"></canvas><div id="panel"></div><div id="tip"></div>
+<script>
+var CONFIG = __CONFIG__;
+var canvas = document.getElementById("map"), ctx = canvas.getContext("2d");
+var tip = document.getElementById("tip"), panel = document.getElementById("panel");
+var tiles = {}, visible = {};
+var view = {zoom: CONFIG.minZoom, x: 0, y: 0};  // x, y: world pixels at view.zoom of the top-left corner
+
+function project(lon, lat, z) {
+  var n = 256 * Math.pow(2, z), r = lat * Math.PI / 180;
+  return [(lon + 180) / 360 * n, (1 - Math.log(Math.tan(r) + 1 / Math.cos(r)) / Math.PI) / 2 * n];
+}
+function tileLoaded(key, features) {
+  var scale = 256 / CONFIG.extent;
+  features.forEach(function (f) {
+    f.path = new Path2D();
+    f.polygons.forEach(function (poly) {
+      poly.forEach(function (ring) {
+        ring.forEach(function (p, i) { f.path[i ? "lineTo" : "moveTo"](p[0] * scale, p[1] * scale); });
+        f.path.closePath();
+      });
+    });
+  });
+  tiles[key] = features;
+  draw();
+}
+function request(key) {
+  if (key in tiles) return;
+  tiles[key] = null;
+  var s = document.createElement("script");
+  s.src = "tiles/" + key + ".js";
+  s.onerror = function () { tiles[key] = []; };  // no file: nothing in this tile
+  document.body.appendChild(s);
+}
+function eachTile(fn) {
+  var z = Math.min(view.zoom, CONFIG.maxZoom), k = Math.pow(2, view.zoom - z), size = 256 * k;
+  var x0 = Math.floor(view.x / size), y0 = Math.floor(view.y / size);
+  var x1 = Math.floor((view.x + canvas.width) / size), y1 = Math.floor((view.y + canvas.height) / size);
+  CONFIG.layers.forEach(function (layer) {
+    if (!visible[layer.name]) return;
+    for (var x = x0; x <= x1; x++) for (var y = y0; y <= y1; y++)
+      fn(layer, layer.name + "/" + z + "/" + x + "/" + y, x * size - view.x, y * size - view.y, k);
+  });
+}
+function draw() {
+  canvas.width = window.innerWidth; canvas.height = window.innerHeight;
+  ctx.fillStyle = "#f4f4f2"; ctx.fillRect(0, 0, canvas.width, canvas.height);
+  eachTile(function (layer, key, ox, oy, k) {
+    request(key);
+    var features = tiles[key];
+    if (!features) return;
+    var style = layer.style;
+    ctx.save(); ctx.translate(ox, oy); ctx.scale(k, k);
+    ctx.lineWidth = (style.weight || 0.5) / k; ctx.strokeStyle = style.stroke || "#333";
+    ctx.beginPath(); ctx.rect(0, 0, 256, 256); ctx.clip();
+    features.forEach(function (f) {
+      if (f.properties.fill) {
+        ctx.globalAlpha = style.opacity === undefined ? 0.6 : style.opacity;
+        ctx.fillStyle = f.properties.fill; ctx.fill(f.path, "evenodd");
+      }
+      ctx.globalAlpha = 1; ctx.stroke(f.path);
+    });
+    ctx.restore();
+  });
+}
+function hover(ev) {
+  var lines = [];
+  eachTile(function (layer, key, ox, oy, k) {
+    var features = tiles[key], px = (ev.clientX - ox) / k, py = (ev.clientY - oy) / k;
+    if (!features || px < 0 || py < 0 || px >= 256 || py >= 256) return;
+    features.forEach(function (f) {
+      if (!ctx.isPointInPath(f.path, px, py, "evenodd")) return;
+      Object.keys(layer.labels).forEach(function (name) {
+        if (f.properties[name] !== undefined && f.properties[name] !== null)
+          lines.push(layer.labels[name] + " " + f.properties[name].toLocaleString());
+      });
+    });
+  });
+  tip.style.display = lines.length ? "block" : "none";
+  tip.style.left = (ev.clientX + 12) + "px"; tip.style.top = (ev.clientY + 12) + "px";
+  tip.innerHTML = lines.join("<br>");
+}
+function zoomAt(cx, cy, dz) {
+  var z = Math.max(CONFIG.minZoom, Math.min(CONFIG.maxZoom + 3, view.zoom + dz));
+  var f = Math.pow(2, z - view.zoom);
+  view.x = (view.x + cx) * f - cx; view.y = (view.y + cy) * f - cy; view.zoom = z;
+  draw();
+}
+var drag = null;
+canvas.onmousedown = function (ev) { drag = [ev.clientX, ev.clientY]; };
+window.onmouseup = function () { drag = null; };
+canvas.onmousemove = function (ev) {
+  if (drag) { view.x -= ev.clientX - drag[0]; view.y -= ev.clientY - drag[1]; drag = [ev.clientX, ev.clientY]; draw(); }
+  else hover(ev);
+};
+canvas.onwheel = function (ev) { ev.preventDefault(); zoomAt(ev.clientX, ev.clientY, ev.deltaY < 0 ? 1 : -1); };
+canvas.ondblclick = function (ev) { zoomAt(ev.clientX, ev.clientY, 1); };
+window.onresize = draw;
+CONFIG.layers.forEach(function (layer, i) {
+  visible[layer.name] = true;
+  var label = document.createElement("label"), box = document.createElement("input");
+  box.type = "checkbox"; box.checked = true;
+  box.onchange = function () { visible[layer.name] = box.checked; draw(); };
+  label.appendChild(box); label.appendChild(document.createTextNode(" " + layer.name));
+  panel.appendChild(label); panel.appendChild(document.createElement("br"));
+});
+(function fit() {
+  var b = CONFIG.bounds, w = window.innerWidth, h = window.innerHeight;
+  for (var z = CONFIG.maxZoom; z > CONFIG.minZoom; z--) {
+    var sw = project(b[0], b[1], z), ne = project(b[2], b[3], z);
+    if (ne[0] - sw[0] <= w && sw[1] - ne[1] <= h) break;
+  }
+  var sw = project(b[0], b[1], z), ne = project(b[2], b[3], z);
+  view = {zoom: z, x: (sw[0] + ne[0] - w) / 2, y: (sw[1] + ne[1] - h) / 2};
+  draw();
+})();
+</script></body></html>
+"""
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-render VTD and district layers to local map tiles")
+    parser.add_argument("output", help="directory for tiles/ and viewer.html")
+    parser.add_argument("--shapefile", default="merged_vtds.shp")
+    parser.add_argument("--vtd-csv", default="fl_2020_vtd.csv")
+    parser.add_argument("--assignment", default=None, help="GEOID20,district CSV to add a district layer")
+    parser.add_argument("--min-zoom", type=int, default=min(DEFAULT_ZOOMS))
+    parser.add_argument("--max-zoom", type=int, default=max(DEFAULT_ZOOMS))
+    parser.add_argument("--workers", type=int, default=mp.cpu_count())
+    args = parser.parse_args()
+
+    vtd = pd.read_csv(args.vtd_csv, dtype={"GEOID20": str}).set_index("GEOID20")
+    layers = [{
+        "name": "vtds",
+        "shapes": "vtds",
+        "properties": vtd[["pop", "county", "pre_20_rep_tru", "pre_20_dem_bid"]].to_dict("index"),
+        "fields_by_zoom": {0: [], 10: ["pop", "county", "pre_20_rep_tru", "pre_20_dem_bid"]},
+        "labels": {"pop": "Population:", "county": "County:", "pre_20_rep_tru": "Trump 2020:",
+                   "pre_20_dem_bid": "Biden 2020:"},
+        "style": {"stroke": "#555", "weight": 0.3},
+    }]
+    if args.assignment:
+        plan = pd.read_csv(args.assignment, dtype={"GEOID20": str})
+        layers.append({
+            "name": "districts",
+            "shapes": dict(zip(plan["GEOID20"], plan["district"].astype(int))),
+            "properties": {int(d): {"district": int(d)} for d in plan["district"].unique()},
+            "fields_by_zoom": {0: ["district"]},
+            "labels": {"district": "District"},
+            "style": {"stroke": "#000", "weight": 1.5},
+        })
+    os.makedirs(args.output, exist_ok=True)
+    count = render_tiles(args.output, args.shapefile, layers, range(args.min_zoom, args.max_zoom + 1), args.workers)
+    print(f"{count} tiles written; open {os.path.join(args.output, 'viewer.html')}")
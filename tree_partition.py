@@ -0,0 +1,174 @@
+import time
+import random
+import argparse
+import numpy as np
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import minimum_spanning_tree, breadth_first_order, shortest_path
+
+from csr_graph import CSRGraph
+
+# Spanning-tree partitioning on arrays, as a drop-in for gerrychain.tree.recursive_tree_part.
+# A random spanning tree is the minimum spanning tree under uniform random edge weights
+# (scipy, in C). Rooting it with a BFS and sweeping the levels from the deepest up gives every
+# subtree's population in one pass, so all balanced edge cuts of a tree are found with a
+# couple of vectorized comparisons; a tree without one is simply redrawn. Districts are cut
+# off one at a time exactly as gerrychain does, carrying the population "debt" forward so the
+# last two districts can still be balanced.
+
+MAX_ATTEMPTS = 10000  # trees drawn per district before giving up, as in gerrychain
+
+
+def graph_arrays(graph, pop_col):
+    """(node ids, u, v, populations) of a CSRGraph or a networkx/gerrychain graph."""
+    if isinstance(graph, CSRGraph):
+        u, v = graph.edge_pairs()
+        return graph.geoids.tolist(), u, v, np.asarray(graph.columns[pop_col], dtype=float)
+    nodes = list(graph.nodes)
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(index[a], index[b]) for a, b in graph.edges], dtype=np.int64).reshape(-1, 2)
+    pops = np.array([graph.nodes[node][pop_col] for node in nodes], dtype=float)
+    return nodes, edges[:, 0], edges[:, 1], pops
+
+
+class SpanningTree:
+    """A random spanning tree of an n-node graph, rooted at `root` or a random node.
+
+    `order` lists the nodes parents-first and `levels` splits it by depth, so per-level
+    vectorized updates replace a recursive walk in both directions.
+    """
+
+    def __init__(self, n, u, v, rng, root=None):
+        weights = rng.random(len(u)) + 1.0  # scipy treats zero weights as missing edges
+        tree = minimum_spanning_tree(coo_matrix((weights, (u, v)), shape=(n, n)).tocsr())
+        root = int(rng.integers(n)) if root is None else root
+        self.order, self.parent = breadth_first_order(tree, root, directed=False, return_predecessors=True)
+        if len(self.order) < n:
+            raise ValueError("graph is not connected")
+        depth = shortest_path(tree, directed=False, unweighted=True, indices=root)[self.order]
+        bounds = np.flatnonzero(np.diff(depth)) + 1
+        self.levels = np.split(self.order, bounds)
+
+    def subtree_populations(self, pops):
+        """Population below (and including) every node."""
+        totals = np.asarray(pops, dtype=float).copy()
+        for level in reversed(self.levels[1:]):
+            np.add.at(totals, self.parent[level], totals[level])
+        return totals
+
+    def subtree(self, node):
+        """Boolean mask of `node` and its descendants."""
+        inside = np.zeros(len(self.parent), dtype=bool)
+        inside[node] = True
+        for level in self.levels[1:]:
+            inside[level] |= inside[self.parent[level]]
+        return inside
+
+
+def bipartition(n, u, v, pops, min_pop, max_pop, one_sided=True, rng=None, max_attempts=MAX_ATTEMPTS,
+                deadline=None, stats=None):
+    """Boolean mask of one side of a balanced tree cut.
+
+    With `one_sided` only the returned side must have population in [min_pop, max_pop];
+    otherwise both sides must. Past `deadline` (a time.perf_counter() value) the search
+    raises TimeoutError; `stats["trees"]` counts the trees drawn.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    total = float(np.sum(pops))
+    for _ in range(max_attempts):
+        if deadline is not None and time.perf_counter() > deadline:
+            raise TimeoutError("no balanced cut found before the deadline")
+        if stats is not None:
+            stats["trees"] = stats.get("trees", 0) + 1
+        tree = SpanningTree(n, u, v, rng)
+        below = tree.subtree_populations(pops)
+        candidates = tree.order[1:]
+        side = below[candidates]
+        inside = (side >= min_pop) & (side <= max_pop)
+        outside = (total - side >= min_pop) & (total - side <= max_pop)
+        ok = (inside | outside) if one_sided else (inside & outside)
+        choices = np.flatnonzero(ok)
+        if len(choices):
+            k = choices[rng.integers(len(choices))]
+            mask = tree.subtree(candidates[k])
+            return mask if inside[k] else ~mask
+    raise RuntimeError(f"Could not find a possible cut after {max_attempts} attempts.")
+
+
+def _induced(alive, u, v):
+    # Local ids for the alive nodes and the edges among them
+    local = np.cumsum(alive) - 1
+    keep = alive[u] & alive[v]
+    return np.flatnonzero(alive), local[u[keep]], local[v[keep]]
+
+
+def tree_part_labels(n, u, v, pops, num_parts, pop_target, epsilon, rng, max_attempts=MAX_ATTEMPTS,
+                     deadline=None, stats=None):
+    """Part index 0..num_parts-1 for every node, each part within `epsilon` of `pop_target`."""
+    if num_parts == 1:
+        # Nothing to cut; the loop below assumes at least one cut
+        return np.zeros(n, dtype=int)
+    labels = np.full(n, num_parts - 1)
+    alive = np.ones(n, dtype=bool)
+    lb_pop, ub_pop = pop_target * (1 - epsilon), pop_target * (1 + epsilon)
+    debt = 0.0
+
+    def cut(k, min_pop, max_pop, one_sided):
+        ids, su, sv = _induced(alive, u, v)
+        side = ids[bipartition(len(ids), su, sv, pops[ids], min_pop, max_pop, one_sided, rng, max_attempts,
+                               deadline, stats)]
+        part_pop = pops[side].sum()
+        if not lb_pop <= part_pop <= ub_pop:
+            raise RuntimeError(f"part {k} has population {part_pop:.0f}, outside the tolerance")
+        labels[side] = k
+        alive[side] = False
+        return part_pop
+
+    for k in range(num_parts - 2):
+        # Tighten the window by the running deviation so the last districts stay feasible
+        min_pop = max(lb_pop, lb_pop - debt)
+        max_pop = min(ub_pop, ub_pop - debt)
+        debt += cut(k, min_pop, max_pop, one_sided=True) - pop_target
+    # The last two districts are both checked: split what is left evenly enough for both
+    cut(num_parts - 2, lb_pop, ub_pop, one_sided=False)
+    return labels
+
+
+def recursive_tree_part(graph, parts, pop_target, pop_col, epsilon, node_repeats=1, rng=random,
+                        max_attempts=MAX_ATTEMPTS):
+    """Same contract as gerrychain.tree.recursive_tree_part: node -> part, every part within
+    `epsilon` of `pop_target`. `graph` may be a CSRGraph or a networkx/gerrychain graph.
+
+    Randomness is drawn from `rng` (the `random` module by default), so random.seed() makes
+    runs reproducible as with gerrychain. Every attempt draws a fresh tree and root, which
+    covers what gerrychain's `node_repeats` does; the argument is accepted for compatibility.
+    """
+    nodes, u, v, pops = graph_arrays(graph, pop_col)
+    gen = np.random.default_rng(rng.getrandbits(64))
+    labels = tree_part_labels(len(nodes), u, v, pops, len(parts), pop_target, epsilon, gen, max_attempts)
+    return {node: parts[k] for node, k in zip(nodes, labels.tolist())}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time array-native recursive tree partitioning against gerrychain's")
+    parser.add_argument("--districts", type=int, default=28)
+    parser.add_argument("--epsilon", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--gerrychain", action="store_true", help="also time gerrychain's recursive_tree_part")
+    args = parser.parse_args()
+
+    csr = CSRGraph.load()
+    ideal_pop = np.sum(csr.columns["population"]) / args.districts
+    random.seed(args.seed)
+    start = time.perf_counter()
+    assignment = recursive_tree_part(csr, list(range(args.districts)), ideal_pop, "population", args.epsilon)
+    print(f"tree_partition: {time.perf_counter() - start:.2f}s")
+    labels = np.array([assignment[g] for g in csr.geoids.tolist()])
+    deviation = np.abs(np.bincount(labels, weights=csr.columns["population"]) / ideal_pop - 1)
+    print(f"max population deviation {deviation.max():.4f}")
+    if args.gerrychain:
+        from gerrychain.tree import recursive_tree_part as gerrychain_tree_part
+        graph = csr.to_gerrychain()
+        random.seed(args.seed)
+        start = time.perf_counter()
+        gerrychain_tree_part(graph, list(range(args.districts)), ideal_pop, "population", args.epsilon)
+        print(f"gerrychain: {time.perf_counter() - start:.2f}s")
@@ -1,10 +1,20 @@
+import argparse
 import geopandas as gpd
 import pandas as pd
 import folium
 import numpy as np
 
+SHAPEFILE = 'newtest/tl_2020_12_vtd20.shp'
+TOOLTIP_FIELDS = ['GEOID20', 'pop', 'county', 'pre_20_rep_tru', 'pre_20_dem_bid']
+TOOLTIP_ALIASES = ['VTD GEOID:', 'Population:', 'County:', 'Trump 2020:', 'Biden 2020:']
+
+parser = argparse.ArgumentParser(description='Map of VTDs colored by county-level 2020 presidential lean')
+parser.add_argument('--tiles', metavar='DIR', help='pre-render local map tiles and a viewer to DIR instead of one HTML page')
+parser.add_argument('--workers', type=int, default=None)
+args = parser.parse_args()
+
 # Load the joined VTD shapefile and CSV
-gdf = gpd.read_file('newtest/tl_2020_12_vtd20.shp')
+gdf = gpd.read_file(SHAPEFILE)
 vtd = pd.read_csv('fl_2020_vtd.csv', dtype={'GEOID20': str})
 merged = gdf.merge(vtd, on='GEOID20', how='left')
 
@@ -33,6 +43,23 @@ county_votes['color'] = county_votes['lean'].apply(lean_to_color)
 county_color_map = dict(zip(county_votes['county'], county_votes['color']))
 merged['county_color'] = merged['county'].map(county_color_map)
 
+if args.tiles:
+    # Tiled mode: county colors at every zoom, tooltip attributes from zoom 10
+    from tile_render import render_tiles
+    props = merged.drop(columns='geometry').set_index('GEOID20')[TOOLTIP_FIELDS[1:] + ['county_color']]
+    props = props.rename(columns={'county_color': 'fill'})
+    layer = {
+        'name': 'counties',
+        'shapes': 'vtds',
+        'properties': props.where(props.notnull(), None).to_dict('index'),
+        'fields_by_zoom': {0: ['fill'], 10: ['fill'] + TOOLTIP_FIELDS[1:]},
+        'labels': dict(zip(TOOLTIP_FIELDS[1:], TOOLTIP_ALIASES[1:])),
+        'style': {'stroke': 'black', 'weight': 0.2, 'opacity': 0.3},
+    }
+    count = render_tiles(args.tiles, SHAPEFILE, [layer], workers=args.workers, title='County partisan lean')
+    print(f'{count} tiles written; open {args.tiles}/viewer.html in your browser.')
+    raise SystemExit
+
 # Center map
 center = [merged.geometry.centroid.y.mean(), merged.geometry.centroid.x.mean()]
 m = folium.Map(location=center, zoom_start=7)
@@ -47,8 +74,8 @@ folium.GeoJson(
         'fillOpacity': 0.3
     },
     tooltip=folium.GeoJsonTooltip(
-        fields=['GEOID20', 'pop', 'county', 'pre_20_rep_tru', 'pre_20_dem_bid'],
-        aliases=['VTD GEOID:', 'Population:', 'County:', 'Trump 2020:', 'Biden 2020:'],
+        fields=TOOLTIP_FIELDS,
+        aliases=TOOLTIP_ALIASES,
         localize=True
     )
 ).add_to(m)
@@ -1,27 +1,29 @@
 import geopandas as gpd
 import pandas as pd
 import folium
+from map_render import district_topojson, map_center
 
-# Load merged VTDs and extreme district assignment
-merged = gpd.read_file("merged_vtds.shp")
-districts = pd.read_csv("district_assignment_contig_extreme.csv")
+# Load merged VTD attributes (no geometry) and extreme district assignment
+merged = gpd.read_file("merged_vtds.shp", ignore_geometry=True)
+districts = pd.read_csv("district_assignment_contig_extreme.csv", dtype={"GEOID20": str})
 
-# Merge assignment into GeoDataFrame
+# Merge assignment into the VTD table and sum population per district
 merged = merged.merge(districts, on="GEOID20")
+district_pop = merged.groupby("district")["pop"].sum()
 
-# Dissolve to district geometries and sum population
-district_map = merged.dissolve(by="district", aggfunc={"pop": "sum"})
-district_map = district_map.reset_index()
+# District outlines from the cached, simplified VTD topology (no dissolve)
+topo = district_topojson(dict(zip(districts["GEOID20"], districts["district"].astype(int))),
+                         {int(d): {"pop": int(p)} for d, p in district_pop.items()})
 
 # Create folium map centered on Florida
-center = [merged.geometry.centroid.y.mean(), merged.geometry.centroid.x.mean()]
-m = folium.Map(location=center, zoom_start=7, tiles="cartodbpositron")
+m = folium.Map(location=map_center(topo), zoom_start=7, tiles="cartodbpositron")
 
 # Add districts to map
-folium.Choropleth(
-    geo_data=district_map,
+choropleth = folium.Choropleth(
+    geo_data=topo,
+    topojson="objects.districts",
     name="Districts",
-    data=district_map,
+    data=district_pop.reset_index(),
     columns=["district", "pop"],
     key_on="feature.properties.district",
     fill_color="YlOrRd",
@@ -30,13 +32,9 @@ folium.Choropleth(
     legend_name="District Population"
 ).add_to(m)
 
-# Add hover tooltips
-for _, row in district_map.iterrows():
-    folium.GeoJson(
-        row["geometry"],
-        name=f"District {row['district']}",
-        tooltip=folium.Tooltip(f"District: {row['district']}<br>Population: {int(row['pop'])}")
-    ).add_to(m)
+# Hover tooltips on the same layer, so each district's geometry is embedded once
+folium.GeoJsonTooltip(fields=["district", "pop"], aliases=["District:", "Population:"],
+                      localize=True).add_to(choropleth.geojson)
 
 m.save("extreme_gerrymandered_districts.html")
 print("Interactive map saved as extreme_gerrymandered_districts.html")
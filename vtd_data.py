@@ -0,0 +1,78 @@
+import os
+import pandas as pd
+import geopandas as gpd
+from stage_cache import fingerprint, cached_stage
+
+try:
+    import pyogrio
+except ImportError:  # geopandas falls back to fiona
+    pyogrio = None
+
+# Fast access to merged_vtds.shp for scripts that mostly need attributes. The first read
+# parses the DBF alone (no polygons), with Arrow when pyogrio and GDAL support it, and caches
+# the table as Parquet in .stage_cache keyed on the shapefile's contents; later reads load
+# only the requested columns from the Parquet file. Geometry is parsed (and cached as
+# GeoParquet) only when a caller asks for a GeoDataFrame.
+
+MERGED_SHAPEFILE = "merged_vtds.shp"
+
+
+def _read_attributes(path):
+    if pyogrio is not None:
+        try:
+            return pyogrio.read_dataframe(path, read_geometry=False, use_arrow=True)
+        except Exception:
+            # Arrow reads need GDAL >= 3.6; the plain pyogrio reader works everywhere
+            return pyogrio.read_dataframe(path, read_geometry=False)
+    return pd.DataFrame(gpd.read_file(path, ignore_geometry=True))
+
+
+def _cached_file(stage, path, build, filename, force):
+    key = fingerprint(stage, inputs=[path])
+    _, cache_path, _ = cached_stage(
+        stage, key,
+        build=build,
+        save=lambda table, out: table.to_parquet(os.path.join(out, filename)),
+        load=lambda out: None,
+        force=force,
+    )
+    return os.path.join(cache_path, filename)
+
+
+def load_vtd_table(columns=None, path=MERGED_SHAPEFILE, force=False):
+    """Attribute table of the VTD shapefile as a DataFrame, GEOID20 as strings."""
+    parquet = _cached_file("vtd_attributes", path, lambda: _read_attributes(path), "attributes.parquet", force)
+    table = pd.read_parquet(parquet, columns=columns)
+    if "GEOID20" in table:
+        table["GEOID20"] = table["GEOID20"].astype(str)
+    return table
+
+
+def load_vtd_columns(columns, path=MERGED_SHAPEFILE, force=False):
+    """Dict of NumPy arrays, one per requested column, in shapefile row order."""
+    table = load_vtd_table(list(columns), path, force)
+    return {col: table[col].to_numpy() for col in columns}
+
+
+def load_vtd_geodataframe(columns=None, path=MERGED_SHAPEFILE, force=False):
+    """GeoDataFrame with geometry, from a GeoParquet copy of the shapefile after the first call."""
+    parquet = _cached_file("vtd_geometry", path, lambda: gpd.read_file(path), "vtds.parquet", force)
+    gdf = gpd.read_parquet(parquet, columns=None if columns is None else list(columns) + ["geometry"])
+    if "GEOID20" in gdf:
+        gdf["GEOID20"] = gdf["GEOID20"].astype(str)
+    return gdf
+
+
+if __name__ == "__main__":
+    import time
+    for name, load in (("attributes", lambda: load_vtd_table(["GEOID20", "pop"])),
+                       ("geometry", lambda: load_vtd_geodataframe(["GEOID20"]))):
+        start = time.perf_counter()
+        load()
+        first = time.perf_counter() - start
+        start = time.perf_counter()
+        table = load()
+        print(f"{name}: {len(table)} rows, first call {first:.3f}s, cached {time.perf_counter() - start:.3f}s")
+    start = time.perf_counter()
+    gpd.read_file(MERGED_SHAPEFILE)
+    print(f"gpd.read_file for comparison: {time.perf_counter() - start:.3f}s")